@@ -0,0 +1,233 @@
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from cache import invalidate_books, invalidate_students
+from db import BUSY_TIMEOUT_MS
+from fuzzy import drop_fuzzy_index
+from migrations import migrate
+
+# Snapshots live next to the database, in backups/<stem>-<YYYYmmdd-HHMMSS>[-<label>].db[.gz]
+BACKUP_DIR_NAME = "backups"
+PAGES_PER_STEP = 256        # pages copied per backup step; 1 MiB at the default page size
+STEP_PAUSE = 0.01           # seconds between steps (and compressed chunks), left to the desk's own queries
+KEEP = 7                    # unlabelled snapshots kept by rotation
+AUTO_BACKUP_HOURS = 24      # the dashboard takes a snapshot when the newest one is older than this
+COPY_CHUNK = 1024 * 1024
+
+SNAPSHOT_NAME = re.compile(r"(?P<stem>.+)-(?P<taken>\d{8}-\d{6})(?:-(?P<label>[a-z-]+))?\.db(?:\.gz)?")
+
+_running = threading.Lock()     # one backup or restore at a time per process
+
+
+class BackupError(Exception):
+    pass
+
+
+def backup_dir(db_file):
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), BACKUP_DIR_NAME)
+
+
+def _stem(db_file):
+    return os.path.splitext(os.path.basename(db_file))[0]
+
+
+def list_backups(db_file):
+    # [(path, taken, label, size)] newest first; taken is the snapshot's local time as YYYYmmdd-HHMMSS
+    directory = backup_dir(db_file)
+    if not os.path.isdir(directory):
+        return []
+    snapshots = []
+    for name in os.listdir(directory):
+        match = SNAPSHOT_NAME.fullmatch(name)
+        if match and match["stem"] == _stem(db_file):
+            path = os.path.join(directory, name)
+            snapshots.append((path, match["taken"], match["label"], os.path.getsize(path)))
+    return sorted(snapshots, key=lambda snapshot: (snapshot[1], snapshot[0]), reverse=True)
+
+
+def backup_due(db_file, hours=AUTO_BACKUP_HOURS):
+    snapshots = list_backups(db_file)
+    if not snapshots:
+        return True
+    return time.time() - os.path.getmtime(snapshots[0][0]) >= hours * 3600
+
+
+def _fsync(path):
+    with open(path, 'rb') as file:
+        os.fsync(file.fileno())
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _copy_pages(db_file, target_path, progress, pause):
+    # Copies PAGES_PER_STEP pages at a time. The source connection holds one read transaction
+    # throughout: in WAL mode that pins a consistent snapshot without blocking writers, and the
+    # copy never restarts because of them (the backup API starts over after every write from
+    # another connection otherwise, so under steady desk traffic a large copy would never finish).
+    source = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    target = sqlite3.connect(target_path, isolation_level=None)
+    try:
+        target.execute("PRAGMA synchronous = OFF")     # synced once at the end instead of after every step
+        source.execute("BEGIN")
+        source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        pages = [0]
+
+        def step(status, remaining, total):
+            pages[0] = total
+            if progress is not None:
+                progress(total - remaining, total)
+            time.sleep(pause)
+
+        source.backup(target, pages=PAGES_PER_STEP, progress=step)
+        return pages[0]
+    finally:
+        target.close()
+        source.close()
+
+
+def _check(path):
+    # PRAGMA integrity_check messages for a plain database file; [] when it is sound
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        messages = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    finally:
+        conn.close()
+    return [] if messages == ["ok"] else messages
+
+
+def _standalone(path):
+    # The copy carries the source's WAL flag; switching it back to a rollback journal makes the
+    # snapshot a single self-contained file that can be checked and read without -wal/-shm files
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = DELETE").fetchone()
+    finally:
+        conn.close()
+
+
+def _compress(path, target_path, pause):
+    with open(path, 'rb') as source, gzip.open(target_path, 'wb', compresslevel=6) as target:
+        for chunk in iter(lambda: source.read(COPY_CHUNK), b""):
+            target.write(chunk)
+            time.sleep(pause)
+
+
+@contextmanager
+def _plain_file(path):
+    # Yields a path to the uncompressed database, expanding .gz snapshots into a temporary file
+    if not path.endswith(".gz"):
+        yield path
+        return
+    plain = os.path.join(os.path.dirname(path), f".{os.path.basename(path)[:-3]}.{os.getpid()}.tmp")
+    try:
+        with gzip.open(path, 'rb') as source, open(plain, 'wb') as target:
+            shutil.copyfileobj(source, target, COPY_CHUNK)
+        yield plain
+    finally:
+        _remove(plain, plain + "-journal")
+
+
+def _snapshot(db_file, compress, label, progress, pause):
+    directory = backup_dir(db_file)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{_stem(db_file)}-{time.strftime('%Y%m%d-%H%M%S')}" + (f"-{label}" if label else "") + ".db"
+    path = os.path.join(directory, name + (".gz" if compress else ""))
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    start = time.perf_counter()
+    try:
+        pages = _copy_pages(db_file, tmp_path, progress, pause)
+        _standalone(tmp_path)
+        problems = _check(tmp_path)
+        if problems:
+            raise BackupError(f"Snapshot of {db_file} failed its integrity check: {problems[0]}")
+        if compress:
+            _compress(tmp_path, tmp_path + ".gz", pause)
+            os.replace(tmp_path + ".gz", tmp_path)
+        _fsync(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        _remove(tmp_path, tmp_path + ".gz", tmp_path + "-journal", tmp_path + "-wal", tmp_path + "-shm")
+    return {"path": path, "pages": pages, "bytes": os.path.getsize(path), "seconds": time.perf_counter() - start}
+
+
+def prune_backups(db_file, keep=KEEP):
+    # Rotation: drops the oldest unlabelled snapshots beyond `keep`; labelled ones (pre-restore)
+    # are only removed by hand. Returns the removed paths.
+    removed = [path for path, _, label, _ in list_backups(db_file) if label is None][keep:]
+    _remove(*removed)
+    return removed
+
+
+def create_backup(db_file, compress=False, keep=KEEP, progress=None, pause=STEP_PAUSE):
+    # Online snapshot of a live database, integrity-checked before it replaces anything, then
+    # rotated. progress(copied_pages, total_pages) is called from this thread after every step.
+    if not os.path.exists(db_file):
+        raise BackupError(f"No database at {db_file}")
+    if not _running.acquire(blocking=False):
+        raise BackupError("A backup or restore is already running")
+    try:
+        result = _snapshot(db_file, compress, None, progress, pause)
+        result["pruned"] = prune_backups(db_file, keep) if keep else []
+        return result
+    finally:
+        _running.release()
+
+
+def verify_backup(path):
+    # Integrity check messages for a snapshot ([] when sound); compressed ones are expanded first
+    with _plain_file(path) as plain:
+        return _check(plain)
+
+
+def restore_backup(db_file, path=None):
+    # Replaces the database's contents with a snapshot (default: the newest unlabelled one). The
+    # snapshot is checked first and the current database is saved as a "pre-restore" snapshot, so
+    # a restore can itself be undone. The copy is one backup step under the write lock: other
+    # connections, including a running app, see the old database or the restored one, never a mix.
+    if path is None:
+        snapshots = [snapshot for snapshot in list_backups(db_file) if snapshot[2] is None]
+        if not snapshots:
+            raise BackupError(f"No snapshots in {backup_dir(db_file)}")
+        path = snapshots[0][0]
+    if not os.path.exists(path):
+        raise BackupError(f"No snapshot at {path}")
+    if not _running.acquire(blocking=False):
+        raise BackupError("A backup or restore is already running")
+    try:
+        start = time.perf_counter()
+        with _plain_file(path) as plain:
+            problems = _check(plain)
+            if problems:
+                raise BackupError(f"{path} failed its integrity check: {problems[0]}")
+            safety = _snapshot(db_file, False, "pre-restore", None, 0)["path"] if os.path.exists(db_file) else None
+            os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+            source = sqlite3.connect(plain, isolation_level=None)
+            target = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            try:
+                source.backup(target)
+                target.execute("PRAGMA journal_mode = WAL")     # snapshots are stored without it
+            finally:
+                target.close()
+                source.close()
+    finally:
+        _running.release()
+
+    # A snapshot can predate later migrations, and this process already counts the database as
+    # migrated. Nothing cached from the replaced database carries over.
+    migrate(db_file)
+    invalidate_books(db_file)
+    invalidate_students(db_file)
+    drop_fuzzy_index(db_file)
+    return {"path": path, "safety": safety, "seconds": time.perf_counter() - start}
@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import cache
+import core
+from catalog import BOOK_COLUMNS, book_cursor, fetch_books_page, search_books
+from circulation import issue_book, return_issues
+from datagen import DEFAULT_SEED, FIRST_NAMES, LAST_NAMES, TITLE_WORDS, generate_dataset, parse_size
+from db import close_all, get_connection
+from fuzzy import fuzzy_index, fuzzy_search
+from ingest import ingest_csv
+from migrations import migrate
+from students import find_students
+
+SEARCH_SAMPLES = 200
+EDIT_SAMPLES = 500
+LOAN_SAMPLES = 1000
+
+
+def percentiles(samples_ms):
+    samples = sorted(samples_ms)
+    if not samples:
+        return {}
+
+    def pick(fraction):
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": samples[-1],
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def timed_uncached(fn, *args, **kwargs):
+    # Sampled queries repeat; emptying the result cache first times the query rather than a cache hit
+    cache.clear()
+    return timed(fn, *args, **kwargs)
+
+
+def book_queries(rng, count):
+    # A mix of whole words, short prefixes and two-word queries, like desk staff type them
+    queries = []
+    for _ in range(count):
+        kind = rng.randrange(3)
+        if kind == 0:
+            queries.append(rng.choice(TITLE_WORDS + LAST_NAMES))
+        elif kind == 1:
+            queries.append(rng.choice(TITLE_WORDS + FIRST_NAMES)[:rng.randint(2, 4)])
+        else:
+            queries.append(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)[:3]}")
+    return queries
+
+
+def misspell(rng, word):
+    # Swaps two neighbouring letters, the most common typing slip
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def typo_queries(rng, count):
+    # Author names and title words with one slip in each, which the exact search can't find
+    queries = []
+    for _ in range(count):
+        if rng.randrange(2):
+            queries.append(f"{rng.choice(FIRST_NAMES)} {misspell(rng, rng.choice(LAST_NAMES))}")
+        else:
+            queries.append(misspell(rng, rng.choice(TITLE_WORDS)))
+    return queries
+
+
+def student_queries(rng, count, student_count):
+    queries = []
+    for _ in range(count):
+        kind = rng.randrange(3)
+        if kind == 0:
+            queries.append(str(rng.randint(1, student_count)))
+        elif kind == 1:
+            queries.append(rng.choice(FIRST_NAMES)[:rng.randint(2, 5)])
+        else:
+            queries.append(f"{rng.choice(FIRST_NAMES).lower()}.{rng.choice(LAST_NAMES).lower()[:3]}")
+    return queries
+
+
+def run_size(book_count, data_dir, work_dir, seed):
+    rng = random.Random(seed)
+    result = {"books": book_count}
+
+    start = time.perf_counter()
+    books_csv, students_csv = generate_dataset(data_dir, book_count, seed=seed)
+    result["generate_s"] = time.perf_counter() - start
+
+    db_file = os.path.join(work_dir, f"bench_{book_count}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+    migrate(db_file, target=1)     # base tables only: secondary indexes are timed separately below
+    conn = get_connection(db_file)
+    core.DB_FILE = db_file
+
+    result["import_books"] = ingest_csv(db_file, books_csv, "books")
+    result["import_students"] = ingest_csv(db_file, students_csv, "students")
+    student_count = result["import_students"]["inserted"]
+
+    start = time.perf_counter()
+    migrate(db_file)
+    result["build_indexes_s"] = time.perf_counter() - start
+
+    rows, elapsed = timed(core.fetch_books)
+    result["fetch_books_full"] = {"rows": len(rows), "ms": elapsed}
+    del rows
+
+    deep_key = f"B{book_count * 9 // 10:0{max(3, len(str(book_count)))}d}"
+    _, first_ms = timed(fetch_books_page, db_file, limit=100)
+    _, deep_ms = timed(fetch_books_page, db_file, after=deep_key, limit=100)
+    result["books_page"] = {"first_ms": first_ms, "deep_ms": deep_ms}
+
+    deep_row = get_connection(db_file).execute(
+        f"SELECT {BOOK_COLUMNS} FROM Books ORDER BY lower(title), book_id LIMIT 1 OFFSET ?", (book_count * 9 // 10,)
+    ).fetchone()
+    _, first_ms = timed(fetch_books_page, db_file, limit=100, sort="title")
+    _, deep_ms = timed(fetch_books_page, db_file, after=book_cursor(deep_row, "title"), limit=100, sort="title")
+    result["books_page_by_title"] = {"first_ms": first_ms, "deep_ms": deep_ms}
+
+    result["search_books"] = percentiles(
+        [timed_uncached(search_books, db_file, query)[1] for query in book_queries(rng, SEARCH_SAMPLES)])
+    _, result["fuzzy_index_build_ms"] = timed(fuzzy_index, db_file)
+    result["fuzzy_search"] = percentiles(
+        [timed_uncached(fuzzy_search, db_file, query)[1] for query in typo_queries(rng, SEARCH_SAMPLES)])
+    result["search_students"] = percentiles(
+        [timed_uncached(find_students, db_file, query)[1]
+         for query in student_queries(rng, SEARCH_SAMPLES, student_count)])
+
+    width = max(3, len(str(book_count)))
+    edit_ids = [f"B{rng.randint(1, book_count):0{width}d}" for _ in range(EDIT_SAMPLES)]
+    result["edit_book"] = percentiles(
+        [timed(core.edit_book, book_id, quantity=rng.randint(1, 50))[1] for book_id in edit_ids])
+
+    loan_books = [f"B{rng.randint(1, book_count):0{width}d}" for _ in range(LOAN_SAMPLES)]
+    with conn:
+        conn.executemany("UPDATE Books SET quantity = quantity + 1 WHERE book_id = ?", [(b,) for b in loan_books])
+    start = time.perf_counter()
+    issue_ids = [issue_book(db_file, book_id, rng.randint(1, student_count)) for book_id in loan_books]
+    issue_s = time.perf_counter() - start
+    (returned, _), return_ms = timed(return_issues, db_file, issue_ids)
+    result["circulation"] = {
+        "issues_per_s": len(issue_ids) / issue_s if issue_s else None,
+        "batch_return_per_s": len(returned) / (return_ms / 1000) if return_ms else None,
+    }
+
+    result["db_bytes"] = os.path.getsize(db_file)
+    close_all()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark import, fetch, search, edit and circulation")
+    parser.add_argument("sizes", nargs="*", default=["10k"], help="catalog sizes, e.g. 10k 1m 10m (default: 10k)")
+    parser.add_argument("--data", default="bench_data", help="directory for generated CSV files")
+    parser.add_argument("--output", default="bench_results.json", help="machine-readable results file")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark databases")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="library_bench_")
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": [],
+    }
+    try:
+        for size in args.sizes:
+            print(f"Benchmarking {size} books...")
+            report["results"].append(run_size(parse_size(size), args.data, work_dir, args.seed))
+    finally:
+        if args.keep:
+            print(f"Databases kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import sys
+import threading
+from array import array
+
+from cache import generation
+from db import get_connection
+from sorting import ascii_lower
+
+COLUMNS = ("book_id", "title", "author", "genre", "year", "quantity")
+FETCH_SIZE = 5000
+NO_YEAR = -2 ** 31      # array slot for a NULL year
+
+# db_file -> (books generation, BookStore). Kept out of cache.py's LRU, which is bounded by rows and
+# would either count the whole catalog as one row or refuse to hold it at all.
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class BookStore:
+    # Columnar copy of Books. book_id and title are unique per row and stay plain lists; author
+    # and genre are dictionary-encoded (one interned string per distinct value, a small integer
+    # code per row); year and quantity live in typed arrays. Row tuples are built only on demand.
+
+    def __init__(self):
+        self.book_ids = []
+        self.titles = []
+        self.authors = array('I')
+        self.genres = array('I')
+        self.years = array('i')
+        self.quantities = array('i')
+        self.author_names = []      # code -> value
+        self.genre_names = []
+        self._author_codes = {}
+        self._genre_codes = {}
+        self._title_keys = None     # lower(title) per row, built by the first title search or sort
+
+    @staticmethod
+    def _encode(value, codes, names):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(names)
+            names.append(sys.intern(value) if isinstance(value, str) else value)
+        return code
+
+    def extend(self, rows):
+        for book_id, title, author, genre, year, quantity in rows:
+            self.book_ids.append(book_id)
+            self.titles.append(title)
+            self.authors.append(self._encode(author, self._author_codes, self.author_names))
+            self.genres.append(self._encode(genre, self._genre_codes, self.genre_names))
+            self.years.append(NO_YEAR if year is None else year)
+            self.quantities.append(quantity)
+        self._title_keys = None
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def _getters(self, columns):
+        getters = {
+            "book_id": self.book_ids.__getitem__,
+            "title": self.titles.__getitem__,
+            "author": lambda i: self.author_names[self.authors[i]],
+            "genre": lambda i: self.genre_names[self.genres[i]],
+            "year": lambda i: None if self.years[i] == NO_YEAR else self.years[i],
+            "quantity": self.quantities.__getitem__,
+        }
+        return [getters[column] for column in columns]
+
+    def row(self, index, columns=COLUMNS):
+        return tuple(get(index) for get in self._getters(columns))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.rows(range(len(self))[index]))
+        if index < 0:
+            index += len(self)
+        return self.row(index)
+
+    def __iter__(self):
+        return self.rows()
+
+    def rows(self, indexes=None, columns=COLUMNS):
+        # Row tuples for the given positions (default: all, in book_id order)
+        getters = self._getters(columns)
+        for index in range(len(self)) if indexes is None else indexes:
+            yield tuple(get(index) for get in getters)
+
+    def batches(self, size, indexes=None, columns=COLUMNS):
+        batch = []
+        for row in self.rows(indexes, columns):
+            batch.append(row)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def title_keys(self):
+        if self._title_keys is None:
+            self._title_keys = [ascii_lower(title) for title in self.titles]
+        return self._title_keys
+
+    def matching(self, text, indexes=None):
+        # Case-insensitive substring match on title, author or genre, the same rule as the LIKE
+        # search. Author and genre are tested once per distinct value, not once per row.
+        needle = ascii_lower(text)
+        author_hit = [needle in ascii_lower(name) for name in self.author_names]
+        genre_hit = [name is not None and needle in ascii_lower(name) for name in self.genre_names]
+        titles, authors, genres = self.title_keys(), self.authors, self.genres
+        return [index for index in (range(len(self)) if indexes is None else indexes)
+                if author_hit[authors[index]] or genre_hit[genres[index]] or needle in titles[index]]
+
+    def _ranks(self, names):
+        # Rank of each code in lower() order; names differing only in case share a rank
+        keys = [ascii_lower(name) if name is not None else "" for name in names]
+        order = {key: rank for rank, key in enumerate(sorted(set(keys)))}
+        return array('I', (order[key] for key in keys))
+
+    def order(self, column="book_id", descending=False, indexes=None):
+        # Row positions in the same order as catalog.fetch_books_page(sort=column): the sort key,
+        # then book_id as the tie-breaker
+        ids = self.book_ids
+        if column == "book_id":
+            key = ids.__getitem__
+        elif column == "title":
+            titles = self.title_keys()
+            key = lambda i: (titles[i], ids[i])
+        elif column in ("author", "genre"):
+            codes = self.authors if column == "author" else self.genres
+            ranks = self._ranks(self.author_names if column == "author" else self.genre_names)
+            key = lambda i: (ranks[codes[i]], ids[i])
+        elif column == "year":
+            years = self.years
+            key = lambda i: (0 if years[i] == NO_YEAR else years[i], ids[i])
+        elif column == "quantity":
+            quantities = self.quantities
+            key = lambda i: (quantities[i], ids[i])
+        else:
+            raise ValueError(f"Unknown book column {column!r}")
+        return sorted(range(len(self)) if indexes is None else indexes, key=key, reverse=descending)
+
+
+def load_book_store(db_file):
+    store = BookStore()
+    cursor = get_connection(db_file).execute(f"SELECT {', '.join(COLUMNS)} FROM Books ORDER BY book_id")
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return store
+        store.extend(rows)
+
+
+def book_store(db_file):
+    # Reloaded after any books write, like every cached books result
+    current = generation(db_file, "books")
+    with _stores_lock:
+        entry = _stores.get(db_file)
+    if entry is not None and entry[0] == current:
+        return entry[1]
+    store = load_book_store(db_file)
+    if generation(db_file, "books") == current:    # not stored if a write landed during the load
+        with _stores_lock:
+            _stores[db_file] = (current, store)
+    return store
@@ -0,0 +1,131 @@
+import heapq
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from cache import cached, get_book
+from catalog import SEARCH_LIMIT, build_match_query
+from db import get_connection
+from inventory import inventory_summary
+from migrations import ensure_migrated, migrate
+from paths import BRANCH_DIR, BRANCH_NAME, BranchError, branch_paths
+from sorting import ascii_lower
+from students import ID_RANGE, PAGE_SIZE, find_students, normalize
+
+# A branch is an ordinary library database with its own CSV pair (see paths.py); the functions
+# here fan a query out to several of them in parallel and merge the answers as if they came from
+# one catalog.
+MAX_WORKERS = min(32, os.cpu_count() or 4)
+
+_executor = None
+
+
+def list_branches():
+    if not os.path.isdir(BRANCH_DIR):
+        return []
+    return sorted(name for name in os.listdir(BRANCH_DIR)
+                  if BRANCH_NAME.fullmatch(name) and os.path.exists(branch_paths(name)[0]))
+
+
+def create_branch(name):
+    db_file = branch_paths(name)[0]
+    os.makedirs(os.path.dirname(db_file), exist_ok=True)
+    migrate(db_file)
+    return db_file
+
+
+def fan_out(fn, branches, *args):
+    # Runs fn(db_file, *args) for every branch on a shared thread pool (SQLite releases the GIL
+    # while a statement runs, so shards are queried side by side) and returns [(branch, result)]
+    # in branch order. Each pool thread keeps its own connection per branch, as db.py does.
+    global _executor
+    branches = list_branches() if branches is None else list(branches)
+    missing = [branch for branch in branches if not os.path.exists(branch_paths(branch)[0])]
+    if missing:
+        raise BranchError(f"No such branch: {', '.join(missing)}")
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="branch")
+
+    futures = [(branch, _executor.submit(fn, branch_paths(branch)[0], *args)) for branch in branches]
+    results = []
+    for branch, future in futures:
+        try:
+            results.append((branch, future.result()))
+        except Exception as e:
+            raise BranchError(f"Branch {branch}: {e}") from e
+    return results
+
+
+def _ranked_books(db_file, match, limit):
+    # search_books() plus the bm25 rank, which the merge orders by
+    ensure_migrated(db_file)
+    return cached(db_file, "books", ("ranked", match, limit), lambda: get_connection(db_file).execute("""
+        SELECT BooksSearch.rank, b.book_id, b.title, b.author, b.genre, b.year, b.quantity
+        FROM BooksSearch
+        JOIN Books AS b ON b.rowid = BooksSearch.rowid
+        WHERE BooksSearch MATCH ?
+        ORDER BY BooksSearch.rank
+        LIMIT ?
+    """, (match, limit)).fetchall())
+
+
+def search_books_all(search_text, limit=SEARCH_LIMIT, branches=None):
+    # The best `limit` matches across branches as (branch, book_id, title, author, genre, year,
+    # quantity). Each shard ranks with its own bm25 statistics, which is close enough to compare.
+    match = build_match_query(search_text)
+    if not match:
+        return []
+    shards = [[(row[0], branch, row[1:]) for row in rows] for branch, rows in fan_out(_ranked_books, branches,
+                                                                                       match, limit)]
+    return [(branch,) + row for _, branch, row in islice(heapq.merge(*shards), limit)]
+
+
+def find_students_all(query="", limit=PAGE_SIZE, offset=0, branches=None):
+    # find_students() across branches, in the same order it uses within one: by student_id for
+    # id lookups and browsing, otherwise by name. Student ids are per branch, so rows come back
+    # as (branch, student_id, name, email, date_of_birth).
+    text = normalize(query)
+    if not text or text.isdigit() or ID_RANGE.fullmatch(text):
+        key = lambda item: (item[1][0], item[0])
+    else:
+        key = lambda item: (ascii_lower(item[1][1]), item[1][0], item[0])
+    shards = [[(branch, row) for row in rows]
+              for branch, rows in fan_out(find_students, branches, query, limit + offset)]
+    merged = heapq.merge(*shards, key=key)
+    return [(branch,) + tuple(row) for branch, row in islice(merged, offset, offset + limit)]
+
+
+def find_book_all(book_id, branches=None):
+    # [(branch, row)] for every branch holding the book
+    return [(branch, row) for branch, row in fan_out(get_book, branches, book_id) if row is not None]
+
+
+def _branch_stats(db_file):
+    summary = dict(inventory_summary(db_file))
+    summary["students"] = get_connection(db_file).execute("SELECT COUNT(*) FROM Students").fetchone()[0]
+    return summary
+
+
+def _combine(breakdowns):
+    titles, copies = Counter(), Counter()
+    for rows in breakdowns:
+        for value, value_titles, value_copies in rows:
+            titles[value] += value_titles
+            copies[value] += value_copies
+    return [(value, titles[value], copies[value]) for value in titles]
+
+
+def stats_all(branches=None):
+    # Inventory totals and breakdowns summed over branches, plus each branch's own summary
+    per_branch = dict(fan_out(_branch_stats, branches))
+    summaries = list(per_branch.values())
+    totals = {figure: sum(summary[figure] for summary in summaries)
+              for figure in ("titles", "copies", "out_of_stock", "students")}
+    # Same orders as inventory.breakdown(): genres by copies, decades oldest first
+    totals["genres"] = sorted(_combine(summary["genres"] for summary in summaries),
+                              key=lambda row: (-row[2], row[0]))
+    totals["decades"] = sorted(_combine(summary["decades"] for summary in summaries),
+                               key=lambda row: int(row[0] or 0))
+    totals["branches"] = per_branch
+    return totals
@@ -0,0 +1,197 @@
+import csv
+from collections import Counter
+
+from cache import invalidate_books
+from db import get_connection, write_transaction
+from fuzzy import index_books
+from ingest import SCHEMAS
+
+# A delta file is a CSV with book_id and action columns plus whichever fields the action needs:
+#   update  book_id, any of title/author/genre/year/quantity   (blank fields are left alone)
+#   adjust  book_id, change                                    (signed change to quantity)
+#   delete  book_id
+ACTIONS = ("update", "adjust", "delete")
+FIELDS = ("title", "author", "genre", "year", "quantity")
+LOOKUP_CHUNK = 500      # ids per IN (...) lookup
+
+_CHECKS = {column: (kind, check) for column, kind, _, _, check in SCHEMAS["books"]}
+
+
+class DeltaError(ValueError):
+    pass
+
+
+def _parse_value(column, raw):
+    kind, check = _CHECKS[column]
+    if kind is int:
+        try:
+            value = int(raw)
+        except ValueError:
+            return None, f"{column} is not a number: {raw!r}"
+    else:
+        value = raw
+    problem = check(value) if check is not None else None
+    return (None, problem) if problem else (value, None)
+
+
+def parse_delta(line, row):
+    # Returns a delta dict; invalid rows carry an "error" and are reported, never applied
+    action = (row.get("action") or "").strip().lower()
+    book_id = (row.get("book_id") or "").strip()
+    delta = {"line": line, "action": action, "book_id": book_id, "fields": {}, "change": 0, "error": None}
+
+    if not book_id:
+        delta["error"] = "missing book_id"
+    elif action not in ACTIONS:
+        delta["error"] = f"unknown action {action!r}"
+    elif action == "adjust":
+        raw = (row.get("change") or "").strip()
+        try:
+            delta["change"] = int(raw)
+        except ValueError:
+            delta["error"] = f"change is not a number: {raw!r}"
+    elif action == "update":
+        for column in FIELDS:
+            raw = (row.get(column) or "").strip()
+            if not raw:
+                continue
+            value, problem = _parse_value(column, raw)
+            if problem:
+                delta["error"] = problem
+                break
+            delta["fields"][column] = value
+        else:
+            if not delta["fields"]:
+                delta["error"] = "nothing to update"
+    return delta
+
+
+def read_deltas(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+        reader = csv.DictReader(file)
+        header = [name.strip() for name in reader.fieldnames or []]
+        missing = [column for column in ("book_id", "action") if column not in header]
+        if missing:
+            raise DeltaError(f"Delta file is missing required columns: {', '.join(missing)}")
+        reader.fieldnames = header
+        return [parse_delta(reader.line_num, row) for row in reader]
+
+
+def _current_rows(conn, book_ids):
+    rows, loans = {}, {}
+    has_loans = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'IssuedBooks'"
+    ).fetchone() is not None
+
+    for start in range(0, len(book_ids), LOOKUP_CHUNK):
+        chunk = book_ids[start:start + LOOKUP_CHUNK]
+        marks = ", ".join("?" * len(chunk))
+        for book_id, *values in conn.execute(
+                f"SELECT book_id, {', '.join(FIELDS)} FROM Books WHERE book_id IN ({marks})", chunk):
+            rows[book_id] = dict(zip(FIELDS, values))
+        if has_loans:
+            loans.update(conn.execute(
+                f"SELECT book_id, COUNT(*) FROM IssuedBooks WHERE return_date IS NULL AND book_id IN ({marks}) "
+                "GROUP BY book_id", chunk))
+    return rows, loans
+
+
+def _outcome(delta, status, detail=""):
+    return {"line": delta["line"], "book_id": delta["book_id"], "action": delta["action"],
+            "status": status, "detail": detail}
+
+
+def _describe(changes):
+    return "; ".join(f"{column}: {old} -> {new}" for column, (old, new) in changes.items())
+
+
+def apply_deltas_in(conn, deltas, dry_run=False):
+    # Plans every delta against the current rows in memory (later lines see earlier ones), then
+    # writes the net result with one executemany per changed-column set. Never commits: the
+    # caller owns the transaction, so this also runs as a db worker job.
+    original, loans = _current_rows(conn, sorted({d["book_id"] for d in deltas if d["book_id"]}))
+    state = {book_id: dict(row) for book_id, row in original.items()}
+    outcomes = []
+
+    for delta in deltas:
+        book_id = delta["book_id"]
+        if delta["error"]:
+            outcomes.append(_outcome(delta, "invalid", delta["error"]))
+            continue
+        row = state.get(book_id)
+        if row is None:
+            outcomes.append(_outcome(delta, "missing", "no such book"))
+            continue
+
+        if delta["action"] == "delete":
+            if loans.get(book_id):
+                outcomes.append(_outcome(delta, "rejected", f"{loans[book_id]} copies on loan"))
+                continue
+            state[book_id] = None
+            outcomes.append(_outcome(delta, "deleted"))
+            continue
+
+        if delta["action"] == "adjust":
+            fields = {"quantity": row["quantity"] + delta["change"]}
+            if fields["quantity"] < 0:
+                outcomes.append(_outcome(delta, "rejected", f"quantity would go negative ({fields['quantity']})"))
+                continue
+        else:
+            fields = delta["fields"]
+
+        changes = {column: (row[column], value) for column, value in fields.items() if row[column] != value}
+        if not changes:
+            outcomes.append(_outcome(delta, "unchanged"))
+            continue
+        row.update(fields)
+        outcomes.append(_outcome(delta, "updated", _describe(changes)))
+
+    deleted = [book_id for book_id, row in state.items() if row is None]
+    updates = {}    # changed columns -> parameter rows
+    for book_id, row in state.items():
+        if row is None:
+            continue
+        columns = tuple(column for column in FIELDS if row[column] != original[book_id][column])
+        if columns:
+            updates.setdefault(columns, []).append([row[column] for column in columns] + [book_id])
+
+    if not dry_run:
+        # Grouping by column set keeps quantity-only corrections from touching the search index triggers
+        for columns, params in updates.items():
+            assignments = ", ".join(f"{column} = ?" for column in columns)
+            conn.executemany(f"UPDATE Books SET {assignments} WHERE book_id = ?", params)
+        if deleted:
+            conn.executemany("DELETE FROM Books WHERE book_id = ?", [(book_id,) for book_id in deleted])
+
+    return {
+        "dry_run": dry_run,
+        "outcomes": outcomes,
+        "counts": dict(Counter(outcome["status"] for outcome in outcomes)),
+        "changed_ids": [params[-1] for rows in updates.values() for params in rows] + deleted,
+    }
+
+
+def apply_deltas(db_file, deltas, dry_run=False):
+    conn = get_connection(db_file)
+    if dry_run:
+        return apply_deltas_in(conn, deltas, dry_run=True)
+    with write_transaction(conn):
+        report = apply_deltas_in(conn, deltas)
+    if report["changed_ids"]:
+        invalidate_books(db_file, report["changed_ids"])
+        index_books(db_file, report["changed_ids"])
+    return report
+
+
+def write_report(report, path):
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=["line", "book_id", "action", "status", "detail"])
+        writer.writeheader()
+        writer.writerows(report["outcomes"])
+
+
+def summarize(report):
+    counts = report["counts"]
+    parts = [f"{counts[status]} {status}" for status in
+             ("updated", "deleted", "unchanged", "missing", "rejected", "invalid") if counts.get(status)]
+    return ("Dry run: " if report["dry_run"] else "") + (", ".join(parts) or "nothing to apply")
@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+
+from changelog import batched_changelog
+from inventory import batched_inventory
+
+# Insert statement for each kind of row ingest.py loads
+INSERTS = {
+    "books": """
+        INSERT OR IGNORE INTO Books (book_id, title, author, genre, year, quantity)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """,
+    "students": """
+        INSERT OR IGNORE INTO Students (name, email, date_of_birth)
+        VALUES (?, ?, ?)
+    """,
+}
+
+
+@contextmanager
+def tuned_for_load(conn):
+    # Relax durability while a load runs and put the previous settings back afterwards
+    previous = {
+        "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+        "synchronous": conn.execute("PRAGMA synchronous").fetchone()[0],
+        "cache_size": conn.execute("PRAGMA cache_size").fetchone()[0],
+    }
+
+    # WAL is already cheap for appends and can't be left while other connections are open
+    if previous["journal_mode"].lower() != "wal":
+        conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -65536")  # 64 MB
+    conn.execute("PRAGMA temp_store = MEMORY")
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        if previous["journal_mode"].lower() != "wal":
+            conn.execute(f"PRAGMA journal_mode = {previous['journal_mode']}")
+        conn.execute(f"PRAGMA synchronous = {int(previous['synchronous'])}")
+        conn.execute(f"PRAGMA cache_size = {int(previous['cache_size'])}")
+
+
+def flush_batch(conn, kind, batch, stats):
+    # Inserts one batch of kind rows ("books" or "students") with the per-row triggers batched.
+    # rowcount counts only the rows this statement inserted, not the writes its triggers make.
+    if kind == "books":
+        with batched_inventory(conn), batched_changelog(conn, "Books"):
+            inserted = conn.executemany(INSERTS[kind], batch).rowcount
+    elif kind == "students":
+        with batched_changelog(conn, "Students"):
+            inserted = conn.executemany(INSERTS[kind], batch).rowcount
+    else:
+        raise ValueError(f"Unknown kind of row: {kind}")
+    conn.commit()
+    stats["inserted"] += inserted
+    stats["skipped"] += len(batch) - inserted
+
+
+def report(label, stats):
+    print(f"{label}: {stats['inserted']} inserted, {stats['skipped']} skipped, "
+          f"{stats['rejected']} rejected in {stats['seconds']:.2f}s ({stats['rows_per_sec']:.0f} rows/sec)")
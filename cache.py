@@ -0,0 +1,195 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from db import get_connection
+
+# Bounded by total cached rows, not entries: a single row weighs 1, a query result weighs len(rows)
+MAX_ROWS = 200_000
+MAX_RESULT_ROWS = 20_000   # larger results are served but never cached
+MAX_LOGGED_CHANGES = 1000  # more logged row changes than this since the last check drop everything instead
+
+TABLES = ("books", "students")
+LOGGED_TABLES = {"Books": "books", "Students": "students"}
+
+_lock = threading.RLock()
+_caches = {}            # db_file -> {"entries": OrderedDict, "rows": int}
+_watchers = {}          # db_file -> connection used only to read PRAGMA data_version
+_seen = {}              # db_file -> (data_version, ChangeLog sequence) at the last check
+_generations = {}       # (db_file, table) -> bumped on every invalidation, so in-flight loads don't store stale rows
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "external_changes": 0}
+
+_MISSING = object()
+
+
+def _cache_for(db_file):
+    cache = _caches.get(db_file)
+    if cache is None:
+        cache = _caches[db_file] = {"entries": OrderedDict(), "rows": 0}
+    return cache
+
+
+def _weight(value):
+    return len(value) if isinstance(value, list) else 1
+
+
+def _log_position(watcher):
+    # High-water mark of the ChangeLog (migration 5); sqlite_sequence keeps it through compaction.
+    # None when the database has no log yet.
+    try:
+        row = watcher.execute("SELECT seq FROM sqlite_sequence WHERE name = 'ChangeLog'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if row is None:
+        return 0 if watcher.execute("SELECT 1 FROM sqlite_master WHERE name = 'ChangeLog'").fetchone() else None
+    return row[0]
+
+
+def _check_external_writes(db_file):
+    # data_version on the watcher connection changes with commits made by any other connection, this
+    # process's included. The ChangeLog triggers record every Books and Students row those commits
+    # touched, whoever made them, so exactly those rows are dropped. Everything is dropped when the
+    # log can't be followed: none yet, compacted past unread changes, or older than last time (a restore).
+    with _lock:
+        watcher = _watchers.get(db_file)
+        if watcher is None:
+            watcher = _watchers[db_file] = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        version = watcher.execute("PRAGMA data_version").fetchone()[0]
+        last = _seen.get(db_file)
+        if last is not None and last[0] == version:
+            return
+        position = _log_position(watcher)   # read after data_version: later commits change it again
+        _seen[db_file] = (version, position)
+        if last is None or (position is not None and position == last[1]):
+            return
+
+        changes = None
+        if position is not None and last[1] is not None and 0 < position - last[1] <= MAX_LOGGED_CHANGES:
+            changes = watcher.execute(
+                "SELECT table_name, row_key FROM ChangeLog WHERE seq > ? AND seq <= ?", (last[1], position)
+            ).fetchall()
+        if changes is None or len(changes) != position - last[1]:
+            _stats["external_changes"] += 1
+            _clear(db_file, None)
+            return
+        row_ids = {}
+        for table_name, row_key in changes:
+            row_ids.setdefault(LOGGED_TABLES[table_name], set()).add(row_key)
+        for table, keys in row_ids.items():
+            invalidate(db_file, table, keys)
+
+
+def _clear(db_file, table):
+    for name in TABLES if table is None else (table,):
+        _generations[(db_file, name)] = _generations.get((db_file, name), 0) + 1
+    cache = _caches.get(db_file)
+    if cache is None:
+        return
+    entries = cache["entries"]
+    for key in [key for key in entries if table is None or key[0] == table]:
+        cache["rows"] -= _weight(entries.pop(key))
+
+
+def _store(cache, key, value):
+    weight = _weight(value)
+    if weight > MAX_RESULT_ROWS:
+        return
+    entries = cache["entries"]
+    if key in entries:
+        cache["rows"] -= _weight(entries.pop(key))
+    entries[key] = value
+    cache["rows"] += weight
+    while cache["rows"] > MAX_ROWS and entries:
+        _, evicted = entries.popitem(last=False)
+        cache["rows"] -= _weight(evicted)
+        _stats["evictions"] += 1
+
+
+def cached(db_file, table, key, loader):
+    # Keys are namespaced by table so a write only drops that table's entries
+    _check_external_writes(db_file)
+    full_key = (table,) + key
+    with _lock:
+        cache = _cache_for(db_file)
+        value = cache["entries"].get(full_key, _MISSING)
+        if value is not _MISSING:
+            cache["entries"].move_to_end(full_key)
+            _stats["hits"] += 1
+            return value
+        _stats["misses"] += 1
+        generation = _generations.get((db_file, table), 0)
+
+    value = loader()
+    with _lock:
+        if _generations.get((db_file, table), 0) == generation:
+            _store(_cache_for(db_file), full_key, value)
+    return value
+
+
+def get_book(db_file, book_id):
+    return cached(db_file, "books", ("row", str(book_id)), lambda: get_connection(db_file).execute(
+        "SELECT book_id, title, author, genre, year, quantity FROM Books WHERE book_id = ?", (book_id,)
+    ).fetchone())
+
+
+def get_student(db_file, student_id):
+    return cached(db_file, "students", ("row", int(student_id)), lambda: get_connection(db_file).execute(
+        "SELECT student_id, name, email, date_of_birth FROM Students WHERE student_id = ?", (student_id,)
+    ).fetchone())
+
+
+def invalidate(db_file, table, row_ids=None):
+    # Drops the given rows and every cached query result for the table; row_ids=None drops the whole table
+    with _lock:
+        _stats["invalidations"] += 1
+        _generations[(db_file, table)] = _generations.get((db_file, table), 0) + 1
+        cache = _caches.get(db_file)
+        if cache is None:
+            return
+        if row_ids is None:
+            _clear(db_file, table)
+            return
+
+        entries = cache["entries"]
+        normalize = str if table == "books" else int
+        for row_id in row_ids:
+            value = entries.pop((table, "row", normalize(row_id)), _MISSING)
+            if value is not _MISSING:
+                cache["rows"] -= _weight(value)
+        for key in [key for key in entries if key[0] == table and key[1] != "row"]:
+            cache["rows"] -= _weight(entries.pop(key))
+
+
+def generation(db_file, table):
+    # Changes whenever the table's cached results are dropped, including after another connection's
+    # commit, so callers can tell whether anything they showed earlier may be stale
+    _check_external_writes(db_file)
+    with _lock:
+        return _generations.get((db_file, table), 0)
+
+
+def invalidate_books(db_file, book_ids=None):
+    invalidate(db_file, "books", book_ids)
+
+
+def invalidate_students(db_file, student_ids=None):
+    invalidate(db_file, "students", student_ids)
+
+
+def clear():
+    with _lock:
+        for db_file in set(_caches) | set(_seen):
+            for table in TABLES:
+                _generations[(db_file, table)] = _generations.get((db_file, table), 0) + 1
+        _caches.clear()
+        _seen.clear()
+
+
+def cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["rows"] = sum(cache["rows"] for cache in _caches.values())
+        stats["entries"] = sum(len(cache["entries"]) for cache in _caches.values())
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
@@ -0,0 +1,84 @@
+from cache import cached
+from db import get_connection
+from migrations import ensure_migrated
+from sorting import ascii_lower, keyset_page
+
+BOOK_COLUMNS = "book_id, title, author, genre, year, quantity"
+
+
+def _search_filter(search_text):
+    if not search_text:
+        return [], []
+    pattern = f"%{search_text}%"
+    return ["(title LIKE ? OR author LIKE ? OR genre LIKE ?)"], [pattern, pattern, pattern]
+
+
+# Sortable columns: (indexed SQL sort key, the same key computed from a row). The lower() and
+# ifnull() keys are precomputed in expression indexes, so a sorted page is an index range scan
+# and never needs a temp B-tree (migration 3). book_id sorts on the primary key itself.
+BOOK_SORTS = {
+    "book_id": (None, None),
+    "title": ("lower(title)", lambda row: ascii_lower(row[1])),
+    "author": ("lower(author)", lambda row: ascii_lower(row[2])),
+    "year": ("ifnull(year, 0)", lambda row: row[4] or 0),
+}
+
+
+def book_cursor(row, sort="book_id"):
+    # The keyset cursor of a row in the given sort order
+    key = BOOK_SORTS[sort][1]
+    return row[0] if key is None else (key(row), row[0])
+
+
+def fetch_books_page(db_file, after=None, before=None, limit=100, search_text="", sort="book_id",
+                     descending=False):
+    # Keyset pagination: after/before are book_cursor() values, so the cost of a page doesn't
+    # depend on how deep it is, whichever column the list is sorted by
+    sort_key = BOOK_SORTS[sort][0]
+    if sort_key is not None:
+        ensure_migrated(db_file)
+    conditions, params = _search_filter(search_text)
+
+    def load():
+        return keyset_page(get_connection(db_file), f"SELECT {BOOK_COLUMNS} FROM Books", "book_id", sort_key,
+                           after, before, limit, descending, conditions, params)
+
+    return cached(db_file, "books", ("page", sort, descending, after, before, limit, search_text), load)
+
+
+# Full-text index over Books (migration 6). It is an external-content FTS5 table keyed on the
+# rowid of Books (the row_id column since migration 10, so VACUUM keeps it), kept in sync by triggers
+# so add_book, edit_book and delete_book need no changes.
+SEARCH_LIMIT = 200
+
+
+def rebuild_search_index(db_file):
+    ensure_migrated(db_file)
+    conn = get_connection(db_file)
+    with conn:
+        conn.execute("INSERT INTO BooksSearch (BooksSearch) VALUES ('rebuild')")
+
+
+def build_match_query(search_text):
+    # Every word becomes a quoted prefix term, so "pat bro" matches "Patricia Brown"
+    terms = []
+    for word in search_text.split():
+        word = word.replace('"', '""')
+        terms.append(f'"{word}"*')
+    return " ".join(terms)
+
+
+def search_books(db_file, search_text, limit=SEARCH_LIMIT):
+    match = build_match_query(search_text)
+    if not match:
+        return []
+
+    ensure_migrated(db_file)
+    return cached(db_file, "books", ("search", match, limit), lambda: get_connection(db_file).execute("""
+        SELECT b.book_id, b.title, b.author, b.genre, b.year, b.quantity
+        FROM BooksSearch
+        JOIN Books AS b ON b.rowid = BooksSearch.rowid
+        WHERE BooksSearch MATCH ?
+        ORDER BY BooksSearch.rank
+        LIMIT ?
+    """, (match, limit)).fetchall())
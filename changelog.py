@@ -0,0 +1,200 @@
+import json
+import os
+from contextlib import contextmanager
+
+from db import get_connection, suppressed_trigger, write_transaction
+
+BATCH_SIZE = 1000
+COMPACT_CHUNK = 10000   # rows deleted per write transaction, so compaction never holds the lock for long
+
+# Captured tables: key column and the columns recorded with each change
+CAPTURED = {
+    "Books": ("book_id", ("book_id", "title", "author", "genre", "year", "quantity")),
+    "Students": ("student_id", ("student_id", "name", "email", "date_of_birth")),
+}
+
+# ChangeLog (migration 5) holds every committed insert, update and delete on the captured tables,
+# in commit order. AUTOINCREMENT keeps sequence numbers from being reused once compaction has
+# emptied the table. row_data is the row after the change as a JSON object, NULL for deletes.
+# ChangeConsumers has one row per downstream consumer: everything up to acked_seq has been
+# applied there. A changed key is logged as a delete of the old key and an insert of the new one.
+
+
+class ChangeLogError(Exception):
+    pass
+
+
+def _row_json(table, row):
+    _, columns = CAPTURED[table]
+    return "json_object(" + ", ".join(f"'{column}', {row}{column}" for column in columns) + ")"
+
+
+@contextmanager
+def batched_changelog(conn, table):
+    # For bulk inserts inside the caller's transaction, like inventory.batched_inventory(): the
+    # per-row trigger is suppressed and the new rows are logged by one INSERT ... SELECT in rowid order
+    key, _ = CAPTURED[table]
+    first_new = conn.execute(f"SELECT ifnull(max(rowid), 0) FROM {table}").fetchone()[0]
+    with suppressed_trigger(conn, f"{table.lower()}_changelog_insert") as suppressed:
+        yield
+        if suppressed:
+            conn.execute(f"""
+                INSERT INTO ChangeLog (table_name, row_key, operation, row_data)
+                SELECT '{table}', {key}, 'insert', {_row_json(table, "")} FROM {table} WHERE rowid > ?
+                ORDER BY rowid
+            """, (first_new,))
+
+
+def last_seq(db_file):
+    # The newest sequence number handed out, even if compaction has purged it since
+    row = get_connection(db_file).execute("SELECT seq FROM sqlite_sequence WHERE name = 'ChangeLog'").fetchone()
+    return row[0] if row else 0
+
+
+def _first_available(db_file):
+    # The oldest sequence number still in the log (one past the newest when the log is empty)
+    first = get_connection(db_file).execute("SELECT min(seq) FROM ChangeLog").fetchone()[0]
+    return first if first is not None else last_seq(db_file) + 1
+
+
+def changes_since(db_file, since, limit=BATCH_SIZE, tables=None):
+    # Up to limit changes with seq > since, oldest first, as dicts. Raises ChangeLogError when
+    # compaction already purged some of them; the consumer has to start over from an export.
+    conn = get_connection(db_file)
+    if since + 1 < _first_available(db_file):
+        raise ChangeLogError(f"Changes after {since} have been compacted away; re-export and start from "
+                             f"{last_seq(db_file)}")
+    query = "SELECT seq, table_name, row_key, operation, row_data, changed_at FROM ChangeLog WHERE seq > ?"
+    params = [since]
+    if tables:
+        query += f" AND table_name IN ({', '.join('?' * len(tables))})"
+        params.extend(tables)
+    query += " ORDER BY seq LIMIT ?"
+    params.append(limit)
+    return [{"seq": seq, "table": table, "key": key, "op": operation,
+             "row": json.loads(row_data) if row_data is not None else None, "at": changed_at}
+            for seq, table, key, operation, row_data, changed_at in conn.execute(query, params)]
+
+
+def register_consumer(db_file, name, from_seq=None):
+    # New consumers start after from_seq (default: the current end of the log, for a mirror that
+    # was just exported). Registering an existing name leaves its position alone.
+    conn = get_connection(db_file)
+    with write_transaction(conn):
+        start = last_seq(db_file) if from_seq is None else from_seq
+        conn.execute("INSERT OR IGNORE INTO ChangeConsumers (name, acked_seq) VALUES (?, ?)", (name, start))
+        return conn.execute("SELECT acked_seq FROM ChangeConsumers WHERE name = ?", (name,)).fetchone()[0]
+
+
+def unregister_consumer(db_file, name):
+    conn = get_connection(db_file)
+    with write_transaction(conn):
+        return conn.execute("DELETE FROM ChangeConsumers WHERE name = ?", (name,)).rowcount > 0
+
+
+def acknowledge(db_file, name, seq):
+    # Positions only move forward, so a late or repeated acknowledgement is harmless
+    conn = get_connection(db_file)
+    with write_transaction(conn):
+        updated = conn.execute("""
+            UPDATE ChangeConsumers
+            SET acked_seq = max(acked_seq, ?), acked_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+            WHERE name = ?
+        """, (seq, name)).rowcount
+    if not updated:
+        raise ChangeLogError(f"Unknown change consumer {name!r}")
+
+
+def consumers(db_file):
+    # (name, acked_seq, acked_at, pending changes) per consumer
+    conn = get_connection(db_file)
+    end = last_seq(db_file)
+    return [(name, acked, acked_at, end - acked) for name, acked, acked_at in conn.execute(
+        "SELECT name, acked_seq, acked_at FROM ChangeConsumers ORDER BY name")]
+
+
+def consume(db_file, name, handle, batch_size=BATCH_SIZE, tables=None):
+    # Feeds the consumer's unacknowledged changes to handle(batch) and acknowledges each batch
+    # once handle returns: delivery is at least once, so handlers must tolerate repeats
+    conn = get_connection(db_file)
+    row = conn.execute("SELECT acked_seq FROM ChangeConsumers WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        raise ChangeLogError(f"Unknown change consumer {name!r}")
+    position, delivered = row[0], 0
+    while True:
+        batch = changes_since(db_file, position, batch_size, tables)
+        if not batch:
+            return delivered
+        handle(batch)
+        position = batch[-1]["seq"]
+        acknowledge(db_file, name, position)
+        delivered += len(batch)
+
+
+def compact_changelog(db_file):
+    # Purges every change all registered consumers have acknowledged; with no consumers nothing
+    # has been acknowledged, so nothing goes. Returns the number of changes purged.
+    conn = get_connection(db_file)
+    horizon = conn.execute("SELECT min(acked_seq) FROM ChangeConsumers").fetchone()[0]
+    if horizon is None:
+        return 0
+    purged = 0
+    while True:
+        with write_transaction(conn):
+            deleted = conn.execute(
+                "DELETE FROM ChangeLog WHERE seq IN (SELECT seq FROM ChangeLog WHERE seq <= ? ORDER BY seq LIMIT ?)",
+                (horizon, COMPACT_CHUNK)).rowcount
+        purged += deleted
+        if deleted < COMPACT_CHUNK:
+            return purged
+
+
+def _last_written(path):
+    # seq of the last complete line in a sink file, 0 for a new file
+    if not os.path.exists(path):
+        return 0
+    last = 0
+    with open(path, 'rb') as file:
+        file.seek(max(0, os.path.getsize(path) - 65536))
+        for line in file.read().splitlines():
+            try:
+                last = json.loads(line)["seq"]
+            except (ValueError, KeyError):
+                continue
+    return last
+
+
+def sync_to_file(db_file, path, name="file-sink", batch_size=BATCH_SIZE):
+    # A minimal replication target: appends each change to a JSON-lines file and fsyncs it before
+    # acknowledging. Changes already in the file (written before a crash, never acknowledged) are
+    # skipped, so the file holds every change exactly once. Returns the number appended.
+    register_consumer(db_file, name, from_seq=0)
+    written = _last_written(path)
+    appended = 0
+
+    with open(path, 'a', encoding='utf-8') as file:
+        def append(batch):
+            nonlocal appended
+            for change in batch:
+                if change["seq"] > written:
+                    file.write(json.dumps(change, separators=(",", ":")) + "\n")
+                    appended += 1
+            file.flush()
+            os.fsync(file.fileno())
+
+        consume(db_file, name, append, batch_size)
+    return appended
+
+
+def replay(path):
+    # Rebuilds {table: {key: row}} from a sink file, for checking a mirror against the database
+    tables = {table: {} for table in CAPTURED}
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            change = json.loads(line)
+            rows = tables.setdefault(change["table"], {})
+            if change["op"] == "delete":
+                rows.pop(change["key"], None)
+            else:
+                rows[change["key"]] = change["row"]
+    return tables
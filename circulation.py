@@ -0,0 +1,105 @@
+import time
+
+from cache import invalidate_books
+from db import get_connection, write_transaction
+from migrations import ensure_migrated
+
+# IssuedBooks and the negative-stock guard on Books come from migration 7
+
+
+class CirculationError(Exception):
+    pass
+
+
+def _today():
+    return time.strftime("%Y-%m-%d")
+
+
+def issue_book(db_file, book_id, student_id, issue_date=None, due_date=None):
+    ensure_migrated(db_file)
+    conn = get_connection(db_file)
+
+    with write_transaction(conn):
+        # The quantity check and decrement are one statement, so two desks can't both take the last copy
+        taken = conn.execute(
+            "UPDATE Books SET quantity = quantity - 1 WHERE book_id = ? AND quantity > 0", (book_id,)
+        ).rowcount
+        if not taken:
+            exists = conn.execute("SELECT 1 FROM Books WHERE book_id = ?", (book_id,)).fetchone()
+            raise CirculationError(f"No copies of book {book_id} available." if exists
+                                   else f"Book with ID {book_id} not found.")
+
+        if conn.execute("SELECT 1 FROM Students WHERE student_id = ?", (student_id,)).fetchone() is None:
+            raise CirculationError(f"Student with ID {student_id} not found.")
+
+        cursor = conn.execute("""
+            INSERT INTO IssuedBooks (book_id, student_id, issue_date, due_date)
+            VALUES (?, ?, ?, ?)
+        """, (book_id, student_id, issue_date or _today(), due_date))
+
+    invalidate_books(db_file, [book_id])
+    return cursor.lastrowid
+
+
+def return_issue(db_file, issue_id, return_date=None):
+    returned, _ = return_issues(db_file, [issue_id], return_date)
+    return bool(returned)
+
+
+def return_issues(db_file, issue_ids, return_date=None):
+    # Checks in many loans in one transaction. Returns (returned_ids, rejected_ids); an ID is
+    # rejected when it doesn't exist or the loan was already closed, so stock is never double-credited.
+    ensure_migrated(db_file)
+    conn = get_connection(db_file)
+    issue_ids = list(dict.fromkeys(int(issue_id) for issue_id in issue_ids))
+    if not issue_ids:
+        return [], []
+
+    with write_transaction(conn):
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS _returns (issue_id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM _returns")
+        conn.executemany("INSERT INTO _returns (issue_id) VALUES (?)", [(i,) for i in issue_ids])
+
+        open_loans = conn.execute("""
+            SELECT i.issue_id, i.book_id FROM IssuedBooks AS i
+            JOIN _returns AS r ON r.issue_id = i.issue_id
+            WHERE i.return_date IS NULL
+        """).fetchall()
+        returned = [row[0] for row in open_loans]
+
+        conn.execute("""
+            UPDATE Books SET quantity = quantity + (
+                SELECT COUNT(*) FROM IssuedBooks AS i
+                JOIN _returns AS r ON r.issue_id = i.issue_id
+                WHERE i.book_id = Books.book_id AND i.return_date IS NULL
+            )
+            WHERE book_id IN (
+                SELECT i.book_id FROM IssuedBooks AS i
+                JOIN _returns AS r ON r.issue_id = i.issue_id
+                WHERE i.return_date IS NULL
+            )
+        """)
+        conn.execute("""
+            UPDATE IssuedBooks SET return_date = ?
+            WHERE issue_id IN (SELECT issue_id FROM _returns) AND return_date IS NULL
+        """, (return_date or _today(),))
+        conn.execute("DELETE FROM _returns")
+
+    invalidate_books(db_file, {row[1] for row in open_loans})
+    returned_set = set(returned)
+    return returned, [i for i in issue_ids if i not in returned_set]
+
+
+def open_loans(db_file, student_id=None, book_id=None):
+    ensure_migrated(db_file)
+    conditions, params = ["return_date IS NULL"], []
+    if student_id is not None:
+        conditions.append("student_id = ?")
+        params.append(student_id)
+    if book_id is not None:
+        conditions.append("book_id = ?")
+        params.append(book_id)
+    return get_connection(db_file).execute(
+        f"SELECT issue_id, book_id, student_id, issue_date, due_date FROM IssuedBooks "
+        f"WHERE {' AND '.join(conditions)} ORDER BY issue_id", params
+    ).fetchall()
@@ -0,0 +1,401 @@
+import argparse
+import sys
+
+from paths import BranchError, library_paths
+
+# Keep this module's imports light: it is meant to start in well under 100 ms on a
+# headless server. Anything heavier is imported inside the command that needs it.
+
+
+def cmd_import(args):
+    from ingest import SchemaError, ingest_csv
+    from migrations import migrate
+
+    migrate(args.db)
+    try:
+        if args.books:
+            ingest_csv(args.db, args.books, "books", reject_path=args.rejects, workers=args.jobs)
+        if args.students:
+            ingest_csv(args.db, args.students, "students", reject_path=args.rejects, workers=args.jobs)
+    except SchemaError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_export(args):
+    from export import ExportError, export_store, export_table
+
+    columns = args.columns.split(",") if args.columns else None
+    try:
+        if args.sort:
+            # Sorted exports come from the in-memory book store, which can order by any column
+            if args.table != "books" or args.where:
+                raise ExportError("--sort is only supported for books without --where")
+            from book_store import book_store
+            store = book_store(args.db)
+            result = export_store(store, args.output, fmt=args.format, columns=columns,
+                                  indexes=store.order(args.sort, args.desc), compress=True if args.gzip else None)
+        else:
+            result = export_table(args.db, args.table, args.output, fmt=args.format, columns=columns,
+                                  filters=args.where, compress=True if args.gzip else None)
+    except ExportError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.output not in (None, "-"):
+        print(f"Exported {result['rows']} {args.table} to {args.output} in {result['seconds']:.2f}s")
+    return 0
+
+
+def cmd_search(args):
+    if args.table == "books" and args.fuzzy:
+        from fuzzy import fuzzy_search
+        rows = fuzzy_search(args.db, args.query, limit=args.limit)
+    elif args.table == "books" and args.substring:
+        from book_store import book_store
+        store = book_store(args.db)
+        rows = store.rows(store.matching(args.query)[:args.limit])
+    elif args.table == "books":
+        from catalog import search_books
+        rows = search_books(args.db, args.query, limit=args.limit)
+    else:
+        from students import find_students
+        rows = find_students(args.db, args.query, limit=args.limit)
+
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+    return 0
+
+
+def cmd_stats(args):
+    from db import get_connection
+    from inventory import inventory_summary, rebuild_inventory, verify_inventory
+    from migrations import MigrationError, migrate
+
+    try:
+        migrate(args.db)   # the inventory figures come from migration 4
+    except MigrationError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.rebuild:
+        rebuild_inventory(args.db)
+        print("Inventory figures rebuilt from a full scan")
+    if args.verify or args.rebuild:
+        mismatches = verify_inventory(args.db)
+        for dimension, value, stored, scanned in mismatches:
+            print(f"Mismatch {dimension} {value!r}: stored {stored}, scanned {scanned}")
+        print(f"Inventory figures {'differ in ' + str(len(mismatches)) + ' rows' if mismatches else 'verified'}")
+        if mismatches:
+            return 1
+
+    conn = get_connection(args.db)
+    summary = inventory_summary(args.db)
+    students = conn.execute("SELECT COUNT(*) FROM Students").fetchone()[0]
+    print(f"Titles:       {summary['titles']}")
+    print(f"Copies:       {summary['copies']}")
+    print(f"Out of stock: {summary['out_of_stock']}")
+    print(f"Students:     {students}")
+
+    has_loans = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'IssuedBooks'"
+    ).fetchone()
+    if has_loans:
+        loans = conn.execute("SELECT COUNT(*) FROM IssuedBooks WHERE return_date IS NULL").fetchone()[0]
+        print(f"On loan:      {loans}")
+
+    if args.by:
+        print()
+        for value, titles, copies in summary["genres" if args.by == "genre" else "decades"]:
+            print(f"{value or '(none)'}\t{titles}\t{copies}")
+    return 0
+
+
+def cmd_bulk(args):
+    from bulk_edit import DeltaError, apply_deltas, read_deltas, summarize, write_report
+
+    try:
+        deltas = read_deltas(args.deltas)
+    except DeltaError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    report = apply_deltas(args.db, deltas, dry_run=args.dry_run)
+    if args.report:
+        write_report(report, args.report)
+    else:
+        for outcome in report["outcomes"]:
+            if outcome["status"] != "unchanged":
+                print(f"line {outcome['line']}\t{outcome['book_id']}\t{outcome['action']}\t"
+                      f"{outcome['status']}\t{outcome['detail']}")
+    print(summarize(report))
+    return 0
+
+
+def cmd_migrate(args):
+    from migrations import LATEST_VERSION, MigrationError, migrate, schema_version
+
+    if args.status:
+        print(f"Schema version {schema_version(args.db)} of {LATEST_VERSION}")
+        return 0
+    try:
+        applied = migrate(args.db)
+    except MigrationError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Applied migrations {', '.join(map(str, applied))}" if applied else "Schema is up to date")
+    return 0
+
+
+def cmd_changes(args):
+    import json
+    from changelog import (ChangeLogError, acknowledge, changes_since, compact_changelog, consumers, last_seq,
+                           register_consumer, sync_to_file, unregister_consumer)
+
+    try:
+        if args.action == "status":
+            print(f"Last change: {last_seq(args.db)}")
+            for name, acked, acked_at, pending in consumers(args.db):
+                print(f"{name}\tacked {acked}\t{acked_at or 'never'}\t{pending} pending")
+        elif args.action == "show":
+            for change in changes_since(args.db, args.since, limit=args.limit):
+                print(json.dumps(change, separators=(",", ":")))
+        elif args.action == "register":
+            print(f"{args.name} is at change {register_consumer(args.db, args.name, args.since)}")
+        elif args.action == "unregister":
+            if not unregister_consumer(args.db, args.name):
+                raise ChangeLogError(f"Unknown change consumer {args.name!r}")
+        elif args.action == "ack":
+            acknowledge(args.db, args.name, args.seq)
+        elif args.action == "sync":
+            appended = sync_to_file(args.db, args.path, name=args.name)
+            print(f"Appended {appended} changes to {args.path}")
+        elif args.action == "compact":
+            print(f"Purged {compact_changelog(args.db)} acknowledged changes")
+    except ChangeLogError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_branches(args):
+    from branches import (BranchError, create_branch, find_book_all, find_students_all, list_branches,
+                          search_books_all, stats_all)
+
+    selected = args.only.split(",") if getattr(args, "only", None) else None
+    try:
+        if args.action == "list":
+            for name in list_branches():
+                print(name)
+        elif args.action == "create":
+            print(f"Branch {args.name} ready at {create_branch(args.name)}")
+        elif args.action == "search" and args.table == "books":
+            for row in search_books_all(args.query, limit=args.limit, branches=selected):
+                print("\t".join("" if value is None else str(value) for value in row))
+        elif args.action == "search":
+            for row in find_students_all(args.query, limit=args.limit, branches=selected):
+                print("\t".join("" if value is None else str(value) for value in row))
+        elif args.action == "find":
+            for branch, row in find_book_all(args.book_id, branches=selected):
+                print("\t".join([branch] + ["" if value is None else str(value) for value in row]))
+        elif args.action == "stats":
+            stats = stats_all(branches=selected)
+            for branch, summary in stats["branches"].items():
+                print(f"{branch}\t{summary['titles']} titles\t{summary['copies']} copies\t"
+                      f"{summary['out_of_stock']} out of stock\t{summary['students']} students")
+            print(f"Titles:       {stats['titles']}")
+            print(f"Copies:       {stats['copies']}")
+            print(f"Out of stock: {stats['out_of_stock']}")
+            print(f"Students:     {stats['students']}")
+            if args.by:
+                print()
+                for value, titles, copies in stats["genres" if args.by == "genre" else "decades"]:
+                    print(f"{value or '(none)'}\t{titles}\t{copies}")
+    except BranchError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _size(size):
+    return f"{size / (1024 * 1024):.1f} MiB"
+
+
+def cmd_backup(args):
+    from backup import BackupError, create_backup, list_backups, verify_backup
+
+    try:
+        if args.action == "create":
+            result = create_backup(args.db, compress=args.gzip, keep=args.keep)
+            print(f"Backed up {result['pages']} pages to {result['path']} ({_size(result['bytes'])}) "
+                  f"in {result['seconds']:.1f}s")
+            for path in result["pruned"]:
+                print(f"Removed {path}")
+        elif args.action == "list":
+            for path, taken, label, size in list_backups(args.db):
+                print(f"{path}\t{taken}\t{_size(size)}" + (f"\t{label}" if label else ""))
+        elif args.action == "verify":
+            paths = args.paths or [path for path, _, _, _ in list_backups(args.db)]
+            failed = 0
+            for path in paths:
+                problems = verify_backup(path)
+                print(f"{path}\t{'ok' if not problems else problems[0]}")
+                failed += bool(problems)
+            return 1 if failed else 0
+    except BackupError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_restore(args):
+    from backup import BackupError, restore_backup
+
+    try:
+        result = restore_backup(args.db, args.snapshot)
+    except BackupError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Restored {args.db} from {result['path']} in {result['seconds']:.1f}s")
+    if result["safety"]:
+        print(f"The previous contents are in {result['safety']}")
+    return 0
+
+
+def cmd_dedupe(args):
+    import core
+    core.STUDENTS_CSV = args.students
+    removed = core.remove_duplicate_students()
+    print(f"Removed {removed} duplicate rows from {core.STUDENTS_CSV}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Headless library administration")
+    parser.add_argument("--db", help="database file (default: database/library.db, or the LIBRARY_BRANCH branch's)")
+    parser.add_argument("--branch", help="work on this branch's database and CSV files instead of --db")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("import", help="validate and bulk-load books and/or students from CSV")
+    command.add_argument("--books", help="books CSV file")
+    command.add_argument("--students", help="students CSV file")
+    command.add_argument("--jobs", type=int, help="parser processes (default: all cores for large files)")
+    command.add_argument("--rejects", help="file for rejected rows (default: <csv>.rejects.csv)")
+    command.set_defaults(func=cmd_import)
+
+    command = commands.add_parser("export", help="stream a table to CSV or JSONL")
+    command.add_argument("table", choices=["books", "students"])
+    command.add_argument("-o", "--output", help="output file, written atomically (default: stdout)")
+    command.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file name, else csv")
+    command.add_argument("--gzip", action="store_true", help="compress the output (implied by a .gz name)")
+    command.add_argument("--columns", help="comma-separated columns to export")
+    command.add_argument("--where", action="append", default=[],
+                         help="filter such as genre=Fiction, year>=2000 or title~glass; repeatable")
+    command.add_argument("--sort", choices=["book_id", "title", "author", "genre", "year", "quantity"],
+                         help="books only: order rows by this column (case-insensitive, ties by book_id)")
+    command.add_argument("--desc", action="store_true", help="with --sort: descending order")
+    command.set_defaults(func=cmd_export)
+
+    command = commands.add_parser("search", help="search books or students")
+    command.add_argument("table", choices=["books", "students"])
+    command.add_argument("query")
+    command.add_argument("--limit", type=int, default=20)
+    command.add_argument("--substring", action="store_true",
+                         help="books only: plain substring match instead of ranked full-text search")
+    command.add_argument("--fuzzy", action="store_true",
+                         help="books only: typo-tolerant match on titles and authors, closest first")
+    command.set_defaults(func=cmd_search)
+
+    command = commands.add_parser("stats", help="print catalog and loan counts")
+    command.add_argument("--by", choices=["genre", "decade"], help="also list titles and copies per genre or decade")
+    command.add_argument("--verify", action="store_true", help="check the inventory figures against a full scan")
+    command.add_argument("--rebuild", action="store_true", help="recompute the inventory figures, then verify")
+    command.set_defaults(func=cmd_stats)
+
+    command = commands.add_parser("bulk", help="apply a delta file of book updates, adjustments and deletes")
+    command.add_argument("deltas", help="CSV with book_id, action (update/adjust/delete) and field columns")
+    command.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    command.add_argument("--report", help="write per-row outcomes to this CSV instead of stdout")
+    command.set_defaults(func=cmd_bulk)
+
+    command = commands.add_parser("migrate", help="bring the database schema up to date")
+    command.add_argument("--status", action="store_true", help="only print the current schema version")
+    command.set_defaults(func=cmd_migrate)
+
+    command = commands.add_parser("changes", help="read, consume and compact the change log")
+    actions = command.add_subparsers(dest="action", required=True)
+    action = actions.add_parser("status", help="last change and each consumer's position")
+    action = actions.add_parser("show", help="print changes after a sequence number as JSON lines")
+    action.add_argument("since", type=int)
+    action.add_argument("--limit", type=int, default=1000)
+    action = actions.add_parser("register", help="add a consumer")
+    action.add_argument("name")
+    action.add_argument("--since", type=int, help="start after this change (default: the latest)")
+    action = actions.add_parser("unregister", help="remove a consumer so it no longer holds back compaction")
+    action.add_argument("name")
+    action = actions.add_parser("ack", help="record that a consumer has applied every change up to seq")
+    action.add_argument("name")
+    action.add_argument("seq", type=int)
+    action = actions.add_parser("sync", help="append new changes to a JSON-lines file (a demo replica)")
+    action.add_argument("path")
+    action.add_argument("--name", default="file-sink", help="consumer name (default: file-sink)")
+    actions.add_parser("compact", help="purge changes every consumer has acknowledged")
+    command.set_defaults(func=cmd_changes)
+
+    command = commands.add_parser("branches", help="manage branch databases and query across them")
+    actions = command.add_subparsers(dest="action", required=True)
+    actions.add_parser("list", help="list branches")
+    action = actions.add_parser("create", help="create an empty, fully migrated branch database")
+    action.add_argument("name")
+    action = actions.add_parser("search", help="search every branch; results merged in rank or name order")
+    action.add_argument("table", choices=["books", "students"])
+    action.add_argument("query")
+    action.add_argument("--limit", type=int, default=20)
+    action.add_argument("--only", help="comma-separated branches (default: all)")
+    action = actions.add_parser("find", help="list the branches holding a book")
+    action.add_argument("book_id")
+    action.add_argument("--only", help="comma-separated branches (default: all)")
+    action = actions.add_parser("stats", help="catalog totals per branch and combined")
+    action.add_argument("--by", choices=["genre", "decade"], help="also list the combined genre or decade figures")
+    action.add_argument("--only", help="comma-separated branches (default: all)")
+    command.set_defaults(func=cmd_branches)
+
+    command = commands.add_parser("backup", help="take, list and check online snapshots of the database")
+    actions = command.add_subparsers(dest="action", required=True)
+    action = actions.add_parser("create", help="snapshot the database while it stays in use, then rotate")
+    action.add_argument("--gzip", action="store_true", help="compress the snapshot")
+    action.add_argument("--keep", type=int, default=7, help="snapshots kept by rotation, 0 for all (default: 7)")
+    actions.add_parser("list", help="list snapshots, newest first")
+    action = actions.add_parser("verify", help="run an integrity check on snapshots")
+    action.add_argument("paths", nargs="*", help="snapshot files (default: all)")
+    command.set_defaults(func=cmd_backup)
+
+    command = commands.add_parser("restore", help="replace the database with a snapshot, saving the current one")
+    command.add_argument("snapshot", nargs="?", help="snapshot file (default: the newest one not taken by a restore)")
+    command.set_defaults(func=cmd_restore)
+
+    command = commands.add_parser("dedupe", help="drop duplicate emails from the students CSV")
+    command.add_argument("--students", help="students CSV file (default: Students.csv)")
+    command.set_defaults(func=cmd_dedupe)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Plain paths for the commands: --branch wins over --db, and either over LIBRARY_BRANCH's database
+    try:
+        db_file, books_csv, students_csv = library_paths(args.branch)
+    except BranchError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.db and not args.branch:
+        db_file = args.db
+    args.db = db_file
+    if args.command == "import" and not (args.books or args.students):
+        args.books, args.students = books_csv, students_csv
+    if args.command == "dedupe" and not args.students:
+        args.students = students_csv
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
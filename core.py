@@ -0,0 +1,216 @@
+import csv
+import os
+import sqlite3
+import sys
+
+from book_store import book_store
+from cache import invalidate_books, invalidate_students
+from circulation import return_issue
+from csv_sync import csv_unchanged, sync_csv
+from db import get_connection, write_transaction
+from fuzzy import index_books
+from ingest import SchemaError, ingest_csv
+from migrations import migrate
+from paths import library_paths
+from students import find_students
+
+BRANCH = os.environ.get("LIBRARY_BRANCH")  # branch mode: this branch's own database and CSVs (see paths.py)
+DB_FILE, BOOKS_CSV, STUDENTS_CSV = library_paths(BRANCH)
+
+
+# The GUI installs a messagebox-based handler; headless callers only see errors on stderr
+_message_handler = None
+
+
+def set_message_handler(handler):
+    global _message_handler
+    _message_handler = handler
+
+
+def show_info(title, message):
+    if _message_handler is not None:
+        _message_handler("info", title, message)
+
+
+def show_error(title, message):
+    if _message_handler is not None:
+        _message_handler("error", title, message)
+    else:
+        print(f"{title}: {message}", file=sys.stderr)
+
+
+def insert_books_from_csv():
+    return ingest_csv(DB_FILE, BOOKS_CSV, "books")
+
+
+def insert_students_from_csv():
+    return ingest_csv(DB_FILE, STUDENTS_CSV, "students")
+
+
+def remove_duplicate_students():
+    # Streams into a temporary file and only replaces the CSV when something was dropped,
+    # so an already clean file keeps its mtime and the sync manifest can skip it
+    seen_emails = set()
+    removed = 0
+    tmp_path = STUDENTS_CSV + ".tmp"
+
+    with open(STUDENTS_CSV, 'r', encoding='utf-8', newline='') as source, \
+            open(tmp_path, 'w', encoding='utf-8', newline='') as target:
+        reader = csv.DictReader(source)
+        fieldnames = ['student_id', 'name', 'email', 'date_of_birth']
+        writer = csv.DictWriter(target, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for row in reader:
+            email = (row.get('email') or '').strip()
+            if email not in seen_emails:
+                seen_emails.add(email)
+                writer.writerow(row)
+            else:
+                removed += 1
+
+    if removed:
+        os.replace(tmp_path, STUDENTS_CSV)
+    else:
+        os.remove(tmp_path)
+    return removed
+
+
+def initialize_database():
+    # Schema first (versioned, see migrations.py), then the CSV data. Unchanged CSV files are
+    # skipped on size/mtime alone; changed ones only apply their row deltas. A new branch may
+    # have no CSV files yet.
+    os.makedirs(os.path.dirname(DB_FILE) or ".", exist_ok=True)
+    migrate(DB_FILE)
+    if os.path.exists(STUDENTS_CSV) and not csv_unchanged(DB_FILE, STUDENTS_CSV):
+        remove_duplicate_students()
+    for csv_path, kind in ((BOOKS_CSV, "books"), (STUDENTS_CSV, "students")):
+        if os.path.exists(csv_path):
+            try:
+                sync_csv(DB_FILE, csv_path, kind)
+            except SchemaError as e:
+                show_error("Error", f"{csv_path} was not loaded: {e}")
+
+
+
+def insert_book_row(conn, book_id, title, author, genre, year, quantity):
+    # Row-level writes take a connection and never commit, so the caller (or the db worker) owns the transaction
+    conn.execute("""
+    INSERT INTO Books (book_id, title, author, genre, year, quantity)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """, (book_id, title, author, genre, year, quantity))
+
+
+def book_updates(title=None, author=None, genre=None, year=None, quantity=None):
+    # Only fields that were filled in are changed
+    fields = {"title": title, "author": author, "genre": genre, "year": year, "quantity": quantity}
+    return {column: value for column, value in fields.items() if value}
+
+
+def update_book_row(conn, book_id, updates):
+    # Returns False when the book doesn't exist
+    if not updates:
+        return conn.execute("SELECT 1 FROM Books WHERE book_id = ?", (book_id,)).fetchone() is not None
+    assignments = ", ".join(f"{column} = ?" for column in updates)
+    cursor = conn.execute(f"UPDATE Books SET {assignments} WHERE book_id = ?", list(updates.values()) + [book_id])
+    return cursor.rowcount > 0
+
+
+def insert_student_row(conn, name, email, date_of_birth, student_id):
+    conn.execute("""
+    INSERT INTO Students (student_id, name, email, date_of_birth)
+    VALUES (?, ?, ?, ?)
+    """, (student_id, name, email, date_of_birth))
+
+
+def add_book(book_id, title, author, genre, year, quantity):
+
+    connection = get_connection(DB_FILE)
+
+    try:
+        with write_transaction(connection):
+            insert_book_row(connection, book_id, title, author, genre, year, quantity)
+        invalidate_books(DB_FILE, [book_id])
+        index_books(DB_FILE, [book_id])
+        print("Book added successfully.")
+        show_info("Success", "Book added successfully!")
+    except sqlite3.IntegrityError:
+        print("Error: Book ID must be unique.")
+        show_error("Error", "Book ID already exists!")
+    except Exception as e:
+        print(f"Error: {e}")
+        show_error("Error", f"Failed to add book: {e}")
+
+def show_books():
+
+    connection = get_connection(DB_FILE)
+    cursor = connection.cursor()
+    cursor.execute("SELECT book_id, title, author, genre, year, quantity FROM Books")
+    books = cursor.fetchall()
+    return books
+
+
+def fetch_students(search_query=""):
+
+    students = find_students(DB_FILE, search_query)
+
+    #print("Fetched Students:", students)  # Debugging print statement
+    return students
+
+
+def delete_book(book_id):
+
+    connection = get_connection(DB_FILE)
+    with write_transaction(connection):
+        connection.execute("DELETE FROM Books WHERE book_id = ?", (book_id,))
+    invalidate_books(DB_FILE, [book_id])
+
+
+def edit_book(book_id, title=None, author=None, genre=None, year=None, quantity=None):
+
+    connection = get_connection(DB_FILE)
+
+    # The UPDATE's row count doubles as the existence check
+    updates = book_updates(title, author, genre, year, quantity)
+    with write_transaction(connection):
+        found = update_book_row(connection, book_id, updates)
+
+    if not found:
+        show_error("Error", f"Book with ID {book_id} not found.")
+        return False
+
+    if updates:
+        invalidate_books(DB_FILE, [book_id])
+        index_books(DB_FILE, [book_id])
+        show_info("Success", f"Book with ID {book_id} updated successfully.")
+
+    return True
+
+def return_book(issue_id, return_date):
+
+    if return_issue(DB_FILE, issue_id, return_date):
+        print("Book returned successfully.")
+    else:
+        print("Invalid issue ID.")
+
+
+
+def add_student(name, email, date_of_birth, student_id):
+
+    connection = get_connection(DB_FILE)
+
+    try:
+        with write_transaction(connection):
+            insert_student_row(connection, name, email, date_of_birth, student_id)
+        invalidate_students(DB_FILE, [student_id])
+        print("Student added successfully.")
+        show_info("Success", "Student added successfully!")
+    except sqlite3.IntegrityError:
+        print("Error: Student ID or Email must be unique.")
+        show_error("Error", "Student ID or Email already exists!")
+
+
+def fetch_books():
+
+    # A compact columnar snapshot (see book_store.py); it iterates and indexes like the
+    # list of (book_id, title, author, genre, year, quantity) tuples it replaces
+    return book_store(DB_FILE)
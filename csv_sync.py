@@ -0,0 +1,221 @@
+import csv
+import hashlib
+import os
+import time
+
+from cache import invalidate_books, invalidate_students
+from db import get_connection, write_transaction
+from ingest import SCHEMAS, column_positions, validate_row
+from migrations import ensure_migrated
+
+BATCH_SIZE = 5000
+HASH_CHUNK = 1024 * 1024
+
+# The manifest (SyncFiles, SyncRows) records each synced file and the hash of every row it had;
+# its tables come from migration 9.
+
+# Per kind: which field is the key and how to apply staged rows to the real table. Rows are
+# parsed and validated against ingest.SCHEMAS, the same as the importer.
+KINDS = {
+    "books": {
+        "key": lambda values: values[0],
+        "columns": "book_id, title, author, genre, year, quantity",
+        "staging": "row_key TEXT PRIMARY KEY, row_hash BLOB, book_id TEXT, title TEXT, author TEXT, "
+                   "genre TEXT, year INTEGER, quantity INTEGER",
+        "table": "Books",
+        "key_column": "book_id",
+        "update": "title = excluded.title, author = excluded.author, genre = excluded.genre, "
+                  "year = excluded.year, quantity = excluded.quantity",
+        "invalidate": invalidate_books,
+    },
+    "students": {
+        "key": lambda values: values[1].lower(),
+        "columns": "name, email, date_of_birth",
+        "staging": "row_key TEXT PRIMARY KEY, row_hash BLOB, name TEXT, email TEXT, date_of_birth TEXT",
+        "table": "Students",
+        "key_column": "email",
+        "update": "name = excluded.name, date_of_birth = excluded.date_of_birth",
+        "invalidate": invalidate_students,
+    },
+}
+
+
+def _manifest_key(csv_path):
+    return os.path.abspath(csv_path)
+
+
+def file_hash(csv_path):
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def row_hash(values):
+    text = "\x1f".join("" if value is None else str(value) for value in values)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+
+
+def _manifest_entry(db_file, csv_path):
+    ensure_migrated(db_file)
+    return get_connection(db_file).execute(
+        "SELECT size, mtime_ns, sha256 FROM SyncFiles WHERE path = ?", (_manifest_key(csv_path),)
+    ).fetchone()
+
+
+def _record_file(conn, csv_path, stat, sha256):
+    conn.execute("""
+        INSERT INTO SyncFiles (path, size, mtime_ns, sha256, synced_at) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (path) DO UPDATE SET
+            size = excluded.size, mtime_ns = excluded.mtime_ns, sha256 = excluded.sha256,
+            synced_at = excluded.synced_at
+    """, (_manifest_key(csv_path), stat.st_size, stat.st_mtime_ns, sha256, time.strftime("%Y-%m-%dT%H:%M:%S")))
+
+
+def csv_unchanged(db_file, csv_path):
+    # Cheap check: same size and mtime as the last sync. No file content is read.
+    entry = _manifest_entry(db_file, csv_path)
+    if entry is None:
+        return False
+    stat = os.stat(csv_path)
+    return entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns
+
+
+def _stage_rows(conn, csv_path, kind, spec, reject_path, stats):
+    conn.execute("DROP TABLE IF EXISTS temp._incoming")
+    conn.execute(f"CREATE TEMP TABLE _incoming ({spec['staging']})")
+    # Keys of rejected rows: still in the file, so never treated as removed from it
+    conn.execute("DROP TABLE IF EXISTS temp._rejected")
+    conn.execute("CREATE TEMP TABLE _rejected (row_key TEXT PRIMARY KEY) WITHOUT ROWID")
+    placeholders = ", ".join("?" * (len(spec["columns"].split(",")) + 2))
+    insert = f"INSERT OR IGNORE INTO _incoming VALUES ({placeholders})"   # first row for a key wins
+    schema = SCHEMAS[kind]
+    reject_file = reject_writer = None
+
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, [])
+        positions = column_positions(schema, header)
+        key_position = positions[spec["key_column"]]
+        batch = []
+        try:
+            for fields in reader:
+                if not fields:
+                    continue
+                values, reason = validate_row(schema, positions, fields)
+                if values is None:
+                    if reject_writer is None:
+                        reject_file = open(reject_path, 'w', encoding='utf-8', newline='')
+                        reject_writer = csv.writer(reject_file)
+                        reject_writer.writerow(["line", "reason"] + header)
+                        stats["reject_file"] = reject_path
+                    reject_writer.writerow([reader.line_num, reason] + fields)
+                    stats["rejected"] += 1
+                    key = fields[key_position].strip() if key_position < len(fields) else ""
+                    conn.execute("INSERT OR IGNORE INTO _rejected VALUES (?)",
+                                 (key.lower() if kind == "students" else key,))
+                    continue
+                batch.append((spec["key"](values), row_hash(values)) + values)
+                if len(batch) >= BATCH_SIZE:
+                    conn.executemany(insert, batch)
+                    batch = []
+        finally:
+            if reject_file is not None:
+                reject_file.close()
+        if batch:
+            conn.executemany(insert, batch)
+
+
+def sync_csv(db_file, csv_path, kind, reject_path=None):
+    # Brings the table in line with csv_path, touching only rows whose hash changed since the last sync.
+    # On the first sync of a file existing table rows are kept, matching the plain importer. Rejected
+    # rows go to reject_path (default: <csv>.rejects.csv) with their line number and reason.
+    spec = KINDS[kind]
+    if reject_path is None:
+        reject_path = os.path.splitext(csv_path)[0] + ".rejects.csv"
+    stats = {"file": csv_path, "skipped_file": False, "added": 0, "changed": 0, "removed": 0, "rejected": 0,
+             "removals_held": 0, "reject_file": None}
+    start = time.perf_counter()
+
+    entry = _manifest_entry(db_file, csv_path)
+    stat = os.stat(csv_path)
+    if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+        stats["skipped_file"] = True
+        return stats
+
+    sha256 = file_hash(csv_path)
+    conn = get_connection(db_file)
+    if entry is not None and entry[2] == sha256:
+        # Touched but not modified: just remember the new mtime
+        with conn:
+            _record_file(conn, csv_path, stat, sha256)
+        stats["skipped_file"] = True
+        return stats
+
+    path_key = _manifest_key(csv_path)
+    table, key_column, columns = spec["table"], spec["key_column"], spec["columns"]
+    conflict = "DO NOTHING" if entry is None else f"DO UPDATE SET {spec['update']}"
+
+    with write_transaction(conn):
+        _stage_rows(conn, csv_path, kind, spec, reject_path, stats)
+
+        # New rows take fresh rowids (both tables use AUTOINCREMENT), so whatever lands above the old
+        # maximum was added and the rest of the statement's changes were updates; on a first sync,
+        # rows the table already has are left alone and counted as neither
+        last_rowid = conn.execute(f"SELECT ifnull(max(rowid), 0) FROM {table}").fetchone()[0]
+        written = conn.execute(f"""
+            INSERT INTO {table} ({columns})
+            SELECT {columns} FROM _incoming AS i
+            WHERE NOT EXISTS (
+                SELECT 1 FROM SyncRows AS s WHERE s.path = ? AND s.row_key = i.row_key AND s.row_hash = i.row_hash
+            )
+            ON CONFLICT ({key_column}) {conflict}
+        """, (path_key,)).rowcount
+        stats["added"] = conn.execute(f"SELECT count(*) FROM {table} WHERE rowid > ?", (last_rowid,)).fetchone()[0]
+        stats["changed"] = written - stats["added"]
+
+        # Rows that were synced from this file before and are gone from it now. A row that is still
+        # there but failed validation keeps its table row and its manifest hash. A rejected row whose
+        # key matches nothing synced before (a mangled email, say) may be any of the missing rows, so
+        # removals wait until the file is fixed.
+        removed_keys = conn.execute("""
+            SELECT s.row_key FROM SyncRows AS s
+            WHERE s.path = ? AND NOT EXISTS (SELECT 1 FROM _incoming AS i WHERE i.row_key = s.row_key)
+                AND NOT EXISTS (SELECT 1 FROM _rejected AS r WHERE r.row_key = s.row_key)
+        """, (path_key,)).fetchall()
+        unmatched = conn.execute("""
+            SELECT 1 FROM _rejected AS r
+            WHERE NOT EXISTS (SELECT 1 FROM SyncRows AS s WHERE s.path = ? AND s.row_key = r.row_key)
+        """, (path_key,)).fetchone()
+        if removed_keys and unmatched:
+            stats["removals_held"] = len(removed_keys)
+            removed_keys = []
+        stats["removed"] = len(removed_keys)
+        if removed_keys:
+            match = f"lower({key_column})" if kind == "students" else key_column
+            conn.executemany(f"DELETE FROM {table} WHERE {match} = ?", removed_keys)
+            conn.executemany("DELETE FROM SyncRows WHERE path = ? AND row_key = ?",
+                             [(path_key, key) for (key,) in removed_keys])
+
+        conn.execute("""
+            INSERT INTO SyncRows (path, row_key, row_hash)
+            SELECT ?, row_key, row_hash FROM _incoming WHERE true
+            ON CONFLICT (path, row_key) DO UPDATE SET row_hash = excluded.row_hash
+            WHERE row_hash IS NOT excluded.row_hash
+        """, (path_key,))
+        _record_file(conn, csv_path, stat, sha256)
+        conn.execute("DROP TABLE temp._incoming")
+        conn.execute("DROP TABLE temp._rejected")
+
+    if stats["added"] or stats["changed"] or stats["removed"]:
+        spec["invalidate"](db_file)
+
+    stats["seconds"] = time.perf_counter() - start
+    print(f"Synced {csv_path}: {stats['added']} added, {stats['changed']} changed, "
+          f"{stats['removed']} removed, {stats['rejected']} rejected in {stats['seconds']:.2f}s")
+    if stats["reject_file"]:
+        print(f"Rejected rows written to {stats['reject_file']}")
+    if stats["removals_held"]:
+        print(f"{stats['removals_held']} rows missing from {csv_path} were kept until its rejected rows are fixed")
+    return stats
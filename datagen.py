@@ -0,0 +1,97 @@
+import argparse
+import csv
+import os
+import random
+
+# Vocabulary in the style of the shipped Books.csv / Students.csv
+TITLE_WORDS = [
+    "Echoes", "Eternity", "Looking", "Glass", "Winds", "Change", "Midnight", "Sun", "Parallel", "Lives",
+    "Whispering", "Shadows", "Silent", "River", "Broken", "Crown", "Hidden", "Garden", "Last", "Voyage",
+    "Golden", "Compass", "Forgotten", "Kingdom", "Iron", "Heart", "Distant", "Shores", "Crimson", "Sky",
+    "Secret", "Orchard", "Falling", "Stars", "Endless", "Night", "Paper", "Lanterns", "Wild", "Harbor",
+]
+FIRST_NAMES = [
+    "David", "Robert", "Patricia", "Linda", "Jane", "Emily", "John", "James", "Barbara", "Michael",
+    "Sarah", "William", "Elizabeth", "Thomas", "Jennifer", "Daniel", "Susan", "Matthew", "Karen", "Anthony",
+]
+LAST_NAMES = [
+    "Smith", "Brown", "Wilson", "Anderson", "Carter", "Johnson", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Thompson", "White", "Harris", "Clark", "Lewis", "Walker", "Hall", "Young", "King",
+]
+GENRES = [
+    "Mystery", "Science Fiction", "Fiction", "Romance", "Biography", "History", "Horror", "Fantasy",
+    "Poetry", "Thriller", "Self-Help", "Non-Fiction",
+]
+EMAIL_DOMAINS = ["example.com", "school.edu", "university.net", "college.ac", "students.org"]
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+DEFAULT_SEED = 20240101
+
+
+def parse_size(text):
+    text = text.lower()
+    if text in SIZES:
+        return SIZES[text]
+    return int(text.replace("_", ""))
+
+
+def generate_books(count, seed=DEFAULT_SEED):
+    rng = random.Random(seed)
+    width = max(3, len(str(count)))
+    for i in range(1, count + 1):
+        title = f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} Vol {rng.randint(1, 5)}"
+        author = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        yield (f"B{i:0{width}d}", title, author, rng.choice(GENRES), rng.randint(1900, 2024), rng.randint(0, 50))
+
+
+def generate_students(count, seed=DEFAULT_SEED):
+    rng = random.Random(seed + 1)
+    width = max(3, len(str(count)))
+    for i in range(1, count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        email = f"{first.lower()}.{last.lower()}{i}@{rng.choice(EMAIL_DOMAINS)}"
+        date_of_birth = f"{rng.randint(1990, 2010)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        yield (f"S{i:0{width}d}", f"{first} {last}", email, date_of_birth)
+
+
+def write_csv(path, header, rows):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+    return path
+
+
+def generate_dataset(out_dir, book_count, student_count=None, seed=DEFAULT_SEED):
+    # Files are named after their size and seed, so an existing file is reused as-is
+    if student_count is None:
+        student_count = max(1, book_count // 3)
+    os.makedirs(out_dir, exist_ok=True)
+
+    books_csv = os.path.join(out_dir, f"books_{book_count}_{seed}.csv")
+    students_csv = os.path.join(out_dir, f"students_{student_count}_{seed}.csv")
+    if not os.path.exists(books_csv):
+        write_csv(books_csv, ["book_id", "title", "author", "genre", "year", "quantity"],
+                  generate_books(book_count, seed))
+    if not os.path.exists(students_csv):
+        write_csv(students_csv, ["student_id", "name", "email", "date_of_birth"],
+                  generate_students(student_count, seed))
+    return books_csv, students_csv
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate deterministic Books/Students CSV files")
+    parser.add_argument("sizes", nargs="+", help="catalog sizes, e.g. 10k 1m 10m or a plain row count")
+    parser.add_argument("--out", default="bench_data", help="output directory (default: bench_data)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        books_csv, students_csv = generate_dataset(args.out, parse_size(size), seed=args.seed)
+        print(f"{size}: {books_csv}, {students_csv}")
+
+
+if __name__ == "__main__":
+    main()
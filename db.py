@@ -0,0 +1,153 @@
+import atexit
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+from profiler import connection_factory
+
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 16384             # PRAGMA cache_size takes negative values as KiB
+MMAP_SIZE = 256 * 1024 * 1024
+STATEMENT_CACHE_SIZE = 256        # prepared statements kept per connection
+ANALYSIS_LIMIT = 1000             # rows ANALYZE samples per index; enough for the planner, fast on big tables
+
+# One long-lived connection per (thread, database file)
+_local = threading.local()
+_lock = threading.Lock()
+_open_connections = []
+_generation = 0                   # bumped by close_all() so other threads drop their stale handles
+
+_stats = {"opened": 0, "reused": 0, "closed": 0}
+
+
+def _tune(conn):
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+
+
+def _open(db_file):
+    conn = sqlite3.connect(
+        db_file,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        # Each connection stays on its own thread; this only lets close_all() run from the main thread
+        check_same_thread=False,
+        factory=connection_factory(),
+    )
+    _tune(conn)
+    return conn
+
+
+class _Owner:
+    # Kept in thread-local storage only; it is freed when its thread ends, closing the thread's connections
+    pass
+
+
+def _close(conn):
+    try:
+        # Refreshes planner statistics that the connection's queries found stale; usually a no-op
+        if not conn.in_transaction:
+            conn.execute("PRAGMA optimize")
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def _close_thread_connections(connections):
+    with _lock:
+        closing = [conn for conn in connections.values() if conn in _open_connections]
+        for conn in closing:
+            _open_connections.remove(conn)
+        _stats["closed"] += len(closing)
+    for conn in closing:
+        _close(conn)
+
+
+def get_connection(db_file):
+    connections = getattr(_local, "connections", None)
+    if connections is None or _local.generation != _generation:
+        connections = _local.connections = {}
+        _local.generation = _generation
+        _local.owner = _Owner()
+        weakref.finalize(_local.owner, _close_thread_connections, connections)
+
+    conn = connections.get(db_file)
+    with _lock:
+        if conn is not None:
+            _stats["reused"] += 1
+            return conn
+        _stats["opened"] += 1
+
+    conn = _open(db_file)
+    connections[db_file] = conn
+    with _lock:
+        _open_connections.append(conn)
+    return conn
+
+
+def close_connection(db_file):
+    # Close the calling thread's connection to db_file, if it has one
+    connections = getattr(_local, "connections", {})
+    conn = connections.pop(db_file, None)
+    if conn is None:
+        return
+    with _lock:
+        if conn in _open_connections:
+            _open_connections.remove(conn)
+        _stats["closed"] += 1
+    conn.close()
+
+
+def close_all():
+    global _generation
+    with _lock:
+        _generation += 1
+        connections = list(_open_connections)
+        _open_connections.clear()
+        _stats["closed"] += len(connections)
+    for conn in connections:
+        _close(conn)
+
+
+atexit.register(close_all)
+
+
+@contextmanager
+def write_transaction(conn):
+    # BEGIN IMMEDIATE takes the write lock up front, so read-then-write sequences can't interleave
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+@contextmanager
+def suppressed_trigger(conn, name):
+    # Switches off a trigger that checks SuppressedTriggers (migration 11) for the caller's open
+    # transaction; the row is removed again before that commits, so no other connection sees it.
+    # Yields whether the trigger exists and is now suppressed.
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,)).fetchone() is None:
+        yield False
+        return
+    conn.execute("INSERT INTO SuppressedTriggers (name) VALUES (?)", (name,))
+    try:
+        yield True
+    finally:
+        conn.execute("DELETE FROM SuppressedTriggers WHERE name = ?", (name,))
+
+
+def connection_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["open"] = len(_open_connections)
+    return stats
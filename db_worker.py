@@ -0,0 +1,193 @@
+import atexit
+import queue
+import sqlite3
+import sys
+import threading
+import traceback
+from concurrent.futures import Future
+
+from db import get_connection
+
+MAX_GROUP = 64      # write jobs already queued together are committed in one transaction
+POLL_MS = 25        # how often a Tk widget checks a pending job
+STOP_TIMEOUT = 5
+
+# One writer thread per database file; every job runs on it, so SQLite never sees two local writers
+_workers = {}       # db_file -> (thread, job queue)
+_lock = threading.Lock()
+_stats = {"jobs": 0, "reads": 0, "writes": 0, "groups": 0, "largest_group": 0, "failed": 0,
+          "hook_errors": 0}
+
+_STOP = object()
+
+
+def _finish(future, ok, value):
+    if ok:
+        future.set_result(value)
+    else:
+        with _lock:
+            _stats["failed"] += 1
+        future.set_exception(value)
+
+
+def _run_read(job):
+    future, fn, args, _, _ = job
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        result = fn(*args)
+    except Exception as error:
+        _finish(future, False, error)
+    else:
+        _finish(future, True, result)
+
+
+def _run_group(conn, group):
+    # Each job gets its own savepoint, so one bad row fails only its own future
+    group = [job for job in group if job[0].set_running_or_notify_cancel()]
+    if not group:
+        return
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+    except sqlite3.Error as error:
+        for future, *_ in group:
+            _finish(future, False, error)
+        return
+
+    outcomes = []
+    try:
+        for future, fn, args, _, _ in group:
+            conn.execute("SAVEPOINT job")
+            try:
+                result = fn(conn, *args)
+            except Exception as error:
+                conn.execute("ROLLBACK TO job")
+                conn.execute("RELEASE job")
+                outcomes.append((False, error))
+            else:
+                conn.execute("RELEASE job")
+                outcomes.append((True, result))
+        conn.commit()
+    except sqlite3.Error as error:
+        # The commit or a savepoint failed (say, a job ended the transaction itself): nothing in
+        # the group can be trusted to have landed, so all of it is rolled back and every job fails
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+        outcomes = [(False, error)] * len(group)
+
+    with _lock:
+        _stats["groups"] += 1
+        _stats["largest_group"] = max(_stats["largest_group"], len(group))
+
+    # Results (and cache invalidation) only after the commit, so nobody sees a write that might roll back.
+    # The write has landed by now, so a failing hook is reported but the job still succeeds
+    for (future, _, _, _, after_commit), (ok, value) in zip(group, outcomes):
+        if ok and after_commit is not None:
+            try:
+                after_commit()
+            except Exception:
+                with _lock:
+                    _stats["hook_errors"] += 1
+                print("after_commit hook failed:", file=sys.stderr)
+                traceback.print_exc()
+        _finish(future, ok, value)
+
+
+def _worker_loop(db_file, jobs):
+    stopping = False
+    while not stopping:
+        job = jobs.get()
+        if job is _STOP:
+            return
+        batch = [job]
+        while len(batch) < MAX_GROUP:
+            try:
+                job = jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is _STOP:
+                stopping = True
+                break
+            batch.append(job)
+
+        conn = get_connection(db_file)
+        group = []
+        for job in batch:
+            if job[3]:
+                group.append(job)
+                continue
+            if group:
+                _run_group(conn, group)
+                group = []
+            _run_read(job)
+        if group:
+            _run_group(conn, group)
+
+
+def _queue_for(db_file):
+    with _lock:
+        worker = _workers.get(db_file)
+        if worker is None or not worker[0].is_alive():
+            jobs = queue.Queue()
+            thread = threading.Thread(target=_worker_loop, args=(db_file, jobs), name="db-worker", daemon=True)
+            thread.start()
+            worker = _workers[db_file] = (thread, jobs)
+        return worker[1]
+
+
+def _submit(db_file, fn, args, write, after_commit):
+    future = Future()
+    with _lock:
+        _stats["jobs"] += 1
+        _stats["writes" if write else "reads"] += 1
+    _queue_for(db_file).put((future, fn, args, write, after_commit))
+    return future
+
+
+def submit_read(db_file, fn, *args):
+    # fn(*args) runs on the worker thread, so get_connection() inside it returns the worker's connection
+    return _submit(db_file, fn, args, False, None)
+
+
+def submit_write(db_file, fn, *args, after_commit=None):
+    # fn(conn, *args) runs inside the worker's transaction and must not commit itself;
+    # after_commit() runs once the group it belongs to is durable
+    return _submit(db_file, fn, args, True, after_commit)
+
+
+def when_done(widget, future, on_result, on_error):
+    # Hands a job's outcome back to the Tk thread; nothing happens if the widget is gone by then
+    def poll():
+        if not widget.winfo_exists():
+            return
+        if not future.done():
+            widget.after(POLL_MS, poll)
+            return
+        error = future.exception()
+        if error is None:
+            on_result(future.result())
+        else:
+            on_error(error)
+
+    widget.after(POLL_MS, poll)
+
+
+def stop_workers():
+    with _lock:
+        workers = list(_workers.values())
+        _workers.clear()
+    for thread, jobs in workers:
+        jobs.put(_STOP)
+    for thread, _ in workers:
+        thread.join(STOP_TIMEOUT)
+
+
+def worker_stats():
+    with _lock:
+        return dict(_stats)
+
+
+# Registered after db's close_all, so it runs first: queued writes land before connections close
+atexit.register(stop_workers)
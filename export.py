@@ -0,0 +1,131 @@
+import csv
+import gzip
+import json
+import os
+import re
+import sys
+import time
+
+from db import get_connection
+
+FETCH_SIZE = 2000
+
+TABLES = {
+    "books": ("Books", ["book_id", "title", "author", "genre", "year", "quantity"], "book_id"),
+    "students": ("Students", ["student_id", "name", "email", "date_of_birth"], "student_id"),
+}
+FORMATS = ("csv", "jsonl")
+
+# column, operator, value; "~" means "contains"
+FILTER = re.compile(r"\s*(\w+)\s*(>=|<=|!=|=|<|>|~)\s*(.*?)\s*")
+OPERATORS = {"=": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">=", "~": "LIKE"}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_filter(text):
+    match = FILTER.fullmatch(text)
+    if not match:
+        raise ExportError(f"Bad filter {text!r}; use e.g. genre=Fiction, year>=2000 or title~glass")
+    return match.groups()
+
+
+def build_query(table, columns=None, filters=()):
+    table_name, all_columns, key = TABLES[table]
+    columns = list(columns) if columns else all_columns
+    unknown = [column for column in columns if column not in all_columns]
+    if unknown:
+        raise ExportError(f"Unknown {table} columns: {', '.join(unknown)}")
+
+    conditions, params = [], []
+    for item in filters:
+        column, operator, value = parse_filter(item) if isinstance(item, str) else item
+        if column not in all_columns:
+            raise ExportError(f"Unknown {table} column in filter: {column}")
+        if operator == "~":
+            value = f"%{value}%"
+        conditions.append(f"{column} {OPERATORS[operator]} ?")
+        params.append(value)
+
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT {', '.join(columns)} FROM {table_name}{where} ORDER BY {key}", params, columns
+
+
+def detect_format(output_path, fmt=None, compress=None):
+    name = output_path or ""
+    if compress is None:
+        compress = name.endswith(".gz")
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if fmt is None:
+        fmt = "jsonl" if name.endswith((".jsonl", ".json")) else "csv"
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; choose one of {', '.join(FORMATS)}")
+    return fmt, compress
+
+
+def _open_output(path, compress):
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def _write_rows(out, fmt, columns, batches, progress=None):
+    count = 0
+    writer = csv.writer(out) if fmt == "csv" else None
+    if writer is not None:
+        writer.writerow(columns)
+
+    for rows in batches:
+        if writer is not None:
+            writer.writerows(rows)
+        else:
+            out.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+        count += len(rows)
+        if progress is not None:
+            progress(count)
+    return count
+
+
+def _export(batches, columns, output_path, fmt, compress, progress):
+    # Files are written next to the target and renamed into place once complete;
+    # output_path "-" (or None) writes to stdout.
+    fmt, compress = detect_format(output_path if output_path != "-" else None, fmt, compress)
+    start = time.perf_counter()
+
+    if output_path in (None, "-"):
+        count = _write_rows(sys.stdout, fmt, columns, batches, progress)
+    else:
+        directory = os.path.dirname(os.path.abspath(output_path))
+        tmp_path = os.path.join(directory, f".{os.path.basename(output_path)}.{os.getpid()}.tmp")
+        try:
+            with _open_output(tmp_path, compress) as out:
+                count = _write_rows(out, fmt, columns, batches, progress)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    return {"rows": count, "seconds": time.perf_counter() - start, "format": fmt, "compressed": compress,
+            "path": output_path}
+
+
+def export_table(db_file, table, output_path, fmt=None, columns=None, filters=(), compress=None, progress=None):
+    # Streams the table in FETCH_SIZE batches, so memory use doesn't grow with the table
+    query, params, columns = build_query(table, columns, filters)
+    cursor = get_connection(db_file).execute(query, params)
+    batches = iter(lambda: cursor.fetchmany(FETCH_SIZE), [])
+    return _export(batches, columns, output_path, fmt, compress, progress)
+
+
+def export_store(store, output_path, fmt=None, columns=None, indexes=None, compress=None, progress=None):
+    # Exports straight from an in-memory book_store.BookStore; indexes (from store.matching()
+    # or store.order()) pick and order the rows
+    columns = list(columns) if columns else list(TABLES["books"][1])
+    unknown = [column for column in columns if column not in TABLES["books"][1]]
+    if unknown:
+        raise ExportError(f"Unknown books columns: {', '.join(unknown)}")
+    return _export(store.batches(FETCH_SIZE, indexes, columns), columns, output_path, fmt, compress, progress)
@@ -0,0 +1,275 @@
+import heapq
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+
+from cache import cached
+from db import get_connection
+from migrations import ensure_migrated
+
+TOP_K = 20
+MAX_CORRECTIONS = 5     # closest vocabulary terms tried per query word
+CANDIDATE_ROWS = 200    # rows fetched per tier from the full-text index before re-ranking
+MAX_CHECKS = 500        # candidate terms checked with edit_distance() per query word, most shared bigrams first
+LOOKUP_CHUNK = 500      # book_ids per IN (...) lookup, under SQLite's parameter limit
+
+WORD = re.compile(r"[^\W_]+")
+
+_indexes = {}           # db_file -> FuzzyIndex
+_indexes_lock = threading.Lock()
+
+
+def fold(text):
+    # Lower case without diacritics, like the full-text index's unicode61 tokenizer
+    return "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+
+
+def tokens(text):
+    return WORD.findall(fold(text or ""))
+
+
+def max_edits(word):
+    # Typos tolerated per query word: none in very short words, one up to seven letters, then two
+    return 0 if len(word) <= 3 else 1 if len(word) <= 7 else 2
+
+
+def bigrams(term):
+    padded = f"^{term}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def edit_distance(a, b, bound):
+    # Optimal string alignment distance (a swap of neighbouring letters is one edit), giving
+    # up with bound + 1 as soon as every alignment needs more than bound edits
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    if a == b:
+        return 0
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if min(current) > bound:
+            return bound + 1
+        before, previous = previous, current
+    return min(previous[-1], bound + 1)
+
+
+class FuzzyIndex:
+    # Title and author vocabulary with a bigram index over it. Postings are keyed by
+    # (bigram, term length) so a lookup only reads terms whose length is within reach.
+
+    def __init__(self):
+        self.terms = []             # term id -> term
+        self.docs = array('I')      # term id -> number of books using it, for tie-breaking
+        self.gram_counts = array('B')   # term id -> number of distinct bigrams
+        self.ids = {}
+        self.postings = {}          # (bigram, length) -> array of term ids
+        self.last_rowid = 0         # Books rows up to here have been indexed
+        self.lock = threading.Lock()
+
+    def add(self, term, docs=1):
+        term_id = self.ids.get(term)
+        if term_id is not None:
+            self.docs[term_id] += docs
+            return
+        term_id = self.ids[term] = len(self.terms)
+        self.terms.append(term)
+        self.docs.append(docs)
+        grams = bigrams(term)
+        self.gram_counts.append(min(len(grams), 255))
+        for gram in grams:
+            postings = self.postings.get((gram, len(term)))
+            if postings is None:
+                postings = self.postings[(gram, len(term))] = array('I')
+            postings.append(term_id)
+
+    def retire(self, terms):
+        # Terms no book uses any more; corrections() skips them until a book brings one back
+        with self.lock:
+            for term in terms:
+                term_id = self.ids.get(term)
+                if term_id is not None:
+                    self.docs[term_id] = 0
+
+    def add_text(self, *texts):
+        with self.lock:
+            for text in texts:
+                for term in tokens(text):
+                    self.add(term)
+
+    def corrections(self, word, limit=MAX_CORRECTIONS):
+        # {term: distance} for the closest terms within max_edits(word). One edit changes at most
+        # three bigrams (a swap), so two terms within `bound` edits share all but 3 * bound of
+        # either one's bigrams; only the best such candidates are checked with edit_distance().
+        bound = max_edits(word)
+        grams = bigrams(word)
+        shared = Counter()
+        with self.lock:
+            for gram in grams:
+                for length in range(max(1, len(word) - bound), len(word) + bound + 1):
+                    postings = self.postings.get((gram, length))
+                    if postings is not None:
+                        shared.update(postings)
+            need = max(1, len(grams) - 3 * bound)
+            gram_counts, docs = self.gram_counts, self.docs
+            candidates = [(count, term_id) for term_id, count in shared.items()
+                          if count >= need and count >= gram_counts[term_id] - 3 * bound and docs[term_id]]
+            found = []
+            for _, term_id in heapq.nlargest(MAX_CHECKS, candidates):
+                distance = edit_distance(word, self.terms[term_id], bound)
+                if distance <= bound:
+                    found.append((distance, -self.docs[term_id], self.terms[term_id]))
+        found.sort()
+        return {term: distance for distance, _, term in found[:limit]}
+
+
+def _catch_up(index, conn):
+    # Books appended since the index last looked (bulk loads, other processes) are indexed by rowid,
+    # which AUTOINCREMENT on Books.row_id never hands out twice
+    last = conn.execute("SELECT ifnull(max(rowid), 0) FROM Books").fetchone()[0]
+    if last <= index.last_rowid:
+        return
+    for title, author in conn.execute("SELECT title, author FROM Books WHERE rowid > ? AND rowid <= ?",
+                                      (index.last_rowid, last)):
+        index.add_text(title, author)
+    index.last_rowid = last
+
+
+def _vocabulary(conn):
+    # A temp fts5vocab table over the full-text index, which the Books triggers keep current:
+    # every term with its document count, read without touching the schema
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.BooksSearchTerms USING fts5vocab(main, BooksSearch, 'col')")
+    return "temp.BooksSearchTerms"
+
+
+def _live_corrections(index, conn, word):
+    # Deletes and edits (from any path or process) leave their words in the in-memory vocabulary.
+    # Corrections are checked against the full-text index, and words no book uses any more are
+    # retired and replaced by the next closest ones.
+    vocabulary = _vocabulary(conn)
+    while True:
+        found = index.corrections(word)
+        if not found:
+            return found
+        live = {term for (term,) in conn.execute(
+            f"SELECT DISTINCT term FROM {vocabulary} WHERE col IN ('title', 'author') "
+            f"AND term IN ({', '.join('?' * len(found))})", list(found))}
+        if len(live) == len(found):
+            return found
+        index.retire(set(found) - live)
+
+
+def load_fuzzy_index(db_file):
+    # The vocabulary comes straight from the full-text index, which already has every term
+    # with its document count
+    ensure_migrated(db_file)
+    conn = get_connection(db_file)
+    vocabulary = _vocabulary(conn)
+    index = FuzzyIndex()
+    index.last_rowid = conn.execute("SELECT ifnull(max(rowid), 0) FROM Books").fetchone()[0]
+    for term, docs in conn.execute(f"SELECT term, doc FROM {vocabulary} WHERE col IN ('title', 'author')"):
+        index.add(term, docs)
+    return index
+
+
+def fuzzy_index(db_file):
+    with _indexes_lock:
+        index = _indexes.get(db_file)
+        if index is None:
+            index = _indexes[db_file] = load_fuzzy_index(db_file)
+    _catch_up(index, get_connection(db_file))
+    return index
+
+
+def index_books(db_file, book_ids):
+    # Adds the current title and author words of changed books; called after add and edit commits.
+    # Words an edit or delete removed are retired by the first search that would suggest them.
+    index = _indexes.get(db_file)
+    if index is None:
+        return
+    conn = get_connection(db_file)
+    book_ids = list(book_ids)
+    for start in range(0, len(book_ids), LOOKUP_CHUNK):
+        chunk = book_ids[start:start + LOOKUP_CHUNK]
+        for title, author in conn.execute(
+                f"SELECT title, author FROM Books WHERE book_id IN ({', '.join('?' * len(chunk))})", chunk):
+            index.add_text(title, author)
+
+
+def rebuild_fuzzy_index(db_file):
+    with _indexes_lock:
+        _indexes[db_file] = load_fuzzy_index(db_file)
+
+
+def drop_fuzzy_index(db_file):
+    # For when the whole database was replaced (a restore); the next search loads it afresh
+    with _indexes_lock:
+        _indexes.pop(db_file, None)
+
+
+def _match_query(matches, operator):
+    # Each query word matches itself as a prefix or any of its corrections, in titles and authors
+    groups = []
+    for word, found in matches:
+        alternatives = [f'"{word}"*'] + [f'"{term}"' for term in found if term != word]
+        groups.append(f"({' OR '.join(alternatives)})")
+    return "{title author} : (" + f" {operator} ".join(groups) + ")"
+
+
+def _tiers(matches):
+    # Cheapest first: every word through its closest corrections, then through any of them, then
+    # any one word. The best-scoring rows turn up in the early, narrower tiers.
+    closest = [(word, {term: distance for term, distance in found.items() if distance == min(found.values())})
+               for word, found in matches]
+    queries = [_match_query(closest, "AND"), _match_query(matches, "AND")]
+    if len(matches) > 1:
+        queries.append(_match_query(matches, "OR"))
+    return list(dict.fromkeys(queries))
+
+
+def _score(row, matches):
+    # Total edits between the query words and the row's closest words; a missing word costs
+    # one more than its bound, so rows matching every word come first
+    words = tokens(f"{row[1]} {row[2]}")
+    total = 0
+    for word, found in matches:
+        miss = max_edits(word) + 1
+        total += min([0 if term.startswith(word) else found.get(term, miss) for term in words] or [miss])
+    return total
+
+
+def fuzzy_search(db_file, search_text, limit=TOP_K):
+    # Typo-tolerant book search: every query word is corrected against the title and author
+    # vocabulary, the full-text index finds books using those words, and the candidates are
+    # ranked by edit distance. Candidate queries skip bm25 ranking and stop at CANDIDATE_ROWS,
+    # so their cost doesn't grow with how many books share a common word.
+    words = tokens(search_text)
+    if not words:
+        return []
+
+    def load():
+        index = fuzzy_index(db_file)
+        conn = get_connection(db_file)
+        matches = [(word, _live_corrections(index, conn, word)) for word in words]
+        rows = {}
+        for match in _tiers(matches):
+            for row in conn.execute("""
+                SELECT b.book_id, b.title, b.author, b.genre, b.year, b.quantity
+                FROM BooksSearch
+                JOIN Books AS b ON b.rowid = BooksSearch.rowid
+                WHERE BooksSearch MATCH ?
+                LIMIT ?
+            """, (match, CANDIDATE_ROWS)):
+                rows.setdefault(row[0], row)
+            if len(rows) >= limit:
+                break
+        return sorted(rows.values(), key=lambda row: _score(row, matches))[:limit]
+
+    return cached(db_file, "books", ("fuzzy", " ".join(words), limit), load)
@@ -0,0 +1,215 @@
+import csv
+import io
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from bulk_load import flush_batch, report, tuned_for_load
+from cache import invalidate_books, invalidate_students
+from db import get_connection
+
+CHUNK_SIZE = 16 * 1024 * 1024      # bytes of CSV handed to one worker
+PARALLEL_THRESHOLD = 2 * CHUNK_SIZE  # smaller files are parsed in-process; a pool costs more than it saves
+MAX_YEAR = date.today().year + 1
+
+EMAIL = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+
+class SchemaError(ValueError):
+    pass
+
+
+# Typed schemas: (column, type, required, default, check). check returns an error message or None.
+def _year_check(year):
+    if not 0 < year <= MAX_YEAR:
+        return f"year {year} out of range"
+
+
+def _quantity_check(quantity):
+    if quantity < 0:
+        return "quantity is negative"
+
+
+def _email_check(email):
+    if not EMAIL.fullmatch(email):
+        return f"invalid email {email!r}"
+
+
+def _date_check(value):
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return f"invalid date {value!r}"
+
+
+SCHEMAS = {
+    "books": [
+        ("book_id", str, True, None, None),
+        ("title", str, True, None, None),
+        ("author", str, True, None, None),
+        ("genre", str, False, "", None),
+        ("year", int, False, None, _year_check),
+        ("quantity", int, False, 0, _quantity_check),
+    ],
+    "students": [
+        ("name", str, True, None, None),
+        ("email", str, True, None, _email_check),
+        ("date_of_birth", str, False, "", _date_check),
+    ],
+}
+
+INVALIDATE = {"books": invalidate_books, "students": invalidate_students}
+
+
+def validate_row(schema, positions, fields):
+    # Returns (values, None) for a valid row or (None, reason) for a rejected one
+    values = []
+    for column, kind, required, default, check in schema:
+        position = positions[column]
+        raw = fields[position].strip() if position is not None and position < len(fields) else ""
+        if not raw:
+            if required:
+                return None, f"missing {column}"
+            values.append(default)
+            continue
+
+        if kind is int:
+            try:
+                value = int(raw)
+            except ValueError:
+                return None, f"{column} is not a number: {raw!r}"
+        else:
+            value = raw
+
+        if check is not None:
+            problem = check(value)
+            if problem:
+                return None, problem
+        values.append(value)
+    return tuple(values), None
+
+
+def column_positions(schema, header):
+    header = [name.strip() for name in header]
+    positions = {column: (header.index(column) if column in header else None) for column, *_ in schema}
+    missing = [column for column, _, required, *_ in schema if required and positions[column] is None]
+    if missing:
+        raise SchemaError(f"CSV header is missing required columns: {', '.join(missing)}")
+    return positions
+
+
+def parse_chunk(csv_path, start, end, kind, header):
+    # Runs in a worker process: parse and validate one byte range of the file
+    schema = SCHEMAS[kind]
+    positions = column_positions(schema, header)
+    with open(csv_path, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+
+    valid, rejects = [], []
+    reader = csv.reader(io.StringIO(text, newline=''))
+    for fields in reader:
+        if not fields:
+            continue
+        values, reason = validate_row(schema, positions, fields)
+        if values is None:
+            rejects.append((reader.line_num, reason, fields))
+        else:
+            valid.append(values)
+    return valid, rejects, text.count("\n")
+
+
+def split_chunks(csv_path, chunk_size=CHUNK_SIZE):
+    # Byte ranges that start right after a newline. Quoted fields spanning lines are not
+    # supported across a boundary; neither Books.csv nor Students.csv uses them.
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as file:
+        header_line = file.readline()
+        header = next(csv.reader([header_line.decode('utf-8-sig')]))
+        data_start = file.tell()
+
+        bounds = [data_start]
+        position = data_start
+        while position + chunk_size < size:
+            file.seek(position + chunk_size)
+            file.readline()
+            position = file.tell()
+            if position >= size:
+                break
+            bounds.append(position)
+        bounds.append(size)
+    return header, list(zip(bounds, bounds[1:]))
+
+
+def _ordered_results(csv_path, kind, header, chunks, workers):
+    if workers == 1 or len(chunks) == 1:
+        for start, end in chunks:
+            yield parse_chunk(csv_path, start, end, kind, header)
+        return
+
+    # Keep a bounded window of chunks in flight and hand results over in file order
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        chunk_iter = iter(chunks)
+        for start, end in chunk_iter:
+            pending.append(pool.submit(parse_chunk, csv_path, start, end, kind, header))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            yield pending.popleft().result()
+            for start, end in chunk_iter:
+                pending.append(pool.submit(parse_chunk, csv_path, start, end, kind, header))
+                break
+
+
+def ingest_csv(db_file, csv_path, kind, reject_path=None, workers=None, chunk_size=CHUNK_SIZE):
+    # Parse and validate csv_path in parallel, insert valid rows in file order and
+    # write every rejected row with its line number and reason to reject_path
+    schema = SCHEMAS[kind]
+    header, chunks = split_chunks(csv_path, chunk_size)
+    column_positions(schema, header)     # fail fast on a bad header
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if os.path.getsize(csv_path) >= PARALLEL_THRESHOLD else 1
+    if reject_path is None:
+        reject_path = os.path.splitext(csv_path)[0] + ".rejects.csv"
+
+    stats = {"read": 0, "inserted": 0, "skipped": 0, "rejected": 0, "seconds": 0.0, "rows_per_sec": 0.0,
+             "reject_file": None}
+    start = time.perf_counter()
+    line_offset = 1    # the header line
+    reject_file = reject_writer = None
+
+    conn = get_connection(db_file)
+    try:
+        with tuned_for_load(conn):
+            for valid, rejects, lines in _ordered_results(csv_path, kind, header, chunks, workers):
+                stats["read"] += len(valid) + len(rejects)
+                if valid:
+                    flush_batch(conn, kind, valid, stats)
+
+                if rejects:
+                    if reject_writer is None:
+                        reject_file = open(reject_path, 'w', encoding='utf-8', newline='')
+                        reject_writer = csv.writer(reject_file)
+                        reject_writer.writerow(["line", "reason"] + header)
+                        stats["reject_file"] = reject_path
+                    for line, reason, fields in rejects:
+                        reject_writer.writerow([line_offset + line, reason] + fields)
+                    stats["rejected"] += len(rejects)
+                line_offset += lines
+    finally:
+        if reject_file is not None:
+            reject_file.close()
+        INVALIDATE[kind](db_file)
+
+    stats["seconds"] = time.perf_counter() - start
+    if stats["seconds"] > 0:
+        stats["rows_per_sec"] = stats["read"] / stats["seconds"]
+    report(f"Ingested {csv_path}", stats)
+    if stats["reject_file"]:
+        print(f"Rejected rows written to {stats['reject_file']}")
+    return stats
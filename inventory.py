@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+
+from cache import cached, invalidate_books
+from db import get_connection, suppressed_trigger, write_transaction
+
+# InventoryStats (migration 4) has one row per (dimension, value) with the number of titles and
+# copies, kept current by triggers on Books so the dashboard never scans the catalog:
+#   genre / author / decade   value is the genre, author or decade ('' when unknown)
+#   total                     every book
+#   out_of_stock              titles with quantity <= 0 (copies stays 0)
+
+# The same figures from a full scan; used to fill the table, rebuild it and verify it.
+# {where} narrows it to some rows, e.g. a bulk load's new ones.
+INVENTORY_SCAN = """
+SELECT 'genre', CAST(ifnull(genre, '') AS TEXT), COUNT(*), SUM(quantity) FROM Books {where} GROUP BY 2
+UNION ALL
+SELECT 'author', author, COUNT(*), SUM(quantity) FROM Books {where} GROUP BY 2
+UNION ALL
+SELECT 'decade', CAST(ifnull(year / 10 * 10, '') AS TEXT), COUNT(*), SUM(quantity) FROM Books {where} GROUP BY 2
+UNION ALL
+SELECT 'total', '', COUNT(*), ifnull(SUM(quantity), 0) FROM Books {where}
+UNION ALL
+SELECT 'out_of_stock', '', ifnull(SUM(quantity <= 0), 0), 0 FROM Books {where}
+"""
+FULL_SCAN = INVENTORY_SCAN.format(where="")
+
+
+@contextmanager
+def batched_inventory(conn):
+    # For bulk inserts inside the caller's transaction: the per-row insert trigger is suppressed
+    # and the new rows (rowids above the old maximum) are added as one aggregate at the end.
+    # A no-op on databases without the inventory trigger.
+    first_new = conn.execute("SELECT ifnull(max(rowid), 0) FROM Books").fetchone()[0]
+    with suppressed_trigger(conn, "books_inventory_insert") as suppressed:
+        yield
+        if suppressed:
+            conn.execute(f"""
+                INSERT INTO InventoryStats (dimension, value, titles, copies)
+                SELECT * FROM ({INVENTORY_SCAN.format(where="WHERE rowid > ?")}) WHERE true
+                ON CONFLICT (dimension, value) DO UPDATE SET
+                    titles = titles + excluded.titles, copies = copies + excluded.copies
+            """, [first_new] * 5)
+
+
+def inventory_summary(db_file):
+    # Totals, out-of-stock count and the per-genre and per-decade breakdowns; every figure is a
+    # primary key lookup or a short range scan of the summary table
+    def load():
+        conn = get_connection(db_file)
+        figures = {dimension: (titles, copies) for dimension, titles, copies in conn.execute(
+            "SELECT dimension, titles, copies FROM InventoryStats "
+            "WHERE dimension IN ('total', 'out_of_stock') AND value = ''")}
+        titles, copies = figures.get("total", (0, 0))
+        return {
+            "titles": titles,
+            "copies": copies,
+            "out_of_stock": figures.get("out_of_stock", (0, 0))[0],
+            "genres": breakdown(db_file, "genre"),
+            "decades": breakdown(db_file, "decade"),
+        }
+
+    return cached(db_file, "books", ("inventory",), load)
+
+
+def breakdown(db_file, dimension, limit=None):
+    # (value, titles, copies) rows; decades oldest first, everything else by copies
+    order = "CAST(value AS INTEGER)" if dimension == "decade" else "copies DESC, value"
+    query = f"SELECT value, titles, copies FROM InventoryStats WHERE dimension = ? ORDER BY {order}"
+    params = [dimension]
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return get_connection(db_file).execute(query, params).fetchall()
+
+
+def author_inventory(db_file, author):
+    row = get_connection(db_file).execute(
+        "SELECT titles, copies FROM InventoryStats WHERE dimension = 'author' AND value = ?", (author,)
+    ).fetchone()
+    return row or (0, 0)
+
+
+def verify_inventory(db_file):
+    # Compares the trigger-maintained figures with a full scan; returns the rows that differ
+    # as (dimension, value, stored (titles, copies) or None, scanned (titles, copies) or None)
+    conn = get_connection(db_file)
+    stored = {(dimension, value): (titles, copies) for dimension, value, titles, copies in
+              conn.execute("SELECT dimension, value, titles, copies FROM InventoryStats")}
+    scanned = {(dimension, value): (titles, copies) for dimension, value, titles, copies in
+               conn.execute(FULL_SCAN)}
+    return [(dimension, value, stored.get((dimension, value)), scanned.get((dimension, value)))
+            for dimension, value in sorted(stored.keys() | scanned.keys())
+            if stored.get((dimension, value)) != scanned.get((dimension, value))]
+
+
+def rebuild_inventory(db_file):
+    # Recomputes every figure from a full scan, for when verify_inventory() reports drift
+    conn = get_connection(db_file)
+    with write_transaction(conn):
+        conn.execute("DELETE FROM InventoryStats")
+        conn.execute(f"INSERT INTO InventoryStats {FULL_SCAN}")
+    invalidate_books(db_file)
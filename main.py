@@ -1,289 +1,83 @@
+import os
+import queue
 import sqlite3
-import csv
-import tkinter as tk
-from tkinter import messagebox
+import threading
 import time
-from tkinter import messagebox, ttk
-
-DB_FILE = "database/library.db"
-BOOKS_CSV = "Books.csv"
-STUDENTS_CSV = "Students.csv"
-
-
-def initialize_database():
-    connection = sqlite3.connect(DB_FILE)
-    cursor = connection.cursor()
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS Books (
-        book_id TEXT PRIMARY KEY,
-        title TEXT NOT NULL,
-        author TEXT NOT NULL,
-        genre TEXT,
-        year INTEGER,
-        quantity INTEGER NOT NULL
-    )
-    """)
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS Students (
-        student_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        date_of_birth TEXT
-    )
-    """)
-
-    connection.commit()
-    connection.close()
-
-
-def insert_books_from_csv():
-    with open(BOOKS_CSV, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-
-        for row in reader:
-            try:
-                book_id = row.get('book_id', '').strip()
-                title = row.get('title', '').strip()
-                author = row.get('author', '').strip()
-                genre = row.get('genre', '').strip()
-
-                year_str = row.get('year', '').strip()
-                year = int(year_str) if year_str else None
-
-                quantity_str = row.get('quantity', '').strip()
-                quantity = int(quantity_str) if quantity_str else 0
-
-                if not book_id or not title or not author:
-                    continue
-
-                cursor.execute("SELECT COUNT(*) FROM Books WHERE book_id = ?", (book_id,))
-                if cursor.fetchone()[0] > 0:
-                    continue
-
-                cursor.execute("""
-                    INSERT INTO Books (book_id, title, author, genre, year, quantity)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (book_id, title, author, genre, year, quantity))
-            except sqlite3.IntegrityError:
-                pass
-            except KeyError:
-                pass
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import filedialog, messagebox, ttk
+
+from backup import AUTO_BACKUP_HOURS, backup_due, create_backup, list_backups, verify_backup
+from bulk_edit import DeltaError, apply_deltas, apply_deltas_in, read_deltas, summarize
+from cache import get_book, invalidate_books, invalidate_students
+from catalog import book_cursor, fetch_books_page, search_books
+from core import (BRANCH, DB_FILE, book_updates, fetch_students, initialize_database, insert_book_row,
+                  insert_student_row, set_message_handler, update_book_row)
+from db import close_connection
+from db_worker import submit_read, submit_write, when_done
+from export import export_table
+from fuzzy import fuzzy_index, fuzzy_search, index_books
+from inventory import inventory_summary, verify_inventory
+from profiler import PROFILE_ENV, latency_histogram, profiling_enabled, top_statements
+from search_scheduler import make_search_scheduler
+from students import fetch_students_page, student_cursor
+from virtual_tree import PAGE_SIZE, attach_virtual_scroll
+from window_manager import make_window_manager
+
+
+def show_message(kind, title, message):
+    if kind == "error":
+        messagebox.showerror(title, message)
+    else:
+        messagebox.showinfo(title, message)
 
-        conn.commit()
-        conn.close()
 
+set_message_handler(show_message)
 
-def insert_students_from_csv():
-    with open(STUDENTS_CSV, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
 
-        for row in reader:
-            try:
-                name = row.get('name', '').strip()
-                email = row.get('email', '').strip()
-                date_of_birth = row.get('date_of_birth', '').strip()
-
-                if not name or not email:
-                    continue
-
-                cursor.execute("SELECT COUNT(*) FROM Students WHERE email = ?", (email,))
-                if cursor.fetchone()[0] > 0:
-                    continue
-
-                cursor.execute("""
-                    INSERT INTO Students (name, email, date_of_birth)
-                    VALUES (?, ?, ?)
-                """, (name, email, date_of_birth))
-            except sqlite3.IntegrityError:
-                pass
-            except KeyError:
-                pass
-
-        conn.commit()
-        conn.close()
-
-
-def remove_duplicate_students():
-    seen_emails = set()
-    unique_rows = []
-
-    with open(STUDENTS_CSV, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            email = row.get('email', '').strip()
-            if email not in seen_emails:
-                seen_emails.add(email)
-                unique_rows.append(row)
-
-    with open(STUDENTS_CSV, 'w', encoding='utf-8', newline='') as file:
-        fieldnames = ['student_id', 'name', 'email', 'date_of_birth']
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(unique_rows)
-
-
-def initialize_database():
-    insert_books_from_csv()
-    insert_students_from_csv()
-    remove_duplicate_students()
-
-
-
-def add_book(book_id, title, author, genre, year, quantity):
-
-    connection = sqlite3.connect(DB_FILE)
-    cursor = connection.cursor()
-
-    try:
-        cursor.execute("""
-        INSERT INTO Books (book_id, title, author, genre, year, quantity)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """, (book_id, title, author, genre, year, quantity))
-        connection.commit()
-        print("Book added successfully.")
-        messagebox.showinfo("Success", "Book added successfully!")
-    except sqlite3.IntegrityError:
-        print("Error: Book ID must be unique.")
-        messagebox.showerror("Error", "Book ID already exists!")
-    except Exception as e:
-        print(f"Error: {e}")
-        messagebox.showerror("Error", f"Failed to add book: {e}")
-    finally:
-        connection.close()
-
-def show_books():
-
-    connection = sqlite3.connect(DB_FILE)
-    cursor = connection.cursor()
-    cursor.execute("SELECT * FROM Books")
-    books = cursor.fetchall()
-    connection.close()
-    return books
-
-DB_FILE = "database/library.db"
-
-
-def fetch_students(search_query=""):
-
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    if search_query:
-        cursor.execute(
-            "SELECT student_id, name, email, date_of_birth FROM Students WHERE student_id LIKE ? OR name LIKE ?",
-            (f"%{search_query}%", f"%{search_query}%")
-        )
-    else:
-        cursor.execute("SELECT student_id, name, email, date_of_birth FROM Students")
-
-    students = cursor.fetchall()
-    conn.close()
-
-
-
-
-def delete_book(book_id):
-
-    connection = sqlite3.connect(DB_FILE)
-    cursor = connection.cursor()
-    cursor.execute("DELETE FROM Books WHERE book_id = ?", (book_id,))
-    connection.commit()
-    connection.close()
-
-
-def edit_book(book_id, title=None, author=None, genre=None, year=None, quantity=None):
-
-    connection = sqlite3.connect(DB_FILE)
-    cursor = connection.cursor()
-
-    # Check if the book exists
-    cursor.execute("SELECT * FROM Books WHERE book_id = ?", (book_id,))
-    book = cursor.fetchone()
-
-    if not book:
-        messagebox.showerror("Error", f"Book with ID {book_id} not found.")
-        connection.close()
-        return False
-
-    # Build the update query dynamically
-    updates = []
-    values = []
-
-    if title:
-        updates.append("title = ?")
-        values.append(title)
-    if author:
-        updates.append("author = ?")
-        values.append(author)
-    if genre:
-        updates.append("genre = ?")
-        values.append(genre)
-    if year:
-        updates.append("year = ?")
-        values.append(year)
-    if quantity:
-        updates.append("quantity = ?")
-        values.append(quantity)
-
-    if updates:
-        query = f"UPDATE Books SET {', '.join(updates)} WHERE book_id = ?"
-        values.append(book_id)
-        cursor.execute(query, values)
-        connection.commit()
-        messagebox.showinfo("Success", f"Book with ID {book_id} updated successfully.")
-
-    connection.close()
-    return True
-
-def return_book(issue_id, return_date):
-
-    connection = sqlite3.connect(DB_FILE)
-    cursor = connection.cursor()
-
-    # Get the book_id for the issued record
-    cursor.execute("SELECT book_id FROM IssuedBooks WHERE issue_id = ?", (issue_id,))
-    result = cursor.fetchone()
-    if result:
-        book_id = result[0]
-        # Increase the book quantity
-        cursor.execute("UPDATE Books SET quantity = quantity + 1 WHERE book_id = ?", (book_id,))
-        # Update the return date in the IssuedBooks table
-        cursor.execute("UPDATE IssuedBooks SET return_date = ? WHERE issue_id = ?", (return_date, issue_id))
-        connection.commit()
-        print("Book returned successfully.")
-    else:
-        print("Invalid issue ID.")
+def run_job(widget, future, on_result, on_error, controls=(), status=None, pending="Saving..."):
+    # Keeps the window responsive while the db worker runs the job: controls are disabled
+    # and status shows a pending note until the result comes back on the Tk thread
+    for control in controls:
+        control.config(state="disabled")
+    if status is not None:
+        status.config(text=pending)
 
-    connection.close()
+    def settle(callback):
+        def handler(value):
+            for control in controls:
+                control.config(state="normal")
+            if status is not None:
+                status.config(text="")
+            callback(value)
+        return handler
 
+    when_done(widget, future, settle(on_result), settle(on_error))
 
 
-def add_student(name, email, date_of_birth, student_id):
+def book_written(book_id):
+    # after_commit hook for single-book writes: drop its cached results and index any new title/author words
+    invalidate_books(DB_FILE, [book_id])
+    index_books(DB_FILE, [book_id])
 
-    connection = sqlite3.connect(DB_FILE)
-    cursor = connection.cursor()
 
-    try:
-        cursor.execute("""
-        INSERT INTO Students (student_id, name, email, date_of_birth)
-        VALUES (?, ?, ?, ?)
-        """, (student_id, name, email, date_of_birth))
-        connection.commit()
-        print("Student added successfully.")
-        messagebox.showinfo("Success", "Student added successfully!")
-    except sqlite3.IntegrityError:
-        print("Error: Student ID or Email must be unique.")
-        messagebox.showerror("Error", "Student ID or Email already exists!")
-    finally:
-        connection.close()
+def bind_sort_headings(tree, sortable, on_sort):
+    # sortable maps heading text -> sort name. Clicking a heading sorts by it, clicking it again
+    # reverses; the query runs in the database, the tree only shows the current window of rows.
+    state = {"sort": None, "descending": False}
 
+    def click(heading):
+        sort = sortable[heading]
+        state["descending"] = not state["descending"] if state["sort"] == sort else False
+        state["sort"] = sort
+        for text in sortable:
+            arrow = (" \u25bc" if state["descending"] else " \u25b2") if text == heading else ""
+            tree.heading(text, text=text + arrow)
+        on_sort()
 
+    for heading in sortable:
+        tree.heading(heading, command=lambda h=heading: click(h))
+    return state
 
 
 def update_time(label):
@@ -292,9 +86,8 @@ def update_time(label):
     label.config(text=f"Date & Time: {current_time}")
     label.after(1000, update_time, label)  # Refresh every second
 
-def add_books_window():
+def build_add_book_window(window):
 
-    window = tk.Toplevel()
     window.title("Add Book")
     window.geometry("350x400")
     window.configure(bg="#f0f0f0")  # Light gray background
@@ -324,6 +117,7 @@ def add_books_window():
     genre_entry = create_field("Genre:")
     year_entry = create_field("Year:")
     quantity_entry = create_field("Quantity:")
+    fields = (book_id_entry, title_entry, author_entry, genre_entry, year_entry, quantity_entry)
 
     # Submit Button
     submit_button = tk.Button(window, text="Submit", font=("Arial", 11, "bold"), bg="#4CAF50", fg="white",
@@ -346,42 +140,37 @@ def add_books_window():
             book_id = int(book_id)  # Ensure book_id is an integer
             year = int(year)  # Ensure year is an integer
             quantity = int(quantity)  # Ensure quantity is an integer
-            messagebox.showinfo("Success", "Book added successfully!")  # Temporary confirmation
-            window.destroy()  # Close the window after submission
         except ValueError:
             messagebox.showerror("Error", "Book ID, Year, and Quantity must be numbers!")
+            return
 
+        def added(_):
+            messagebox.showinfo("Success", "Book added successfully!")
+            for entry in fields:
+                entry.delete(0, tk.END)
+            window.withdraw()  # Hide the window after submission, ready for the next book
 
-    def submit():
-        book_id = book_id_entry.get()
-        title = title_entry.get()
-        author = author_entry.get()
-        genre = genre_entry.get()
-        year = year_entry.get()
-        quantity = quantity_entry.get()
+        def failed(error):
+            if isinstance(error, sqlite3.IntegrityError):
+                messagebox.showerror("Error", "Book ID already exists!")
+            else:
+                messagebox.showerror("Error", f"Failed to add book: {error}")
 
-        if not (book_id and title and author and genre and year and quantity):
-            messagebox.showwarning("Warning", "All fields must be filled!")
-            return
+        future = submit_write(DB_FILE, insert_book_row, book_id, title, author, genre, year, quantity,
+                              after_commit=lambda: book_written(book_id))
+        run_job(window, future, added, failed, controls=(submit_button, plain_submit_button), status=status_label)
 
-        try:
-            book_id = int(book_id)  # Ensure book_id is an integer
-            year = int(year)  # Ensure year is an integer
-            quantity = int(quantity)  # Ensure quantity is an integer
-            add_book(book_id, title, author, genre, year, quantity)
-            window.destroy()  # Close the window after submission
-        except ValueError:
-            messagebox.showerror("Error", "Book ID, Year, and Quantity must be numbers!")
+    plain_submit_button = tk.Button(window, text="Submit", command=submit)
+    plain_submit_button.pack()
 
-    submit_button = tk.Button(window, text="Submit", command=submit)
-    submit_button.pack()
+    status_label = tk.Label(window, text="", font=("Arial", 10), bg="#f0f0f0", fg="#555")
+    status_label.pack()
 
 # Add Student Window
 
 
-def add_student_window():
+def build_add_student_window(window):
 
-    window = tk.Toplevel()
     window.title("Add Student")
     window.geometry("350x300")
     window.configure(bg="#f0f0f0")  # Light gray background
@@ -409,6 +198,7 @@ def add_student_window():
     name_entry = create_field("Name:")
     email_entry = create_field("Email:")
     dob_entry = create_field("Date of Birth:")
+    fields = (student_id_entry, name_entry, email_entry, dob_entry)
 
     # Submit Button
     submit_button = tk.Button(window, text="Submit", font=("Arial", 11, "bold"), bg="#4CAF50", fg="white",
@@ -427,13 +217,28 @@ def add_student_window():
 
         try:
             student_id = int(student_id)  # Ensure student_id is an integer
-            add_student(name, email, date_of_birth, student_id)
-            messagebox.showinfo("Success", "Student added successfully!")
-            window.destroy()  # Close the window after submission
         except ValueError:
             messagebox.showerror("Error", "Student ID must be a number!")
+            return
+
+        def added(_):
+            messagebox.showinfo("Success", "Student added successfully!")
+            for entry in fields:
+                entry.delete(0, tk.END)
+            window.withdraw()  # Hide the window after submission, ready for the next student
 
-    window.mainloop()
+        def failed(error):
+            if isinstance(error, sqlite3.IntegrityError):
+                messagebox.showerror("Error", "Student ID or Email already exists!")
+            else:
+                messagebox.showerror("Error", f"Failed to add student: {error}")
+
+        future = submit_write(DB_FILE, insert_student_row, name, email, date_of_birth, student_id,
+                              after_commit=lambda: invalidate_students(DB_FILE, [student_id]))
+        run_job(window, future, added, failed, controls=(submit_button,), status=status_label)
+
+    status_label = tk.Label(window, text="", font=("Arial", 10), bg="#f0f0f0", fg="#555")
+    status_label.pack()
 
 # Generic Form Window
 def create_form_window(title, labels, button_text, success_message):
@@ -496,18 +301,7 @@ def create_form_window(title, labels, button_text, success_message):
 
 # Show Books Window
 
-def fetch_books():
-
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT book_id, title, author, genre, year, quantity FROM Books")
-    books = cursor.fetchall()  # Get all books
-    conn.close()
-    return books
-
-
-def show_books_window():
-    show_books = tk.Toplevel()
+def build_books_window(show_books):
     show_books.title("Library Books")
     show_books.geometry("800x600")
     show_books.configure(bg="white")
@@ -519,7 +313,7 @@ def show_books_window():
 
     # Back Button
     back_button = tk.Button(show_books, text="← BACK", font=("Arial", 12), bg="red", fg="white",
-                            command=show_books.destroy)
+                            command=show_books.withdraw)
     back_button.place(x=10, y=10)
 
     # Search Bar
@@ -530,6 +324,9 @@ def show_books_window():
     search_entry = tk.Entry(search_frame, font=("Arial", 12), width=40)
     search_entry.pack(side="left", padx=5)
 
+    status_label = tk.Label(search_frame, text="", font=("Arial", 10), bg="white", fg="#555")
+    status_label.pack(side="left", padx=10)
+
     # Table Frame
     table_frame = tk.Frame(show_books, bg="white", padx=20, pady=20)
     table_frame.pack(fill="both", expand=True)
@@ -547,52 +344,70 @@ def show_books_window():
     # Adding scrollbars
     scrollbar_y = ttk.Scrollbar(table_frame, orient="vertical", command=tree.yview)
     scrollbar_y.pack(side="right", fill="y")
-    tree.configure(yscrollcommand=scrollbar_y.set)
 
-    # Fetch and insert actual data from the database
-    books = fetch_books()
-
-    def update_table(search_text=""):
+    view = {"results": None}
+    sort_state = bind_sort_headings(tree, {"Book ID": "book_id", "Title": "title", "Author": "author", "Year": "year"},
+                                    lambda: update_table(view["results"]))
+
+    # Rows are paged in from the database as the view scrolls instead of loading the whole table
+    def page_fetcher():
+        sort, descending = sort_state["sort"] or "book_id", sort_state["descending"]
+        fetch = lambda after=None, before=None, limit=PAGE_SIZE: fetch_books_page(
+            DB_FILE, after=after, before=before, limit=limit, sort=sort, descending=descending)
+        return fetch, lambda row: book_cursor(row, sort)
+
+    fetch, cursor = page_fetcher()
+    reload_table = attach_virtual_scroll(tree, scrollbar_y, fetch, key=cursor)
+
+    def results_fetcher(results):
+        # Ranked full-text results are capped at SEARCH_LIMIT, so they are loaded (and sorted) in one go
+        if sort_state["sort"] is not None:
+            sort = sort_state["sort"]
+            results = sorted(results, key=lambda row: book_cursor(row, sort), reverse=sort_state["descending"])
+        return lambda after=None, before=None, limit=PAGE_SIZE: results if after is None and before is None else []
+
+    def update_table(results=None):
+        view["results"] = results
+        if results is None:
+            reload_table(*page_fetcher())
+        else:
+            reload_table(results_fetcher(results))
+
+    # Search Functionality (runs off the Tk thread, only the latest query is shown)
+    def run_search(search_text):
+        # Falls back to typo-tolerant matching when the exact search finds nothing
+        if not search_text:
+            return None
+        return search_books(DB_FILE, search_text) or fuzzy_search(DB_FILE, search_text)
+
+    def show_timing(search_text, count, elapsed_ms):
+        if count is None:
+            status_label.config(text="")
+        else:
+            status_label.config(text=f"{count} results in {elapsed_ms:.1f} ms")
 
-        tree.delete(*tree.get_children())  # Clear table
-        for book in books:
-            if search_text.lower() in book[1].lower() or search_text.lower() in book[
-                2].lower() or search_text.lower() in book[3].lower():
-                tree.insert("", tk.END, values=book)
+    schedule_search = make_search_scheduler(tree, run_search, update_table, db_file=DB_FILE,
+                                            on_timing=show_timing,
+                                            on_error=lambda e: messagebox.showerror("Error", f"Search failed: {e}"))
 
-    # Search Functionality
     def on_search(event):
-        update_table(search_entry.get().strip())
+        schedule_search(search_entry.get().strip())
 
     search_entry.bind("<KeyRelease>", on_search)  # Detects input changes
 
-    update_table()  # Populate table initially
-
-
-def fetch_students(search_query=""):
-
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    if search_query:
-        cursor.execute(
-            "SELECT student_id, name, email, date_of_birth FROM Students WHERE student_id LIKE ? OR name LIKE ?",
-            (f"%{search_query}%", f"%{search_query}%")
-        )
-    else:
-        cursor.execute("SELECT student_id, name, email, date_of_birth FROM Students")
-
-    students = cursor.fetchall()
-    conn.close()
-
-    #print("Fetched Students:", students)  # Debugging print statement
-    return students
+    def refresh():
+        # Shows the current data again: the search in the box, or the paged list
+        search_text = search_entry.get().strip()
+        if search_text:
+            schedule_search(search_text, immediate=True)
+        else:
+            update_table()
 
+    return refresh
 
 
-def show_students_window():
+def build_students_window(show_students):
 
-    show_students = tk.Toplevel()
     show_students.title("Student Details")
     show_students.geometry("800x600")
     show_students.configure(bg="white")
@@ -610,12 +425,22 @@ def show_students_window():
     search_entry = tk.Entry(search_frame, font=("Arial", 14), width=30)
     search_entry.pack(side="left", padx=10)
 
+    status_label = tk.Label(search_frame, text="", font=("Arial", 10), bg="white", fg="#555")
+
+    def show_timing(query, count, elapsed_ms):
+        if count is None:
+            status_label.config(text="")
+        else:
+            status_label.config(text=f"{count} students in {elapsed_ms:.1f} ms" if count else "No students found!")
+
     def search_students():
-        query = search_entry.get().strip()
-        update_student_table(fetch_students(query))
+        schedule_search(search_entry.get().strip(), immediate=True)
+
+    search_entry.bind("<KeyRelease>", lambda event: schedule_search(search_entry.get().strip()))
 
     search_button = tk.Button(search_frame, text="Search", font=("Arial", 12), bg="#FFA500", fg="white", command=search_students)
     search_button.pack(side="left", padx=10)
+    status_label.pack(side="left", padx=10)
 
     # Table Frame
     table_frame = tk.Frame(show_students, bg="white", padx=20, pady=20)
@@ -633,23 +458,51 @@ def show_students_window():
     # Scrollbars
     scrollbar_y = ttk.Scrollbar(table_frame, orient="vertical", command=tree.yview)
     scrollbar_y.pack(side="right", fill="y")
-    tree.configure(yscrollcommand=scrollbar_y.set)
 
-    def update_student_table(data):
+    view = {"results": None}
+    sort_state = bind_sort_headings(tree, {"Student ID": "student_id", "Name": "name", "Email": "email"},
+                                    lambda: update_student_table(view["results"]))
+
+    # With no search text the whole table is browsable, paged in sorted order as the view scrolls
+    def page_fetcher():
+        sort, descending = sort_state["sort"] or "student_id", sort_state["descending"]
+        fetch = lambda after=None, before=None, limit=PAGE_SIZE: fetch_students_page(
+            DB_FILE, after=after, before=before, limit=limit, sort=sort, descending=descending)
+        return fetch, lambda row: student_cursor(row, sort)
 
-        tree.delete(*tree.get_children())  # Clear table
+    fetch, cursor = page_fetcher()
+    reload_table = attach_virtual_scroll(tree, scrollbar_y, fetch, key=cursor)
 
-        #print("Updating table with:", data)  # Debugging print statement
+    def update_student_table(data=None):
+        view["results"] = data
+        if data is None:
+            reload_table(*page_fetcher())
+            return
+        # Search results are capped (students.MAX_RESULTS), so sorting them here stays cheap
+        if sort_state["sort"] is not None:
+            sort = sort_state["sort"]
+            data = sorted(data, key=lambda row: student_cursor(row, sort), reverse=sort_state["descending"])
+        reload_table(lambda after=None, before=None, limit=PAGE_SIZE: data if after is None and before is None else [])
+
+    def run_search(query):
+        return fetch_students(query) if query else None
+
+    schedule_search = make_search_scheduler(tree, run_search, update_student_table, db_file=DB_FILE,
+                                            on_timing=show_timing,
+                                            on_error=lambda e: messagebox.showerror("Error", f"Search failed: {e}"))
+
+    def refresh():
+        query = search_entry.get().strip()
+        if query:
+            schedule_search(query, immediate=True)
+        else:
+            update_student_table()
 
-        if not data:
-            messagebox.showinfo("Info", "No students found!")
-        for student in data:
-            tree.insert("", tk.END, values=student)
+    return refresh
 
 # Issue Book Window
-def edit_books_window():
+def build_edit_book_window(edit_books):
 
-    edit_books = tk.Toplevel()
     edit_books.title("Edit Book")
     edit_books.geometry("500x450")
     edit_books.configure(bg="white")
@@ -689,19 +542,20 @@ def edit_books_window():
             messagebox.showwarning("Invalid Input", "Book ID must be a number!")
             return
 
-        connection = sqlite3.connect(DB_FILE)
-        cursor = connection.cursor()
-        cursor.execute("SELECT title, author, genre, year, quantity FROM Books WHERE book_id = ?", (book_id,))
-        book = cursor.fetchone()
-        connection.close()
+        def loaded(book):
+            if book:
+                # Populate fields (title, author, genre, year, quantity)
+                for entry, value in zip(entries.values(), book[1:]):
+                    entry.delete(0, tk.END)
+                    entry.insert(0, value)
+            else:
+                messagebox.showerror("Error", f"Book with ID {book_id} not found.")
 
-        if book:
-            # Populate fields
-            for entry, value in zip(entries.values(), book):
-                entry.delete(0, tk.END)
-                entry.insert(0, value)
-        else:
-            messagebox.showerror("Error", f"Book with ID {book_id} not found.")
+        def failed(error):
+            messagebox.showerror("Error", f"Failed to load book: {error}")
+
+        run_job(edit_books, submit_read(DB_FILE, get_book, DB_FILE, book_id), loaded, failed,
+                controls=(search_button, submit_button), status=status_label, pending="Loading...")
 
     # Function to Submit Edits
     def submit_edit():
@@ -721,60 +575,37 @@ def edit_books_window():
             messagebox.showerror("Error", "Year and Quantity must be numbers!")
             return
 
-        # Call edit_book function
-        edit_book(book_id, updates["Title:"], updates["Author:"], updates["Genre:"], updates["Year:"],
-                  updates["Quantity:"])
+        fields = book_updates(updates["Title:"], updates["Author:"], updates["Genre:"], updates["Year:"],
+                              updates["Quantity:"])
+
+        def updated(found):
+            if not found:
+                messagebox.showerror("Error", f"Book with ID {book_id} not found.")
+            elif fields:
+                messagebox.showinfo("Success", f"Book with ID {book_id} updated successfully.")
+
+        def failed(error):
+            messagebox.showerror("Error", f"Failed to update book: {error}")
+
+        future = submit_write(DB_FILE, update_book_row, book_id, fields,
+                              after_commit=lambda: book_written(book_id))
+        run_job(edit_books, future, updated, failed, controls=(search_button, submit_button), status=status_label)
 
     # Buttons
-    tk.Button(form_frame, text="Search", font=("Arial", 12, "bold"), bg="#FFA500", fg="white",
-              command=fetch_book_details).grid(row=0, column=2, padx=10)
+    search_button = tk.Button(form_frame, text="Search", font=("Arial", 12, "bold"), bg="#FFA500", fg="white",
+                              command=fetch_book_details)
+    search_button.grid(row=0, column=2, padx=10)
 
     submit_button = tk.Button(edit_books, text="Update Book", font=("Arial", 12, "bold"), bg="#4CAF50", fg="white",
                               width=20, pady=5, command=submit_edit)
     submit_button.pack(pady=10)
 
+    status_label = tk.Label(edit_books, text="", font=("Arial", 11), bg="white", fg="#555")
+    status_label.pack()
+
     back_button = tk.Button(edit_books, text="Back", font=("Arial", 12, "bold"), bg="red", fg="white",
-                            width=10, command=edit_books.destroy)
+                            width=10, command=edit_books.withdraw)
     back_button.pack(pady=5)
-    # Update Book Function
-    def update_book():
-        book_id = book_id_entry.get()
-        title = entries["Book Title:"].get()
-        author = entries["Author:"].get()
-        stock = entries["Stock:"].get()
-
-        if book_id and title and author and stock:
-            try:
-                import sqlite3
-                conn = sqlite3.connect("library.db")
-                cursor = conn.cursor()
-
-                # Update book details in the database
-                cursor.execute(
-                    "UPDATE books SET title = ?, author = ?, stock = ? WHERE book_id = ?",
-                    (title, author, stock, book_id)
-                )
-                conn.commit()
-
-                messagebox.showinfo("Success", "Book details updated successfully!")
-                edit_books.destroy()
-                conn.close()
-            except Exception as e:
-                messagebox.showerror("Error", f"An error occurred: {e}")
-        else:
-            messagebox.showerror("Error", "Please fill in all required fields!")
-
-    # Buttons
-    search_button = tk.Button(
-        form_frame, text="Search", font=("Arial", 14), bg="#32CD32", fg="white", command=fetch_books()
-    )
-    search_button.grid(row=0, column=2, padx=10, pady=10)
-
-    submit_button = tk.Button(
-        form_frame, text="Update", font=("Arial", 14), bg="#32CD32", fg="white", command=update_book
-    )
-    submit_button.grid(row=len(labels)+1, column=0, pady=20)
-
     # Reset Form
     def reset_form():
         book_id_entry.delete(0, tk.END)
@@ -908,29 +739,339 @@ def toggle_theme(root):
     theme_button.config(bg=current_theme["button_bg"], fg="white")
 
 
-def perform_action(action_name, root):
+# Dashboard action -> (window builder, cached tables it shows)
+WINDOWS = {
+    "Add Books": (build_add_book_window, ()),
+    "Add Student": (build_add_student_window, ()),
+    "Show Book": (build_books_window, ("books",)),
+    "Edit Books": (build_edit_book_window, ()),
+    "Student Details": (build_students_window, ("students",)),
+}
+PREWARM = ("Show Book", "Student Details", "Add Books", "Edit Books", "Add Student")   # most used first
+
+
+def perform_action(action_name, root, show_window):
 
     if action_name == "Log Out":
         logout(root)  # Pass the root window
-    elif action_name == "Add Books":
-        add_books_window()
-    elif action_name == "Add Student":
-        add_student_window()
-    elif action_name == "Show Book":
-        show_books_window()
-    elif action_name == "Edit Books":
-        edit_books_window()
-    elif action_name == "Student Details":
-        show_students_window()
+    elif action_name in WINDOWS:
+        show_window(action_name)  # Built once, then only hidden and re-shown
     else:
         messagebox.showinfo("Action", f"You clicked on {action_name}.")
+
+def build_query_panel(parent, refresh_ms=2000):
+    # Top statements by total time, as recorded by the query profiler
+    panel = tk.Frame(parent, bg="white")
+
+    columns = ("Statement", "Calls", "Avg ms", "Max ms", "Rows", "Caller")
+    tree = ttk.Treeview(panel, columns=columns, show="headings", height=5)
+    widths = (430, 60, 70, 70, 70, 190)
+    for col, width in zip(columns, widths):
+        tree.heading(col, text=col)
+        tree.column(col, anchor="w" if col in ("Statement", "Caller") else "e", width=width)
+    tree.pack(fill="both", expand=True)
+
+    histogram_label = tk.Label(panel, text="", font=("Arial", 10), bg="white", fg="#555", anchor="w")
+    histogram_label.pack(fill="x")
+    if not profiling_enabled():
+        histogram_label.config(text=f"Query profiling is off; start with {PROFILE_ENV}=1 to record statements.")
+        return panel
+
+    def refresh():
+        if not panel.winfo_exists():
+            return
+        tree.delete(*tree.get_children())
+        for entry in top_statements(8):
+            caller = max(entry["callers"], key=entry["callers"].get)
+            tree.insert("", tk.END, values=(entry["sql"][:120], entry["calls"], f"{entry['avg_ms']:.2f}",
+                                            f"{entry['max_ms']:.2f}", entry["rows"], caller))
+        buckets = [f"{label}: {count}" for label, count in latency_histogram() if count]
+        histogram_label.config(text="Latency  " + "   ".join(buckets))
+        panel.after(refresh_ms, refresh)
+
+    refresh()
+    return panel
+
+
+def build_inventory_panel(parent, refresh_ms=5000):
+    # Copies and titles per genre and decade from the trigger-maintained summary table,
+    # read on the db worker; cached until the next books write, so refreshes are nearly free
+    panel = tk.Frame(parent, bg="white", padx=10, pady=5)
+
+    totals_label = tk.Label(panel, text="", font=("Arial", 12, "bold"), bg="white", anchor="w")
+    totals_label.pack(fill="x")
+
+    tables = tk.Frame(panel, bg="white")
+    tables.pack(fill="both", expand=True)
+    trees = {}
+    for key, heading in (("genres", "Genre"), ("decades", "Decade")):
+        tree = ttk.Treeview(tables, columns=(heading, "Titles", "Copies"), show="headings", height=5)
+        for col, width in ((heading, 200), ("Titles", 80), ("Copies", 80)):
+            tree.heading(col, text=col)
+            tree.column(col, anchor="w" if col == heading else "e", width=width)
+        tree.pack(side="left", fill="both", expand=True, padx=(0, 10))
+        trees[key] = tree
+
+    status_label = tk.Label(panel, text="", font=("Arial", 10), bg="white", fg="#555", anchor="w")
+
+    def show(summary):
+        totals_label.config(text=f"{summary['titles']} titles, {summary['copies']} copies, "
+                                 f"{summary['out_of_stock']} out of stock")
+        for key, tree in trees.items():
+            tree.delete(*tree.get_children())
+            for value, titles, copies in summary[key]:
+                tree.insert("", tk.END, values=(value or "(none)", titles, copies))
+
+    def refresh():
+        if not panel.winfo_exists():
+            return
+        when_done(panel, submit_read(DB_FILE, inventory_summary, DB_FILE), show,
+                  lambda error: totals_label.config(text=f"Inventory unavailable: {error}"))
+        panel.after(refresh_ms, refresh)
+
+    def verified(mismatches):
+        status_label.config(text=f"{len(mismatches)} figures differ from a full scan; run cli.py stats --rebuild"
+                            if mismatches else "All figures match a full scan")
+
+    verify_button = tk.Button(panel, text="Verify", font=("Arial", 10, "bold"), bg="#2196F3", fg="white",
+                              command=lambda: run_job(panel, submit_read(DB_FILE, verify_inventory, DB_FILE),
+                                                      verified, lambda e: status_label.config(text=str(e)),
+                                                      controls=(verify_button,), status=status_label,
+                                                      pending="Scanning..."))
+    verify_button.pack(side="left", pady=5)
+    status_label.pack(side="left", padx=10)
+
+    refresh()
+    return panel
+
+
+def build_export_panel(parent):
+    # Streams a table to CSV/JSONL on a background thread so the dashboard stays responsive
+    panel = tk.Frame(parent, bg="white", padx=10, pady=10)
+
+    table_var = tk.StringVar(value="books")
+    format_var = tk.StringVar(value="csv")
+    gzip_var = tk.BooleanVar(value=False)
+
+    tk.Label(panel, text="Table:", font=("Arial", 11), bg="white").grid(row=0, column=0, sticky="w")
+    ttk.Combobox(panel, textvariable=table_var, values=("books", "students"), state="readonly",
+                 width=12).grid(row=0, column=1, sticky="w", padx=5)
+    tk.Label(panel, text="Format:", font=("Arial", 11), bg="white").grid(row=0, column=2, sticky="w")
+    ttk.Combobox(panel, textvariable=format_var, values=("csv", "jsonl"), state="readonly",
+                 width=8).grid(row=0, column=3, sticky="w", padx=5)
+    tk.Checkbutton(panel, text="gzip", variable=gzip_var, bg="white").grid(row=0, column=4, sticky="w")
+
+    tk.Label(panel, text="Columns:", font=("Arial", 11), bg="white").grid(row=1, column=0, sticky="w", pady=5)
+    columns_entry = tk.Entry(panel, font=("Arial", 11), width=40)
+    columns_entry.grid(row=1, column=1, columnspan=4, sticky="w", padx=5)
+    tk.Label(panel, text="Filters:", font=("Arial", 11), bg="white").grid(row=2, column=0, sticky="w")
+    filters_entry = tk.Entry(panel, font=("Arial", 11), width=40)
+    filters_entry.grid(row=2, column=1, columnspan=4, sticky="w", padx=5)
+    tk.Label(panel, text="e.g. genre=Fiction; year>=2000", font=("Arial", 9), bg="white",
+             fg="#555").grid(row=2, column=5, sticky="w")
+
+    status_label = tk.Label(panel, text="", font=("Arial", 10), bg="white", fg="#555", anchor="w")
+    status_label.grid(row=4, column=0, columnspan=6, sticky="w", pady=5)
+
+    def run_export():
+        fmt = format_var.get()
+        extension = f".{fmt}" + (".gz" if gzip_var.get() else "")
+        path = filedialog.asksaveasfilename(parent=panel, defaultextension=extension,
+                                            initialfile=table_var.get() + extension)
+        if not path:
+            return
+
+        columns = [c.strip() for c in columns_entry.get().split(",") if c.strip()] or None
+        filters = [f.strip() for f in filters_entry.get().split(";") if f.strip()]
+        outcome = queue.Queue()
+
+        def work():
+            try:
+                outcome.put(export_table(DB_FILE, table_var.get(), path, fmt=fmt, columns=columns,
+                                         filters=filters, compress=gzip_var.get()))
+            except Exception as e:
+                outcome.put(e)
+            finally:
+                close_connection(DB_FILE)   # the thread ends here; don't leave its connection to the finalizer
+
+        def poll():
+            try:
+                result = outcome.get_nowait()
+            except queue.Empty:
+                panel.after(100, poll)
+                return
+            export_button.config(state="normal")
+            if isinstance(result, Exception):
+                status_label.config(text="")
+                messagebox.showerror("Export failed", str(result))
+            else:
+                status_label.config(text=f"Exported {result['rows']} rows to {path} in {result['seconds']:.1f}s")
+
+        export_button.config(state="disabled")
+        status_label.config(text="Exporting...")
+        threading.Thread(target=work, daemon=True).start()
+        panel.after(100, poll)
+
+    export_button = tk.Button(panel, text="Export...", font=("Arial", 11, "bold"), bg="#4CAF50", fg="white",
+                              command=run_export)
+    export_button.grid(row=3, column=0, columnspan=2, sticky="w", pady=5)
+    return panel
+
+
+def build_stocktake_panel(parent):
+    # Loads a delta file, previews the per-row outcome (dry run) and applies it as one transaction
+    panel = tk.Frame(parent, bg="white", padx=10, pady=10)
+    state = {"deltas": None, "path": None}
+
+    controls = tk.Frame(panel, bg="white")
+    controls.pack(fill="x")
+    summary_label = tk.Label(panel, text="Open a delta CSV (book_id, action, fields) to preview it.",
+                             font=("Arial", 10), bg="white", fg="#555", anchor="w")
+    summary_label.pack(fill="x", pady=5)
+
+    columns = ("line", "book_id", "action", "status", "detail")
+    outcomes_tree = ttk.Treeview(panel, columns=columns, show="headings", height=6)
+    for column, width in zip(columns, (50, 90, 70, 80, 480)):
+        outcomes_tree.heading(column, text=column.replace("_", " ").title())
+        outcomes_tree.column(column, width=width, anchor="w")
+    outcomes_tree.pack(fill="both", expand=True)
+
+    def show_report(report):
+        outcomes_tree.delete(*outcomes_tree.get_children())
+        for outcome in report["outcomes"]:
+            outcomes_tree.insert("", "end", values=[outcome[column] for column in columns])
+        summary_label.config(text=summarize(report))
+        apply_button.config(state="normal" if report["dry_run"] and report["changed_ids"] else "disabled")
+        if not report["dry_run"] and report["changed_ids"]:
+            submit_read(DB_FILE, index_books, DB_FILE, report["changed_ids"])
+
+    def failed(error):
+        messagebox.showerror("Stocktake", str(error))
+
+    def open_deltas():
+        path = filedialog.askopenfilename(parent=panel, filetypes=[("CSV files", "*.csv"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            state["deltas"], state["path"] = read_deltas(path), path
+        except (DeltaError, OSError) as e:
+            failed(e)
+            return
+        run_job(panel, submit_read(DB_FILE, apply_deltas, DB_FILE, state["deltas"], True), show_report, failed,
+                controls=(open_button,), status=summary_label, pending="Previewing...")
+
+    def apply():
+        if not messagebox.askyesno("Stocktake", f"Apply {state['path']} to the catalog?", parent=panel):
+            return
+        future = submit_write(DB_FILE, apply_deltas_in, state["deltas"],
+                              after_commit=lambda: invalidate_books(DB_FILE))
+        run_job(panel, future, show_report, failed, controls=(open_button, apply_button), status=summary_label,
+                pending="Applying...")
+
+    open_button = tk.Button(controls, text="Open Delta File...", font=("Arial", 11, "bold"), bg="#2196F3",
+                            fg="white", command=open_deltas)
+    open_button.pack(side="left")
+    apply_button = tk.Button(controls, text="Apply", font=("Arial", 11, "bold"), bg="#4CAF50", fg="white",
+                             state="disabled", command=apply)
+    apply_button.pack(side="left", padx=10)
+    return panel
+
+
+def build_backup_panel(parent, check_ms=15 * 60 * 1000):
+    # Online snapshots on a thread of their own (never a db worker): the copy pauses between steps
+    # so desk work goes first, and its progress is polled from the Tk loop. A snapshot is also taken
+    # by itself once the newest is AUTO_BACKUP_HOURS old. Restores go through cli.py restore.
+    panel = tk.Frame(parent, bg="white", padx=10, pady=10)
+    jobs = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup")
+    progress = {"copied": 0, "total": 0}
+
+    controls = tk.Frame(panel, bg="white")
+    controls.pack(fill="x")
+    gzip_var = tk.BooleanVar(value=True)
+    progress_bar = ttk.Progressbar(controls, length=250, maximum=1.0)
+    status_label = tk.Label(panel, text="", font=("Arial", 10), bg="white", fg="#555", anchor="w")
+    status_label.pack(fill="x", pady=5)
+
+    columns = ("snapshot", "taken", "size")
+    snapshots_tree = ttk.Treeview(panel, columns=columns, show="headings", height=5, selectmode="browse")
+    for column, width in zip(columns, (420, 160, 100)):
+        snapshots_tree.heading(column, text=column.title())
+        snapshots_tree.column(column, width=width, anchor="e" if column == "size" else "w")
+    snapshots_tree.pack(fill="both", expand=True)
+
+    def show_snapshots():
+        snapshots_tree.delete(*snapshots_tree.get_children())
+        for path, taken, label, size in list_backups(DB_FILE):
+            taken = time.strftime("%Y-%m-%d %H:%M:%S", time.strptime(taken, "%Y%m%d-%H%M%S"))
+            name = os.path.basename(path) + (f" ({label})" if label else "")
+            snapshots_tree.insert("", "end", iid=path, values=(name, taken, f"{size / (1024 * 1024):.1f} MiB"))
+
+    def copied(pages, total):
+        # Called on the backup thread after every step
+        progress["copied"], progress["total"] = pages, total
+
+    def show_progress():
+        if not panel.winfo_exists() or backup_button["state"] == "normal":
+            return
+        if progress["total"]:
+            progress_bar.config(value=progress["copied"] / progress["total"])
+            status_label.config(text=f"Copied {progress['copied']} of {progress['total']} pages")
+        panel.after(200, show_progress)
+
+    def saved(result):
+        progress_bar.config(value=0)
+        status_label.config(text=f"Saved {os.path.basename(result['path'])} "
+                                 f"({result['bytes'] / (1024 * 1024):.1f} MiB) in {result['seconds']:.1f}s, "
+                                 f"integrity checked")
+        show_snapshots()
+
+    def failed(error):
+        progress_bar.config(value=0)
+        status_label.config(text=f"Backup failed: {error}")
+
+    def back_up():
+        progress.update(copied=0, total=0)
+        run_job(panel, jobs.submit(create_backup, DB_FILE, compress=gzip_var.get(), progress=copied), saved,
+                failed, controls=(backup_button, verify_button), status=status_label, pending="Backing up...")
+        show_progress()
+
+    def verify():
+        selected = snapshots_tree.selection()
+        if not selected:
+            return
+        name = os.path.basename(selected[0])
+        run_job(panel, jobs.submit(verify_backup, selected[0]),
+                lambda problems: status_label.config(text=f"{name}: " + (problems[0] if problems else "ok")),
+                failed, controls=(backup_button, verify_button), status=status_label, pending="Checking...")
+
+    def scheduled():
+        if not panel.winfo_exists():
+            return
+        if backup_button["state"] == "normal" and backup_due(DB_FILE, AUTO_BACKUP_HOURS):
+            back_up()
+        panel.after(check_ms, scheduled)
+
+    backup_button = tk.Button(controls, text="Back Up Now", font=("Arial", 11, "bold"), bg="#4CAF50", fg="white",
+                              command=back_up)
+    backup_button.pack(side="left")
+    tk.Checkbutton(controls, text="gzip", variable=gzip_var, bg="white").pack(side="left", padx=5)
+    verify_button = tk.Button(controls, text="Verify Selected", font=("Arial", 11, "bold"), bg="#2196F3",
+                              fg="white", command=verify)
+    verify_button.pack(side="left", padx=5)
+    progress_bar.pack(side="left", padx=10)
+
+    show_snapshots()
+    panel.after(check_ms, scheduled)
+    return panel
+
+
 def open_dashboard():
 
     global header_frame, title_label, time_label, buttons, theme_button  # Reference UI elements for theme switching
 
     dashboard = tk.Tk()
-    dashboard.title("📚 Library Management System - Dashboard")
-    dashboard.geometry("1000x700")
+    dashboard.title("📚 Library Management System - Dashboard" + (f" ({BRANCH})" if BRANCH else ""))
+    dashboard.geometry("1000x820")
     dashboard.resizable(False, False)
     dashboard.config(bg=current_theme["bg"])
 
@@ -950,7 +1091,9 @@ def open_dashboard():
 
     #  Button Grid Frame
     button_frame = tk.Frame(dashboard, bg=current_theme["bg"])
-    button_frame.pack(expand=True, pady=30)
+    button_frame.pack(expand=True, pady=20)
+
+    show_window, prewarm_windows = make_window_manager(dashboard, DB_FILE, WINDOWS)
 
     buttons = []
     button_texts = [
@@ -967,9 +1110,9 @@ def open_dashboard():
             button_frame, text=icon, font=("Arial", 16, "bold"), bg=current_theme["button_bg"], fg="white",
             width=20, height=2, relief="raised", bd=4,
             activebackground=current_theme["button_hover"], activeforeground="white",
-            command=lambda t=text: perform_action(t, dashboard)
+            command=lambda t=text: perform_action(t, dashboard, show_window)
         )
-        btn.grid(row=i // 2, column=i % 2, padx=40, pady=20)
+        btn.grid(row=i // 2, column=i % 2, padx=40, pady=12)
         btn.bind("<Enter>", on_enter)  # Hover effect
         btn.bind("<Leave>", on_leave)
         buttons.append(btn)  # Store buttons for theme update
@@ -979,9 +1122,23 @@ def open_dashboard():
         dashboard, text="🌙 Toggle Theme", font=("Arial", 14, "bold"), bg=current_theme["button_bg"], fg="white",
         width=20, height=2, relief="raised", bd=4, command=lambda: toggle_theme(dashboard)
     )
-    theme_button.pack(pady=20)
-
+    theme_button.pack(pady=10)
+
+    #  Insights panels
+    insights = ttk.Notebook(dashboard)
+    insights.pack(fill="both", expand=True, padx=30, pady=(0, 20))
+    insights.add(build_inventory_panel(insights), text="Inventory")
+    insights.add(build_query_panel(insights), text="Slow Queries")
+    insights.add(build_export_panel(insights), text="Export")
+    insights.add(build_stocktake_panel(insights), text="Stocktake")
+    insights.add(build_backup_panel(insights), text="Backup")
+
+    prewarm_windows(PREWARM)
+    # The fuzzy search vocabulary takes a moment to load; do it now rather than on the first typo
+    threading.Thread(target=fuzzy_index, args=(DB_FILE,), daemon=True).start()
     dashboard.mainloop()
 
-restart_login()
+if __name__ == "__main__":
+    initialize_database()
+    restart_login()
 
@@ -0,0 +1,539 @@
+import sqlite3
+
+from db import get_connection
+
+# Append-only: migration N brings a database from user_version N-1 to N. Never edit one that has
+# shipped; add a new one instead. Each is literal SQL, frozen as it shipped, so editing a module
+# can never change what an old migration does. Statements stay idempotent (IF NOT EXISTS) so a
+# database that predates user_version, built by the old initialize_database, migrates cleanly.
+MIGRATIONS = [
+    # 1: base tables
+    """
+    CREATE TABLE IF NOT EXISTS Books (
+        book_id TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        author TEXT NOT NULL,
+        genre TEXT,
+        year INTEGER,
+        quantity INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS Students (
+        student_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        date_of_birth TEXT
+    );
+    """,
+
+    # 2: secondary indexes for lookups and filters. Exact email matches already use the
+    # UNIQUE constraint's index; case-insensitive name/email lookups use the lower() ones.
+    """
+    CREATE INDEX IF NOT EXISTS idx_books_author ON Books (author);
+    CREATE INDEX IF NOT EXISTS idx_books_genre ON Books (genre);
+    CREATE INDEX IF NOT EXISTS idx_books_year ON Books (year);
+    CREATE INDEX IF NOT EXISTS idx_books_title ON Books (title);
+    CREATE INDEX IF NOT EXISTS idx_students_name_lower ON Students (lower(name));
+    CREATE INDEX IF NOT EXISTS idx_students_email_lower ON Students (lower(email));
+    """,
+
+    # 3: case-insensitive sort keys for the sorted book list
+    """
+    CREATE INDEX IF NOT EXISTS idx_books_title_sort ON Books (lower(title), book_id);
+    CREATE INDEX IF NOT EXISTS idx_books_author_sort ON Books (lower(author), book_id);
+    CREATE INDEX IF NOT EXISTS idx_books_year_sort ON Books (ifnull(year, 0), book_id);
+    """,
+
+    # 4: trigger-maintained inventory figures (see inventory.py), filled from the current catalog
+    """
+    CREATE TABLE IF NOT EXISTS InventoryStats (
+        dimension TEXT NOT NULL,
+        value TEXT NOT NULL,
+        titles INTEGER NOT NULL,
+        copies INTEGER NOT NULL,
+        PRIMARY KEY (dimension, value)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS books_inventory_insert AFTER INSERT ON Books BEGIN
+        INSERT INTO InventoryStats (dimension, value, titles, copies) VALUES
+            ('genre', CAST(ifnull(new.genre, '') AS TEXT), 1, new.quantity),
+            ('author', new.author, 1, new.quantity),
+            ('decade', CAST(ifnull(new.year / 10 * 10, '') AS TEXT), 1, new.quantity),
+            ('total', '', 1, new.quantity),
+            ('out_of_stock', '', new.quantity <= 0, 0)
+        ON CONFLICT (dimension, value) DO UPDATE SET
+            titles = titles + excluded.titles, copies = copies + excluded.copies;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS books_inventory_delete AFTER DELETE ON Books BEGIN
+        UPDATE InventoryStats SET titles = titles - 1, copies = copies - old.quantity
+        WHERE (dimension = 'genre' AND value = CAST(ifnull(old.genre, '') AS TEXT))
+           OR (dimension = 'author' AND value = old.author)
+           OR (dimension = 'decade' AND value = CAST(ifnull(old.year / 10 * 10, '') AS TEXT))
+           OR (dimension = 'total' AND value = '');
+        UPDATE InventoryStats SET titles = titles - (old.quantity <= 0)
+        WHERE dimension = 'out_of_stock' AND value = '';
+        DELETE FROM InventoryStats WHERE titles = 0 AND (
+            (dimension = 'genre' AND value = CAST(ifnull(old.genre, '') AS TEXT))
+            OR (dimension = 'author' AND value = old.author)
+            OR (dimension = 'decade' AND value = CAST(ifnull(old.year / 10 * 10, '') AS TEXT)));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS books_inventory_move AFTER UPDATE OF genre, author, year, quantity ON Books
+    WHEN old.genre IS NOT new.genre OR old.author IS NOT new.author OR old.year IS NOT new.year
+    BEGIN
+        UPDATE InventoryStats SET titles = titles - 1, copies = copies - old.quantity
+        WHERE (dimension = 'genre' AND value = CAST(ifnull(old.genre, '') AS TEXT))
+           OR (dimension = 'author' AND value = old.author)
+           OR (dimension = 'decade' AND value = CAST(ifnull(old.year / 10 * 10, '') AS TEXT))
+           OR (dimension = 'total' AND value = '');
+        UPDATE InventoryStats SET titles = titles - (old.quantity <= 0)
+        WHERE dimension = 'out_of_stock' AND value = '';
+        DELETE FROM InventoryStats WHERE titles = 0 AND (
+            (dimension = 'genre' AND value = CAST(ifnull(old.genre, '') AS TEXT))
+            OR (dimension = 'author' AND value = old.author)
+            OR (dimension = 'decade' AND value = CAST(ifnull(old.year / 10 * 10, '') AS TEXT)));
+        INSERT INTO InventoryStats (dimension, value, titles, copies) VALUES
+            ('genre', CAST(ifnull(new.genre, '') AS TEXT), 1, new.quantity),
+            ('author', new.author, 1, new.quantity),
+            ('decade', CAST(ifnull(new.year / 10 * 10, '') AS TEXT), 1, new.quantity),
+            ('total', '', 1, new.quantity),
+            ('out_of_stock', '', new.quantity <= 0, 0)
+        ON CONFLICT (dimension, value) DO UPDATE SET
+            titles = titles + excluded.titles, copies = copies + excluded.copies;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS books_inventory_quantity AFTER UPDATE OF quantity ON Books
+    WHEN old.quantity IS NOT new.quantity
+        AND old.genre IS new.genre AND old.author IS new.author AND old.year IS new.year
+    BEGIN
+        UPDATE InventoryStats SET copies = copies + (new.quantity - old.quantity)
+        WHERE (dimension = 'genre' AND value = CAST(ifnull(new.genre, '') AS TEXT))
+           OR (dimension = 'author' AND value = new.author)
+           OR (dimension = 'decade' AND value = CAST(ifnull(new.year / 10 * 10, '') AS TEXT))
+           OR (dimension = 'total' AND value = '');
+        UPDATE InventoryStats SET titles = titles + (new.quantity <= 0) - (old.quantity <= 0)
+        WHERE dimension = 'out_of_stock' AND value = '';
+    END;
+
+    DELETE FROM InventoryStats;
+    INSERT INTO InventoryStats
+    SELECT 'genre', CAST(ifnull(genre, '') AS TEXT), COUNT(*), SUM(quantity) FROM Books GROUP BY 2
+    UNION ALL
+    SELECT 'author', author, COUNT(*), SUM(quantity) FROM Books GROUP BY 2
+    UNION ALL
+    SELECT 'decade', CAST(ifnull(year / 10 * 10, '') AS TEXT), COUNT(*), SUM(quantity) FROM Books GROUP BY 2
+    UNION ALL
+    SELECT 'total', '', COUNT(*), ifnull(SUM(quantity), 0) FROM Books
+    UNION ALL
+    SELECT 'out_of_stock', '', ifnull(SUM(quantity <= 0), 0), 0 FROM Books;
+    """,
+
+    # 5: change-data-capture log of Books and Students writes, with consumer positions (see
+    # changelog.py). Rows that predate it are not in the log.
+    """
+    CREATE TABLE IF NOT EXISTS ChangeLog (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_key NOT NULL,
+        operation TEXT NOT NULL CHECK (operation IN ('insert', 'update', 'delete')),
+        row_data TEXT,
+        changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    );
+
+    CREATE TABLE IF NOT EXISTS ChangeConsumers (
+        name TEXT PRIMARY KEY,
+        acked_seq INTEGER NOT NULL DEFAULT 0,
+        acked_at TEXT
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS books_changelog_insert AFTER INSERT ON Books BEGIN
+        INSERT INTO ChangeLog (table_name, row_key, operation, row_data)
+        VALUES ('Books', new.book_id, 'insert', json_object('book_id', new.book_id, 'title', new.title,
+                'author', new.author, 'genre', new.genre, 'year', new.year, 'quantity', new.quantity));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS books_changelog_update AFTER UPDATE ON Books
+    WHEN old.book_id IS NOT new.book_id OR old.title IS NOT new.title OR old.author IS NOT new.author
+        OR old.genre IS NOT new.genre OR old.year IS NOT new.year OR old.quantity IS NOT new.quantity
+    BEGIN
+        INSERT INTO ChangeLog (table_name, row_key, operation)
+        SELECT 'Books', old.book_id, 'delete' WHERE old.book_id IS NOT new.book_id;
+        INSERT INTO ChangeLog (table_name, row_key, operation, row_data)
+        VALUES ('Books', new.book_id, CASE WHEN old.book_id IS new.book_id THEN 'update' ELSE 'insert' END,
+                json_object('book_id', new.book_id, 'title', new.title, 'author', new.author,
+                            'genre', new.genre, 'year', new.year, 'quantity', new.quantity));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS books_changelog_delete AFTER DELETE ON Books BEGIN
+        INSERT INTO ChangeLog (table_name, row_key, operation) VALUES ('Books', old.book_id, 'delete');
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS students_changelog_insert AFTER INSERT ON Students BEGIN
+        INSERT INTO ChangeLog (table_name, row_key, operation, row_data)
+        VALUES ('Students', new.student_id, 'insert', json_object('student_id', new.student_id,
+                'name', new.name, 'email', new.email, 'date_of_birth', new.date_of_birth));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS students_changelog_update AFTER UPDATE ON Students
+    WHEN old.student_id IS NOT new.student_id OR old.name IS NOT new.name OR old.email IS NOT new.email
+        OR old.date_of_birth IS NOT new.date_of_birth
+    BEGIN
+        INSERT INTO ChangeLog (table_name, row_key, operation)
+        SELECT 'Students', old.student_id, 'delete' WHERE old.student_id IS NOT new.student_id;
+        INSERT INTO ChangeLog (table_name, row_key, operation, row_data)
+        VALUES ('Students', new.student_id,
+                CASE WHEN old.student_id IS new.student_id THEN 'update' ELSE 'insert' END,
+                json_object('student_id', new.student_id, 'name', new.name, 'email', new.email,
+                            'date_of_birth', new.date_of_birth));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS students_changelog_delete AFTER DELETE ON Students BEGIN
+        INSERT INTO ChangeLog (table_name, row_key, operation) VALUES ('Students', old.student_id, 'delete');
+    END;
+    """,
+
+    # 6: full-text index over Books (see catalog.py), an external-content FTS5 table kept in sync
+    # by triggers. Earlier versions created it on first use; rebuilding makes either case current.
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS BooksSearch USING fts5(
+        title, author, genre,
+        content='Books', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='1 2 3'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS books_search_insert AFTER INSERT ON Books BEGIN
+        INSERT INTO BooksSearch (rowid, title, author, genre)
+        VALUES (new.rowid, new.title, new.author, new.genre);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS books_search_delete AFTER DELETE ON Books BEGIN
+        INSERT INTO BooksSearch (BooksSearch, rowid, title, author, genre)
+        VALUES ('delete', old.rowid, old.title, old.author, old.genre);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS books_search_update AFTER UPDATE OF title, author, genre ON Books BEGIN
+        INSERT INTO BooksSearch (BooksSearch, rowid, title, author, genre)
+        VALUES ('delete', old.rowid, old.title, old.author, old.genre);
+        INSERT INTO BooksSearch (rowid, title, author, genre)
+        VALUES (new.rowid, new.title, new.author, new.genre);
+    END;
+
+    INSERT INTO BooksSearch (BooksSearch) VALUES ('rebuild');
+    """,
+
+    # 7: circulation (see circulation.py): loans, and a guard against negative stock
+    """
+    CREATE TABLE IF NOT EXISTS IssuedBooks (
+        issue_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        book_id TEXT NOT NULL REFERENCES Books (book_id),
+        student_id INTEGER NOT NULL REFERENCES Students (student_id),
+        issue_date TEXT NOT NULL,
+        due_date TEXT,
+        return_date TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_issued_book ON IssuedBooks (book_id);
+    CREATE INDEX IF NOT EXISTS idx_issued_student ON IssuedBooks (student_id);
+    CREATE INDEX IF NOT EXISTS idx_issued_open ON IssuedBooks (student_id, book_id) WHERE return_date IS NULL;
+
+    CREATE TRIGGER IF NOT EXISTS books_quantity_guard BEFORE UPDATE OF quantity ON Books
+    WHEN NEW.quantity < 0 BEGIN
+        SELECT RAISE(ABORT, 'Book quantity cannot go negative');
+    END;
+    """,
+
+    # 8: trigram index for substring student search (see students.py; needs SQLite 3.34+, so it
+    # is skipped where the tokenizer is missing -- see OPTIONAL_MIGRATIONS)
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS StudentsTrigram USING fts5(
+        name, email,
+        content='Students', content_rowid='student_id',
+        tokenize='trigram'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS students_trigram_insert AFTER INSERT ON Students BEGIN
+        INSERT INTO StudentsTrigram (rowid, name, email) VALUES (new.student_id, new.name, new.email);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS students_trigram_delete AFTER DELETE ON Students BEGIN
+        INSERT INTO StudentsTrigram (StudentsTrigram, rowid, name, email)
+        VALUES ('delete', old.student_id, old.name, old.email);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS students_trigram_update AFTER UPDATE OF name, email ON Students BEGIN
+        INSERT INTO StudentsTrigram (StudentsTrigram, rowid, name, email)
+        VALUES ('delete', old.student_id, old.name, old.email);
+        INSERT INTO StudentsTrigram (rowid, name, email) VALUES (new.student_id, new.name, new.email);
+    END;
+
+    INSERT INTO StudentsTrigram (StudentsTrigram) VALUES ('rebuild');
+    """,
+
+    # 9: manifest of the CSV files synced at startup (see csv_sync.py)
+    """
+    CREATE TABLE IF NOT EXISTS SyncFiles (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        sha256 TEXT NOT NULL,
+        synced_at TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS SyncRows (
+        path TEXT NOT NULL,
+        row_key TEXT NOT NULL,
+        row_hash BLOB NOT NULL,
+        PRIMARY KEY (path, row_key)
+    ) WITHOUT ROWID;
+    """,
+
+    # 10: an explicit INTEGER PRIMARY KEY alias for the Books rowid. BooksSearch (content_rowid)
+    # and the fuzzy index's catch-up key on the rowid, which VACUUM may renumber when it is only
+    # implicit; an alias keeps it, and AUTOINCREMENT never reuses one. Rebuilding the table drops
+    # its indexes and triggers, so those of migrations 2-7 are recreated as they are.
+    """
+    CREATE TABLE Books_new (
+        row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        book_id TEXT NOT NULL UNIQUE,
+        title TEXT NOT NULL,
+        author TEXT NOT NULL,
+        genre TEXT,
+        year INTEGER,
+        quantity INTEGER NOT NULL
+    );
+
+    INSERT INTO Books_new (row_id, book_id, title, author, genre, year, quantity)
+    SELECT rowid, book_id, title, author, genre, year, quantity FROM Books ORDER BY rowid;
+
+    DROP TABLE Books;
+    ALTER TABLE Books_new RENAME TO Books;
+
+    CREATE INDEX idx_books_author ON Books (author);
+    CREATE INDEX idx_books_genre ON Books (genre);
+    CREATE INDEX idx_books_year ON Books (year);
+    CREATE INDEX idx_books_title ON Books (title);
+    CREATE INDEX idx_books_title_sort ON Books (lower(title), book_id);
+    CREATE INDEX idx_books_author_sort ON Books (lower(author), book_id);
+    CREATE INDEX idx_books_year_sort ON Books (ifnull(year, 0), book_id);
+
+    CREATE TRIGGER books_inventory_insert AFTER INSERT ON Books BEGIN
+        INSERT INTO InventoryStats (dimension, value, titles, copies) VALUES
+            ('genre', CAST(ifnull(new.genre, '') AS TEXT), 1, new.quantity),
+            ('author', new.author, 1, new.quantity),
+            ('decade', CAST(ifnull(new.year / 10 * 10, '') AS TEXT), 1, new.quantity),
+            ('total', '', 1, new.quantity),
+            ('out_of_stock', '', new.quantity <= 0, 0)
+        ON CONFLICT (dimension, value) DO UPDATE SET
+            titles = titles + excluded.titles, copies = copies + excluded.copies;
+    END;
+
+    CREATE TRIGGER books_inventory_delete AFTER DELETE ON Books BEGIN
+        UPDATE InventoryStats SET titles = titles - 1, copies = copies - old.quantity
+        WHERE (dimension = 'genre' AND value = CAST(ifnull(old.genre, '') AS TEXT))
+           OR (dimension = 'author' AND value = old.author)
+           OR (dimension = 'decade' AND value = CAST(ifnull(old.year / 10 * 10, '') AS TEXT))
+           OR (dimension = 'total' AND value = '');
+        UPDATE InventoryStats SET titles = titles - (old.quantity <= 0)
+        WHERE dimension = 'out_of_stock' AND value = '';
+        DELETE FROM InventoryStats WHERE titles = 0 AND (
+            (dimension = 'genre' AND value = CAST(ifnull(old.genre, '') AS TEXT))
+            OR (dimension = 'author' AND value = old.author)
+            OR (dimension = 'decade' AND value = CAST(ifnull(old.year / 10 * 10, '') AS TEXT)));
+    END;
+
+    CREATE TRIGGER books_inventory_move AFTER UPDATE OF genre, author, year, quantity ON Books
+    WHEN old.genre IS NOT new.genre OR old.author IS NOT new.author OR old.year IS NOT new.year
+    BEGIN
+        UPDATE InventoryStats SET titles = titles - 1, copies = copies - old.quantity
+        WHERE (dimension = 'genre' AND value = CAST(ifnull(old.genre, '') AS TEXT))
+           OR (dimension = 'author' AND value = old.author)
+           OR (dimension = 'decade' AND value = CAST(ifnull(old.year / 10 * 10, '') AS TEXT))
+           OR (dimension = 'total' AND value = '');
+        UPDATE InventoryStats SET titles = titles - (old.quantity <= 0)
+        WHERE dimension = 'out_of_stock' AND value = '';
+        DELETE FROM InventoryStats WHERE titles = 0 AND (
+            (dimension = 'genre' AND value = CAST(ifnull(old.genre, '') AS TEXT))
+            OR (dimension = 'author' AND value = old.author)
+            OR (dimension = 'decade' AND value = CAST(ifnull(old.year / 10 * 10, '') AS TEXT)));
+        INSERT INTO InventoryStats (dimension, value, titles, copies) VALUES
+            ('genre', CAST(ifnull(new.genre, '') AS TEXT), 1, new.quantity),
+            ('author', new.author, 1, new.quantity),
+            ('decade', CAST(ifnull(new.year / 10 * 10, '') AS TEXT), 1, new.quantity),
+            ('total', '', 1, new.quantity),
+            ('out_of_stock', '', new.quantity <= 0, 0)
+        ON CONFLICT (dimension, value) DO UPDATE SET
+            titles = titles + excluded.titles, copies = copies + excluded.copies;
+    END;
+
+    CREATE TRIGGER books_inventory_quantity AFTER UPDATE OF quantity ON Books
+    WHEN old.quantity IS NOT new.quantity
+        AND old.genre IS new.genre AND old.author IS new.author AND old.year IS new.year
+    BEGIN
+        UPDATE InventoryStats SET copies = copies + (new.quantity - old.quantity)
+        WHERE (dimension = 'genre' AND value = CAST(ifnull(new.genre, '') AS TEXT))
+           OR (dimension = 'author' AND value = new.author)
+           OR (dimension = 'decade' AND value = CAST(ifnull(new.year / 10 * 10, '') AS TEXT))
+           OR (dimension = 'total' AND value = '');
+        UPDATE InventoryStats SET titles = titles + (new.quantity <= 0) - (old.quantity <= 0)
+        WHERE dimension = 'out_of_stock' AND value = '';
+    END;
+
+    CREATE TRIGGER books_changelog_insert AFTER INSERT ON Books BEGIN
+        INSERT INTO ChangeLog (table_name, row_key, operation, row_data)
+        VALUES ('Books', new.book_id, 'insert', json_object('book_id', new.book_id, 'title', new.title,
+                'author', new.author, 'genre', new.genre, 'year', new.year, 'quantity', new.quantity));
+    END;
+
+    CREATE TRIGGER books_changelog_update AFTER UPDATE ON Books
+    WHEN old.book_id IS NOT new.book_id OR old.title IS NOT new.title OR old.author IS NOT new.author
+        OR old.genre IS NOT new.genre OR old.year IS NOT new.year OR old.quantity IS NOT new.quantity
+    BEGIN
+        INSERT INTO ChangeLog (table_name, row_key, operation)
+        SELECT 'Books', old.book_id, 'delete' WHERE old.book_id IS NOT new.book_id;
+        INSERT INTO ChangeLog (table_name, row_key, operation, row_data)
+        VALUES ('Books', new.book_id, CASE WHEN old.book_id IS new.book_id THEN 'update' ELSE 'insert' END,
+                json_object('book_id', new.book_id, 'title', new.title, 'author', new.author,
+                            'genre', new.genre, 'year', new.year, 'quantity', new.quantity));
+    END;
+
+    CREATE TRIGGER books_changelog_delete AFTER DELETE ON Books BEGIN
+        INSERT INTO ChangeLog (table_name, row_key, operation) VALUES ('Books', old.book_id, 'delete');
+    END;
+
+    CREATE TRIGGER books_search_insert AFTER INSERT ON Books BEGIN
+        INSERT INTO BooksSearch (rowid, title, author, genre)
+        VALUES (new.rowid, new.title, new.author, new.genre);
+    END;
+
+    CREATE TRIGGER books_search_delete AFTER DELETE ON Books BEGIN
+        INSERT INTO BooksSearch (BooksSearch, rowid, title, author, genre)
+        VALUES ('delete', old.rowid, old.title, old.author, old.genre);
+    END;
+
+    CREATE TRIGGER books_search_update AFTER UPDATE OF title, author, genre ON Books BEGIN
+        INSERT INTO BooksSearch (BooksSearch, rowid, title, author, genre)
+        VALUES ('delete', old.rowid, old.title, old.author, old.genre);
+        INSERT INTO BooksSearch (rowid, title, author, genre)
+        VALUES (new.rowid, new.title, new.author, new.genre);
+    END;
+
+    CREATE TRIGGER books_quantity_guard BEFORE UPDATE OF quantity ON Books
+    WHEN NEW.quantity < 0 BEGIN
+        SELECT RAISE(ABORT, 'Book quantity cannot go negative');
+    END;
+    """,
+
+    # 11: triggers a bulk load can switch off for its own transaction (db.suppressed_trigger) by
+    # naming them in SuppressedTriggers, instead of dropping and recreating them. The inventory
+    # insert trigger is otherwise as migration 10 left it.
+    """
+    CREATE TABLE IF NOT EXISTS SuppressedTriggers (
+        name TEXT PRIMARY KEY
+    ) WITHOUT ROWID;
+
+    DROP TRIGGER IF EXISTS books_inventory_insert;
+    CREATE TRIGGER books_inventory_insert AFTER INSERT ON Books
+    WHEN NOT EXISTS (SELECT 1 FROM SuppressedTriggers WHERE name = 'books_inventory_insert')
+    BEGIN
+        INSERT INTO InventoryStats (dimension, value, titles, copies) VALUES
+            ('genre', CAST(ifnull(new.genre, '') AS TEXT), 1, new.quantity),
+            ('author', new.author, 1, new.quantity),
+            ('decade', CAST(ifnull(new.year / 10 * 10, '') AS TEXT), 1, new.quantity),
+            ('total', '', 1, new.quantity),
+            ('out_of_stock', '', new.quantity <= 0, 0)
+        ON CONFLICT (dimension, value) DO UPDATE SET
+            titles = titles + excluded.titles, copies = copies + excluded.copies;
+    END;
+    """,
+
+    # 12: the ChangeLog insert triggers of migrations 5 and 10, made suppressible the same way
+    """
+    DROP TRIGGER IF EXISTS books_changelog_insert;
+    CREATE TRIGGER books_changelog_insert AFTER INSERT ON Books
+    WHEN NOT EXISTS (SELECT 1 FROM SuppressedTriggers WHERE name = 'books_changelog_insert')
+    BEGIN
+        INSERT INTO ChangeLog (table_name, row_key, operation, row_data)
+        VALUES ('Books', new.book_id, 'insert', json_object('book_id', new.book_id, 'title', new.title,
+                'author', new.author, 'genre', new.genre, 'year', new.year, 'quantity', new.quantity));
+    END;
+
+    DROP TRIGGER IF EXISTS students_changelog_insert;
+    CREATE TRIGGER students_changelog_insert AFTER INSERT ON Students
+    WHEN NOT EXISTS (SELECT 1 FROM SuppressedTriggers WHERE name = 'students_changelog_insert')
+    BEGIN
+        INSERT INTO ChangeLog (table_name, row_key, operation, row_data)
+        VALUES ('Students', new.student_id, 'insert', json_object('student_id', new.student_id,
+                'name', new.name, 'email', new.email, 'date_of_birth', new.date_of_birth));
+    END;
+    """,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+_current = set()     # databases this process has already brought up to date
+
+
+def _has_trigram_tokenizer(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.trigram_probe USING fts5(text, tokenize='trigram')")
+    except sqlite3.OperationalError:
+        return False
+    conn.execute("DROP TABLE temp.trigram_probe")
+    return True
+
+
+# Migrations that only apply when this SQLite build supports them: where the check fails the
+# version is still bumped, without the migration's objects, and callers fall back (students._by_scan)
+OPTIONAL_MIGRATIONS = {
+    8: _has_trigram_tokenizer,
+}
+
+
+class MigrationError(Exception):
+    pass
+
+
+def schema_version(db_file):
+    return get_connection(db_file).execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_file, target=LATEST_VERSION):
+    # Applies every pending migration up to target, each in its own transaction together with
+    # its user_version bump, then refreshes planner statistics. Returns the versions applied.
+    conn = get_connection(db_file)
+    version = schema_version(db_file)
+    if version > LATEST_VERSION:
+        raise MigrationError(f"{db_file} has schema version {version}; this program only knows "
+                             f"up to {LATEST_VERSION}")
+
+    applied = []
+    for number in range(version + 1, target + 1):
+        script = MIGRATIONS[number - 1]
+        supported = OPTIONAL_MIGRATIONS.get(number)
+        if supported is not None and not supported(conn):
+            script = ""
+        try:
+            conn.executescript(f"BEGIN IMMEDIATE;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.rollback()
+            raise MigrationError(f"Migration {number} failed: {e}") from e
+        applied.append(number)
+
+    if applied:
+        # New indexes have no statistics yet; ANALYZE is bounded by the connection's analysis_limit
+        conn.execute("ANALYZE")
+    else:
+        conn.execute("PRAGMA optimize")
+    if target == LATEST_VERSION:
+        _current.add(db_file)
+    return applied
+
+
+def ensure_migrated(db_file):
+    # For code that needs the full schema whichever entry point opened the database; only the
+    # first call per database and process does any work
+    if db_file not in _current:
+        migrate(db_file)
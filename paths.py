@@ -0,0 +1,34 @@
+import os
+import re
+
+# Where the library's files live. Kept free of heavy imports: the CLI resolves --db and --branch
+# from here before it knows which command (and so which modules) it needs.
+DEFAULT_DB_FILE = os.path.join("database", "library.db")
+DEFAULT_BOOKS_CSV = "Books.csv"
+DEFAULT_STUDENTS_CSV = "Students.csv"
+
+# Branch mode keeps one database per branch, each with its own CSV pair:
+#   database/branches/<name>/library.db, Books.csv, Students.csv
+BRANCH_DIR = os.path.join("database", "branches")
+BRANCH_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class BranchError(Exception):
+    pass
+
+
+def branch_paths(name):
+    # (database, books CSV, students CSV) for a branch
+    if not BRANCH_NAME.fullmatch(name or ""):
+        raise BranchError(f"Invalid branch name {name!r}: use letters, digits, '-' and '_'")
+    directory = os.path.join(BRANCH_DIR, name)
+    return (os.path.join(directory, "library.db"), os.path.join(directory, "Books.csv"),
+            os.path.join(directory, "Students.csv"))
+
+
+def library_paths(branch=None):
+    # (database, books CSV, students CSV): the branch's when one is given or set in LIBRARY_BRANCH
+    branch = branch or os.environ.get("LIBRARY_BRANCH")
+    if branch:
+        return branch_paths(branch)
+    return DEFAULT_DB_FILE, DEFAULT_BOOKS_CSV, DEFAULT_STUDENTS_CSV
@@ -0,0 +1,255 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+SLOW_QUERY_MS = 50.0
+SLOW_LOG_FILE = "slow_queries.log"
+ROLLING_WINDOW = 10000    # latencies kept for the rolling histogram
+HISTOGRAM_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+PROFILE_ENV = "LIBRARY_PROFILE"     # set to 1 to profile; timing every fetch makes queries several times slower
+
+# Frames from these files are plumbing; the caller is the first frame outside them
+_INTERNAL_FILES = {os.path.abspath(__file__), os.path.abspath(os.path.join(os.path.dirname(__file__), "db.py"))}
+
+_config = {"enabled": os.environ.get(PROFILE_ENV, "") not in ("", "0"), "slow_ms": SLOW_QUERY_MS, "log_file": SLOW_LOG_FILE, "explain": False}
+_lock = threading.Lock()
+_statements = {}
+_latencies = deque(maxlen=ROLLING_WINDOW)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def configure(enabled=None, slow_ms=None, log_file=None, explain=None):
+    with _lock:
+        if enabled is not None:
+            _config["enabled"] = enabled
+        if slow_ms is not None:
+            _config["slow_ms"] = slow_ms
+        if log_file is not None:
+            _config["log_file"] = log_file
+        if explain is not None:
+            _config["explain"] = explain
+
+
+def profiling_enabled():
+    return _config["enabled"]
+
+
+def reset():
+    with _lock:
+        _statements.clear()
+        _latencies.clear()
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(?, ...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def _caller():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename not in _INTERNAL_FILES and "contextlib" not in filename:
+            module = os.path.splitext(os.path.basename(filename))[0]
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+def _explain(conn, sql, parameters):
+    try:
+        plan = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+        return [row[-1] for row in plan]
+    except sqlite3.Error:
+        return None
+
+
+def _log_slow(conn, sql, parameters, elapsed_ms, rows, caller):
+    entry = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "ms": round(elapsed_ms, 3),
+        "rows": rows,
+        "caller": caller,
+        "sql": normalize_sql(sql),
+    }
+    if _config["explain"] and parameters is not None:
+        entry["plan"] = _explain(conn, sql, parameters)
+
+    line = json.dumps(entry) + "\n"
+    with _lock:
+        with open(_config["log_file"], 'a', encoding='utf-8') as file:
+            file.write(line)
+
+
+def record(conn, sql, parameters, elapsed_ms, rows, caller=None):
+    # One finished statement: execution plus every fetch of its rows
+    caller = caller or _caller()
+    key = normalize_sql(sql)
+    with _lock:
+        entry = _statements.get(key)
+        if entry is None:
+            entry = _statements[key] = {"sql": key, "calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                        "rows": 0, "callers": {}}
+        entry["calls"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        entry["rows"] += max(rows, 0)
+        entry["callers"][caller] = entry["callers"].get(caller, 0) + 1
+        _latencies.append(elapsed_ms)
+
+    if elapsed_ms >= _config["slow_ms"] and _config["log_file"]:
+        _log_slow(conn, sql, parameters, elapsed_ms, rows, caller)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    # A query is timed from execute() until its rows run out, or until the cursor is closed, reused
+    # or dropped, so most of a slow scan (which SQLite does while rows are fetched) is not missed
+
+    _pending = None     # [sql, parameters, caller, elapsed_ms, rows] of the query still being read
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, parameters, caller, elapsed_ms, rows = pending
+            record(self.connection, sql, parameters, elapsed_ms, rows, caller)
+
+    def _fetched(self, start, rows, exhausted):
+        self._pending[3] += (time.perf_counter() - start) * 1000
+        self._pending[4] += rows
+        if exhausted:
+            self._finish()
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        if not _config["enabled"]:
+            return super().execute(sql, parameters)
+        caller = _caller()
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._pending = [sql, parameters, caller, (time.perf_counter() - start) * 1000, max(self.rowcount, 0)]
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        if not _config["enabled"]:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        record(self.connection, sql, None, (time.perf_counter() - start) * 1000, self.rowcount)
+        return self
+
+    def executescript(self, sql_script):
+        self._finish()
+        if not _config["enabled"]:
+            return super().executescript(sql_script)
+        start = time.perf_counter()
+        super().executescript(sql_script)
+        record(self.connection, sql_script, None, (time.perf_counter() - start) * 1000, -1)
+        return self
+
+    def fetchone(self):
+        if self._pending is None:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        if self._pending is None:
+            return super().fetchmany(size)
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        if self._pending is None:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+
+    def __next__(self):
+        if self._pending is None:
+            return super().__next__()
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0, True)
+            raise
+        self._fetched(start, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Queries read only in part, like execute(...).fetchone(), are recorded when dropped
+        self._finish()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    # sqlite3.Connection.execute() bypasses Cursor.execute overrides, so route it explicitly
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connection_factory():
+    # Connections opened while profiling is off are plain ones, without the wrappers' per-row cost;
+    # configure(enabled=...) later only affects connections opened after it (or pauses profiled ones)
+    return ProfiledConnection if _config["enabled"] else sqlite3.Connection
+
+
+def top_statements(count=10, key="total_ms"):
+    with _lock:
+        entries = [dict(entry, callers=dict(entry["callers"])) for entry in _statements.values()]
+    for entry in entries:
+        entry["avg_ms"] = entry["total_ms"] / entry["calls"] if entry["calls"] else 0.0
+    entries.sort(key=lambda entry: entry[key], reverse=True)
+    return entries[:count]
+
+
+def latency_histogram():
+    with _lock:
+        samples = list(_latencies)
+    counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    for ms in samples:
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if ms <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+
+    labels = [f"<= {bound} ms" for bound in HISTOGRAM_BUCKETS_MS] + [f"> {HISTOGRAM_BUCKETS_MS[-1]} ms"]
+    return list(zip(labels, counts))
@@ -0,0 +1,115 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from db import get_connection
+
+DEBOUNCE_MS = 150
+POLL_MS = 15
+PROGRESS_STEPS = 1000   # SQLite VM steps between checks for a newer query
+
+_STOP = object()
+
+
+def make_search_scheduler(widget, run_query, show_results, db_file=None, debounce_ms=DEBOUNCE_MS,
+                          on_timing=None, on_error=None):
+    # run_query(text) runs on a worker thread; show_results(result) and on_timing(text, count, ms)
+    # run on the Tk thread. Only the most recent query is ever delivered.
+    state = {"generation": 0, "running": 0, "timer": None, "polling": False}
+    wakeup = threading.Condition()
+    latest = {"job": None}
+    results = queue.Queue()
+
+    def is_stale(generation):
+        return generation != state["generation"]
+
+    def worker():
+        if db_file is not None:
+            # Abort a running statement as soon as a newer query has been scheduled
+            conn = get_connection(db_file)
+            conn.set_progress_handler(lambda: 1 if is_stale(state["running"]) else 0, PROGRESS_STEPS)
+
+        while True:
+            with wakeup:
+                while latest["job"] is None:
+                    wakeup.wait()
+                if latest["job"] is _STOP:
+                    return
+                text, generation = latest["job"]
+                latest["job"] = None
+
+            if is_stale(generation):
+                continue
+
+            state["running"] = generation
+            start = time.perf_counter()
+            try:
+                result, error = run_query(text), None
+            except sqlite3.OperationalError as e:
+                if is_stale(generation):
+                    continue    # interrupted by a newer query
+                result, error = None, e
+            except Exception as e:
+                result, error = None, e
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            if not is_stale(generation):
+                results.put((generation, text, result, error, elapsed_ms))
+
+    threading.Thread(target=worker, daemon=True).start()
+
+    def stop(event=None):
+        if event is not None and event.widget is not widget:
+            return
+        state["generation"] += 1
+        with wakeup:
+            latest["job"] = _STOP
+            wakeup.notify()
+
+    widget.bind("<Destroy>", stop, add="+")
+
+    def poll():
+        # Tk is not thread-safe, so results are picked up here on the Tk thread
+        if not widget.winfo_exists():
+            return
+        try:
+            while True:
+                generation, text, result, error, elapsed_ms = results.get_nowait()
+                if is_stale(generation):
+                    continue
+                state["polling"] = False
+                if error is not None:
+                    if on_error is not None:
+                        on_error(error)
+                    return
+                show_results(result)
+                if on_timing is not None:
+                    on_timing(text, len(result) if result is not None else None, elapsed_ms)
+                return
+        except queue.Empty:
+            pass
+        widget.after(POLL_MS, poll)
+
+    def submit(text, generation):
+        state["timer"] = None
+        with wakeup:
+            latest["job"] = (text, generation)
+            wakeup.notify()
+        if not state["polling"]:
+            state["polling"] = True
+            widget.after(POLL_MS, poll)
+
+    def schedule(text, immediate=False):
+        if state["timer"] is not None:
+            widget.after_cancel(state["timer"])
+            state["timer"] = None
+
+        state["generation"] += 1
+        generation = state["generation"]
+        if immediate:
+            submit(text, generation)
+        else:
+            state["timer"] = widget.after(debounce_ms, submit, text, generation)
+
+    return schedule
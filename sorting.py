@@ -0,0 +1,38 @@
+import string
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def ascii_lower(text):
+    # Same folding as SQLite's built-in lower(), which only knows ASCII
+    return text.translate(_ASCII_LOWER)
+
+
+def keyset_page(conn, select, id_column, sort_key, after=None, before=None, limit=100, descending=False,
+                conditions=(), params=()):
+    # Keyset pagination in any indexed order. A cursor is the row's id, or (sort key, id) when
+    # sort_key is an SQL expression; id breaks ties so every row has a unique position.
+    conditions, params = list(conditions), list(params)
+    forward = before is None
+    cursor = after if forward else before
+    ascending = forward != descending
+    op = ">" if ascending else "<"
+
+    if cursor is not None:
+        if sort_key is None:
+            conditions.append(f"{id_column} {op} ?")
+            params.append(cursor)
+        else:
+            # The first term gives the index a range to seek to; a plain row-value comparison
+            # (key, id) > (?, ?) would scan the index from the start instead
+            key, row_id = cursor
+            conditions.append(f"{sort_key} {op}= ? AND ({sort_key} {op} ? OR {id_column} {op} ?)")
+            params += [key, key, row_id]
+
+    direction = "ASC" if ascending else "DESC"
+    order = f"{id_column} {direction}" if sort_key is None else f"{sort_key} {direction}, {id_column} {direction}"
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = conn.execute(f"{select} {where} ORDER BY {order} LIMIT ?", params + [limit]).fetchall()
+    if not forward:
+        rows.reverse()
+    return rows
@@ -0,0 +1,148 @@
+import re
+import sqlite3
+
+from cache import cached
+from db import get_connection
+from migrations import ensure_migrated
+from sorting import ascii_lower, keyset_page
+
+STUDENT_COLUMNS = "student_id, name, email, date_of_birth"
+PAGE_SIZE = 100
+MAX_RESULTS = 1000      # no lookup ever returns more than this, however it is paged
+
+# SQLite's lower() only folds ASCII, so queries are normalised the same way. Name and email
+# lookups use the lower() expression indexes of migration 2; substring matches use the trigram
+# index of migration 8 (StudentsTrigram).
+
+# Sortable columns: (indexed SQL sort key, the same key computed from a row); the lower()
+# expression indexes carry student_id (the rowid) as their tie-breaker
+STUDENT_SORTS = {
+    "student_id": (None, None),
+    "name": ("lower(name)", lambda row: ascii_lower(row[1])),
+    "email": ("lower(email)", lambda row: ascii_lower(row[2])),
+}
+
+ID_RANGE = re.compile(r"(\d+)\s*-\s*(\d+)")
+
+
+def has_trigram_index(db_file):
+    return get_connection(db_file).execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'StudentsTrigram'"
+    ).fetchone() is not None
+
+
+def normalize(text):
+    return "".join(c.lower() if c.isascii() else c for c in text.strip())
+
+
+def _page(limit, offset):
+    limit = max(0, min(limit, MAX_RESULTS - offset))
+    return limit, offset
+
+
+def _by_id(conn, query, limit, offset):
+    id_range = ID_RANGE.fullmatch(query)
+    if id_range:
+        low, high = sorted(int(value) for value in id_range.groups())
+        return conn.execute(
+            f"SELECT {STUDENT_COLUMNS} FROM Students WHERE student_id BETWEEN ? AND ? "
+            "ORDER BY student_id LIMIT ? OFFSET ?",
+            (low, high, limit, offset)
+        ).fetchall()
+
+    if offset:
+        return []
+    return conn.execute(
+        f"SELECT {STUDENT_COLUMNS} FROM Students WHERE student_id = ?", (int(query),)
+    ).fetchall()
+
+
+def _by_prefix(conn, query, limit, offset):
+    # Range scans on the lower() expression indexes; chr(0x10FFFF) sorts after any real character
+    low, high = query, query + chr(0x10FFFF)
+    if "@" in query:
+        where, params = "lower(email) >= ? AND lower(email) < ?", (low, high)
+    else:
+        where = "(lower(name) >= ? AND lower(name) < ?) OR (lower(email) >= ? AND lower(email) < ?)"
+        params = (low, high, low, high)
+
+    return conn.execute(
+        f"SELECT {STUDENT_COLUMNS} FROM Students WHERE {where} "
+        "ORDER BY lower(name), student_id LIMIT ? OFFSET ?",
+        params + (limit, offset)
+    ).fetchall()
+
+
+def _by_substring(conn, query, limit, offset):
+    phrase = '"' + query.replace('"', '""') + '"'
+    return conn.execute(
+        f"SELECT s.student_id, s.name, s.email, s.date_of_birth FROM StudentsTrigram "
+        "JOIN Students AS s ON s.student_id = StudentsTrigram.rowid "
+        "WHERE StudentsTrigram MATCH ? ORDER BY lower(s.name), s.student_id LIMIT ? OFFSET ?",
+        (phrase, limit, offset)
+    ).fetchall()
+
+
+def _by_scan(conn, query, limit, offset):
+    # Same matches as _by_substring without the index: a full scan, for databases whose SQLite
+    # lacks the trigram tokenizer
+    pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return conn.execute(
+        f"SELECT {STUDENT_COLUMNS} FROM Students "
+        "WHERE lower(name) LIKE ? ESCAPE '\\' OR lower(email) LIKE ? ESCAPE '\\' "
+        "ORDER BY lower(name), student_id LIMIT ? OFFSET ?",
+        (pattern, pattern, limit, offset)
+    ).fetchall()
+
+
+def student_cursor(row, sort="student_id"):
+    key = STUDENT_SORTS[sort][1]
+    return row[0] if key is None else (key(row), row[0])
+
+
+def fetch_students_page(db_file, after=None, before=None, limit=PAGE_SIZE, sort="student_id", descending=False):
+    # Browsing the whole table in any sorted order, a keyset page at a time
+    sort_key = STUDENT_SORTS[sort][0]
+    if sort_key is not None:
+        ensure_migrated(db_file)
+
+    def load():
+        return keyset_page(get_connection(db_file), f"SELECT {STUDENT_COLUMNS} FROM Students", "student_id",
+                           sort_key, after, before, limit, descending)
+
+    return cached(db_file, "students", ("page", sort, descending, after, before, limit), load)
+
+
+def find_students(db_file, query="", limit=PAGE_SIZE, offset=0, substring=True):
+    query = normalize(query)
+    limit, offset = _page(limit, offset)
+    if limit == 0:
+        return []
+    return cached(db_file, "students", ("find", query, limit, offset, substring),
+                  lambda: _find_students(db_file, query, limit, offset, substring))
+
+
+def _find_students(db_file, query, limit, offset, substring):
+    # Numeric input -> primary key lookup; otherwise substring search on name/email when the
+    # query is long enough for trigrams (through the index, or a scan without it), else prefix search.
+    ensure_migrated(db_file)
+    conn = get_connection(db_file)
+
+    if not query:
+        return conn.execute(
+            f"SELECT {STUDENT_COLUMNS} FROM Students ORDER BY student_id LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+
+    if query.isdigit() or ID_RANGE.fullmatch(query):
+        return _by_id(conn, query, limit, offset)
+
+    if substring and len(query) >= 3:
+        if has_trigram_index(db_file):
+            try:
+                return _by_substring(conn, query, limit, offset)
+            except sqlite3.OperationalError:
+                pass    # trigram tokenizer unavailable in this SQLite build
+        return _by_scan(conn, query, limit, offset)
+
+    return _by_prefix(conn, query, limit, offset)
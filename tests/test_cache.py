@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+from cache import cache_stats, get_book, get_student, invalidate_books
+from db import close_connection, get_connection, write_transaction
+from migrations import migrate
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    db_file = str(tmp_path / "library.db")
+    migrate(db_file)
+    conn = get_connection(db_file)
+    with write_transaction(conn):
+        conn.executemany("INSERT INTO Books (book_id, title, author, genre, year, quantity) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         [("B001", "Dune", "Frank Herbert", "SF", 1965, 3), ("B002", "Emma", "Jane Austen", None, 1815, 2)])
+        conn.execute("INSERT INTO Students (name, email, date_of_birth) VALUES ('Ada', 'ada@example.com', '')")
+    yield db_file
+    close_connection(db_file)
+
+
+def _outside(db_file, sql):
+    # Another process, as far as this one can tell
+    conn = sqlite3.connect(db_file)
+    with conn:
+        conn.execute(sql)
+    conn.close()
+
+
+def test_outside_write_refreshes_only_its_rows(db_file):
+    assert get_book(db_file, "B001")[5] == 3
+    get_student(db_file, 1)
+    cleared = cache_stats()["external_changes"]
+
+    _outside(db_file, "UPDATE Books SET quantity = 7 WHERE book_id = 'B001'")
+    assert get_book(db_file, "B001")[5] == 7
+    hits = cache_stats()["hits"]
+    get_student(db_file, 1)
+    assert cache_stats()["hits"] == hits + 1
+    assert cache_stats()["external_changes"] == cleared
+
+
+def test_outside_write_alongside_a_local_one_is_seen(db_file):
+    get_book(db_file, "B001")
+    get_book(db_file, "B002")
+    conn = get_connection(db_file)
+    with write_transaction(conn):
+        conn.execute("UPDATE Books SET quantity = 5 WHERE book_id = 'B001'")
+    invalidate_books(db_file, ["B001"])
+    _outside(db_file, "UPDATE Books SET quantity = 9 WHERE book_id = 'B002'")
+
+    assert get_book(db_file, "B001")[5] == 5
+    assert get_book(db_file, "B002")[5] == 9
+
+
+def test_compacted_log_drops_everything(db_file):
+    get_book(db_file, "B001")
+    cleared = cache_stats()["external_changes"]
+    _outside(db_file, "UPDATE Books SET quantity = 4 WHERE book_id = 'B001'")
+    _outside(db_file, "DELETE FROM ChangeLog")
+    assert get_book(db_file, "B001")[5] == 4
+    assert cache_stats()["external_changes"] == cleared + 1
@@ -0,0 +1,49 @@
+import pytest
+
+from changelog import batched_changelog, changes_since
+from db import close_connection, get_connection, write_transaction
+from migrations import migrate
+
+TRIGGERS = "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name"
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    db_file = str(tmp_path / "library.db")
+    migrate(db_file)
+    yield db_file
+    close_connection(db_file)
+
+
+def _add(conn, name, email):
+    conn.execute("INSERT INTO Students (name, email, date_of_birth) VALUES (?, ?, '')", (name, email))
+
+
+def test_batched_inserts_are_logged_once_in_order(db_file):
+    conn = get_connection(db_file)
+    triggers = conn.execute(TRIGGERS).fetchall()
+    with write_transaction(conn):
+        _add(conn, "Ada", "ada@example.com")
+    with write_transaction(conn), batched_changelog(conn, "Students"):
+        _add(conn, "Grace", "grace@example.com")
+        _add(conn, "Alan", "alan@example.com")
+    with write_transaction(conn):
+        _add(conn, "Edsger", "edsger@example.com")
+
+    changes = changes_since(db_file, 0)
+    assert [(change["row"]["name"], change["op"]) for change in changes] == [
+        ("Ada", "insert"), ("Grace", "insert"), ("Alan", "insert"), ("Edsger", "insert")]
+    assert conn.execute(TRIGGERS).fetchall() == triggers
+
+
+def test_changelog_triggers_become_suppressible_in_their_own_migration(tmp_path):
+    db_file = str(tmp_path / "library.db")
+    query = "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'students_changelog_insert'"
+    try:
+        migrate(db_file, target=11)
+        conn = get_connection(db_file)
+        assert "SuppressedTriggers" not in conn.execute(query).fetchone()[0]
+        assert migrate(db_file) == [12]
+        assert "SuppressedTriggers" in conn.execute(query).fetchone()[0]
+    finally:
+        close_connection(db_file)
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from csv_sync import sync_csv
+from db import close_connection, get_connection
+from migrations import migrate
+
+BOOKS_HEADER = "book_id,title,author,genre,year,quantity\n"
+BOOKS = ["B001,Dune,Frank Herbert,SF,1965,3\n", "B002,Emma,Jane Austen,Classic,1815,2\n",
+         "B003,Ubik,Philip K. Dick,SF,1969,1\n"]
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    db_file = str(tmp_path / "library.db")
+    migrate(db_file)
+    yield db_file
+    close_connection(db_file)
+
+
+def _write(path, lines, bump=0):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.writelines(lines)
+    # A rewrite within the filesystem's timestamp granularity must still look changed
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + bump * 1_000_000_000))
+
+
+def _books(db_file):
+    return dict(get_connection(db_file).execute("SELECT book_id, quantity FROM Books").fetchall())
+
+
+def test_rejected_row_is_kept_not_removed(db_file, tmp_path):
+    csv_path = str(tmp_path / "Books.csv")
+    _write(csv_path, [BOOKS_HEADER] + BOOKS)
+    assert sync_csv(db_file, csv_path, "books")["added"] == 3
+
+    _write(csv_path, [BOOKS_HEADER, BOOKS[0], "B002,Emma,Jane Austen,Classic,1815,4x4\n", BOOKS[2]], bump=1)
+    stats = sync_csv(db_file, csv_path, "books")
+    assert (stats["added"], stats["changed"], stats["removed"], stats["rejected"]) == (0, 0, 0, 1)
+    assert _books(db_file) == {"B001": 3, "B002": 2, "B003": 1}
+    assert os.path.exists(str(tmp_path / "Books.rejects.csv"))
+
+    # Once the row is fixed it syncs as a change; a row that really is gone is removed
+    _write(csv_path, [BOOKS_HEADER, BOOKS[0], "B002,Emma,Jane Austen,Classic,1815,4\n"], bump=2)
+    stats = sync_csv(db_file, csv_path, "books")
+    assert (stats["added"], stats["changed"], stats["removed"], stats["rejected"]) == (0, 1, 1, 0)
+    assert _books(db_file) == {"B001": 3, "B002": 4}
+
+
+def test_first_sync_counts_only_inserted_rows(db_file, tmp_path):
+    conn = get_connection(db_file)
+    with conn:
+        conn.execute("INSERT INTO Books (book_id, title, author, genre, year, quantity) "
+                     "VALUES ('B001', 'Dune', 'Frank Herbert', 'SF', 1965, 9)")
+    csv_path = str(tmp_path / "Books.csv")
+    _write(csv_path, [BOOKS_HEADER] + BOOKS)
+    stats = sync_csv(db_file, csv_path, "books")
+    assert (stats["added"], stats["changed"], stats["removed"]) == (2, 0, 0)
+    assert _books(db_file) == {"B001": 9, "B002": 2, "B003": 1}
+
+
+def test_students_failing_stricter_checks_are_kept(db_file, tmp_path):
+    header = "student_id,name,email,date_of_birth\n"
+    csv_path = str(tmp_path / "Students.csv")
+    _write(csv_path, [header, "S001,Ada Byron,Ada.Byron@example.com,1815-12-10\n",
+                      "S002,Alan Turing,alan.turing@example.com,1912-06-23\n"])
+    assert sync_csv(db_file, csv_path, "students")["added"] == 2
+
+    # A legacy date format and a mangled email are rejected, but the students stay
+    _write(csv_path, [header, "S001,Ada Byron,Ada.Byron@example.com,10/12/1815\n",
+                      "S002,Alan Turing,ALAN.TURING@example,1912-06-23\n"], bump=1)
+    stats = sync_csv(db_file, csv_path, "students")
+    assert (stats["removed"], stats["removals_held"], stats["rejected"]) == (0, 1, 2)
+    rows = get_connection(db_file).execute("SELECT name, date_of_birth FROM Students ORDER BY name").fetchall()
+    assert rows == [("Ada Byron", "1815-12-10"), ("Alan Turing", "1912-06-23")]
+
+    # Fixed file: the students are updated in place, nothing was lost in between
+    _write(csv_path, [header, "S001,Ada Lovelace,Ada.Byron@example.com,1815-12-10\n",
+                      "S002,Alan Turing,alan.turing@example.com,1912-06-23\n"], bump=2)
+    stats = sync_csv(db_file, csv_path, "students")
+    assert (stats["added"], stats["changed"], stats["removed"], stats["rejected"]) == (0, 1, 0, 0)
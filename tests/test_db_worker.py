@@ -0,0 +1,80 @@
+import sqlite3
+import threading
+
+import pytest
+
+from db import close_connection, get_connection
+from db_worker import stop_workers, submit_read, submit_write, worker_stats
+from migrations import migrate
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    db_file = str(tmp_path / "library.db")
+    migrate(db_file)
+    close_connection(db_file)
+    yield db_file
+    stop_workers()
+
+
+def _add_book(conn, book_id):
+    conn.execute("INSERT INTO Books (book_id, title, author, quantity) VALUES (?, 'T', 'A', 1)", (book_id,))
+    return book_id
+
+
+def _book_ids(db_file):
+    return [row[0] for row in get_connection(db_file).execute("SELECT book_id FROM Books ORDER BY book_id")]
+
+
+def test_failing_hook_still_resolves_the_job(db_file):
+    def hook():
+        raise RuntimeError("cache gone")
+
+    errors = worker_stats()["hook_errors"]
+    first = submit_write(db_file, _add_book, "B001", after_commit=hook)
+    second = submit_write(db_file, _add_book, "B002")
+    assert first.result(5) == "B001"
+    assert second.result(5) == "B002"
+    assert worker_stats()["hook_errors"] == errors + 1
+    assert submit_read(db_file, _book_ids, db_file).result(5) == ["B001", "B002"]
+
+
+def test_failing_job_fails_only_its_own_future(db_file):
+    def bad(conn):
+        _add_book(conn, "B002")
+        raise ValueError("bad row")
+
+    failed = worker_stats()["failed"]
+    futures = [submit_write(db_file, _add_book, "B001"), submit_write(db_file, bad),
+               submit_write(db_file, _add_book, "B003"), submit_write(db_file, _add_book, "B001")]
+    assert futures[0].result(5) == "B001"
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    assert futures[2].result(5) == "B003"
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[3].result(5)
+    assert worker_stats()["failed"] == failed + 2
+    assert submit_read(db_file, _book_ids, db_file).result(5) == ["B001", "B003"]
+
+
+def test_job_ending_the_transaction_fails_its_group_and_the_worker_carries_on(db_file):
+    def commits_itself(conn):
+        _add_book(conn, "B002")
+        conn.commit()
+
+    # Hold the worker on a read so both writes are queued by the time it takes the next group
+    started, release = threading.Event(), threading.Event()
+    blocker = submit_read(db_file, lambda: (started.set(), release.wait(5)))
+    started.wait(5)
+    hooks = []
+    futures = [submit_write(db_file, _add_book, "B001", after_commit=lambda: hooks.append("B001")),
+               submit_write(db_file, commits_itself)]
+    release.set()
+    blocker.result(5)
+    for future in futures:
+        with pytest.raises(sqlite3.Error):
+            future.result(5)
+    assert hooks == []
+
+    assert submit_write(db_file, _add_book, "B003").result(5) == "B003"
+    assert "B003" in submit_read(db_file, _book_ids, db_file).result(5)
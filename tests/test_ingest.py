@@ -0,0 +1,34 @@
+import pytest
+
+from changelog import changes_since
+from db import close_connection
+from ingest import ingest_csv
+from inventory import verify_inventory
+from migrations import migrate
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    db_file = str(tmp_path / "library.db")
+    migrate(db_file)
+    yield db_file
+    close_connection(db_file)
+
+
+def test_ingest_keeps_inventory_and_changelog_current(db_file, tmp_path):
+    books = tmp_path / "books.csv"
+    books.write_text("book_id,title,author,genre,year,quantity\n"
+                     "B001,Dune,Frank Herbert,SF,1965,3\n"
+                     "B002,Emma,Jane Austen,,1815,2\n"
+                     "B001,Dune again,Frank Herbert,SF,1965,1\n"
+                     "B003,,Nobody,,,\n", encoding="utf-8")
+    students = tmp_path / "students.csv"
+    students.write_text("name,email,date_of_birth\nAda,ada@example.com,\n", encoding="utf-8")
+
+    stats = ingest_csv(db_file, str(books), "books", workers=1)
+    assert (stats["inserted"], stats["skipped"], stats["rejected"]) == (2, 1, 1)
+    assert ingest_csv(db_file, str(students), "students", workers=1)["inserted"] == 1
+
+    assert verify_inventory(db_file) == []
+    assert [(change["table"], change["op"]) for change in changes_since(db_file, 0)] == [
+        ("Books", "insert"), ("Books", "insert"), ("Students", "insert")]
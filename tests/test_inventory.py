@@ -0,0 +1,63 @@
+import pytest
+
+from db import close_connection, get_connection, write_transaction
+from inventory import batched_inventory, inventory_summary, verify_inventory
+from migrations import migrate
+
+TRIGGER_SQL = "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'books_inventory_insert'"
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    db_file = str(tmp_path / "library.db")
+    migrate(db_file)
+    yield db_file
+    close_connection(db_file)
+
+
+def _add(conn, rows):
+    conn.executemany("INSERT INTO Books (book_id, title, author, genre, year, quantity) VALUES (?, ?, ?, ?, ?, ?)",
+                     rows)
+
+
+def test_batched_insert_is_counted_once_and_leaves_the_trigger_alone(db_file):
+    conn = get_connection(db_file)
+    trigger = conn.execute(TRIGGER_SQL).fetchone()
+    with write_transaction(conn):
+        _add(conn, [("B001", "Dune", "Frank Herbert", "SF", 1965, 3)])
+    with write_transaction(conn), batched_inventory(conn):
+        _add(conn, [("B002", "Emma", "Jane Austen", None, 1815, 2),
+                    ("B003", "Solaris", "Stanislaw Lem", "SF", 1961, 0)])
+    with write_transaction(conn):
+        _add(conn, [("B004", "Ubik", "Philip K. Dick", "SF", 1969, 1)])
+
+    assert verify_inventory(db_file) == []
+    assert inventory_summary(db_file)["titles"] == 4
+    assert inventory_summary(db_file)["out_of_stock"] == 1
+    assert conn.execute(TRIGGER_SQL).fetchone() == trigger
+    assert conn.execute("SELECT count(*) FROM SuppressedTriggers").fetchone()[0] == 0
+
+
+def test_failed_batch_switches_the_trigger_back_on(db_file):
+    conn = get_connection(db_file)
+    with pytest.raises(RuntimeError):
+        with write_transaction(conn), batched_inventory(conn):
+            _add(conn, [("B001", "Dune", "Frank Herbert", "SF", 1965, 3)])
+            raise RuntimeError("load aborted")
+    with write_transaction(conn):
+        _add(conn, [("B002", "Emma", "Jane Austen", None, 1815, 2)])
+
+    assert verify_inventory(db_file) == []
+    assert inventory_summary(db_file)["titles"] == 1
+
+
+def test_inventory_trigger_becomes_suppressible_in_its_own_migration(tmp_path):
+    db_file = str(tmp_path / "library.db")
+    try:
+        migrate(db_file, target=10)
+        conn = get_connection(db_file)
+        assert "SuppressedTriggers" not in conn.execute(TRIGGER_SQL).fetchone()[0]
+        assert migrate(db_file, target=11) == [11]
+        assert "SuppressedTriggers" in conn.execute(TRIGGER_SQL).fetchone()[0]
+    finally:
+        close_connection(db_file)
@@ -0,0 +1,132 @@
+import os
+import shutil
+import sqlite3
+
+import migrations
+from db import close_connection, get_connection, write_transaction
+from migrations import LATEST_VERSION, migrate, schema_version
+from students import find_students
+
+TABLES = {"Books", "Students", "InventoryStats", "ChangeLog", "ChangeConsumers", "BooksSearch", "IssuedBooks",
+          "StudentsTrigram", "SyncFiles", "SyncRows"}
+INDEXES = {"idx_books_author", "idx_books_genre", "idx_books_year", "idx_books_title", "idx_students_name_lower",
+           "idx_students_email_lower"}
+TRIGGERS = {"books_quantity_guard"}
+
+TOTAL_TITLES = "SELECT titles FROM InventoryStats WHERE dimension = 'total'"
+
+# The database as it shipped before migrations existed: user_version 0, populated
+BASELINE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "library.db")
+
+
+def _schema(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        rows = conn.execute("SELECT type, name FROM sqlite_master").fetchall()
+    finally:
+        conn.close()
+    return {kind: {name for t, name in rows if t == kind} for kind in ("table", "index", "trigger")}
+
+
+def test_fresh_database_reaches_latest_version(tmp_path):
+    db_file = str(tmp_path / "library.db")
+    try:
+        assert migrate(db_file) == list(range(1, LATEST_VERSION + 1))
+        assert schema_version(db_file) == LATEST_VERSION
+        assert migrate(db_file) == []
+    finally:
+        close_connection(db_file)
+
+    schema = _schema(db_file)
+    assert TABLES <= schema["table"]
+    assert INDEXES <= schema["index"]
+    assert TRIGGERS <= schema["trigger"]
+
+
+def test_partial_database_migrates_the_rest(tmp_path):
+    db_file = str(tmp_path / "library.db")
+    try:
+        assert migrate(db_file, target=1) == [1]
+        conn = sqlite3.connect(db_file)
+        conn.execute("INSERT INTO Books (book_id, title, author, genre, year, quantity) "
+                     "VALUES ('B001', 'Dune', 'Frank Herbert', 'SF', 1965, 3)")
+        conn.commit()
+        conn.close()
+        assert migrate(db_file) == list(range(2, LATEST_VERSION + 1))
+        assert schema_version(db_file) == LATEST_VERSION
+    finally:
+        close_connection(db_file)
+
+    conn = sqlite3.connect(db_file)
+    try:
+        assert conn.execute("SELECT row_id, rowid FROM Books").fetchall() == [(1, 1)]
+        assert conn.execute("SELECT rowid FROM BooksSearch WHERE BooksSearch MATCH 'dune'").fetchall() == [(1,)]
+        assert conn.execute("SELECT titles, copies FROM InventoryStats WHERE dimension = 'genre' AND value = 'SF'"
+                            ).fetchone() == (1, 3)
+    finally:
+        conn.close()
+
+
+def test_trigram_index_is_skipped_without_the_tokenizer(tmp_path, monkeypatch):
+    monkeypatch.setitem(migrations.OPTIONAL_MIGRATIONS, 8, lambda conn: False)
+    db_file = str(tmp_path / "library.db")
+    try:
+        assert migrate(db_file) == list(range(1, LATEST_VERSION + 1))
+        conn = get_connection(db_file)
+        with write_transaction(conn):
+            conn.execute("INSERT INTO Students (name, email, date_of_birth) "
+                         "VALUES ('Ada Lovelace', 'ada@example.com', '')")
+        assert [row[1] for row in find_students(db_file, "lovel")] == ["Ada Lovelace"]
+    finally:
+        close_connection(db_file)
+
+    schema = _schema(db_file)
+    assert "StudentsTrigram" not in schema["table"]
+    assert not {name for name in schema["trigger"] if name.startswith("students_trigram")}
+
+
+def test_populated_baseline_database_migrates(tmp_path):
+    db_file = str(tmp_path / "library.db")
+    shutil.copyfile(BASELINE_DB, db_file)
+    conn = sqlite3.connect(db_file)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+        books = conn.execute("SELECT rowid, book_id, title FROM Books ORDER BY rowid").fetchall()
+        students = conn.execute("SELECT student_id, name FROM Students ORDER BY student_id").fetchall()
+    finally:
+        conn.close()
+    assert books and students
+
+    try:
+        assert migrate(db_file) == list(range(1, LATEST_VERSION + 1))
+    finally:
+        close_connection(db_file)
+
+    conn = sqlite3.connect(db_file)
+    try:
+        assert conn.execute("SELECT row_id, book_id, title FROM Books ORDER BY row_id").fetchall() == books
+        assert conn.execute("SELECT count(*) FROM Books WHERE row_id IS NOT rowid").fetchone()[0] == 0
+        assert conn.execute("SELECT student_id, name FROM Students ORDER BY student_id").fetchall() == students
+
+        word = books[0][2].split()[0].lower()
+        expected = [rowid for rowid, _, title in books if word in title.lower().split()]
+        assert conn.execute("SELECT rowid FROM BooksSearch WHERE BooksSearch MATCH ? ORDER BY rowid",
+                            (word,)).fetchall() == [(rowid,) for rowid in expected]
+        assert conn.execute(TOTAL_TITLES).fetchone() == (len(books),)
+        if "StudentsTrigram" in _schema(db_file)["table"]:
+            name = students[0][1]
+            assert (students[0][0],) in conn.execute("SELECT rowid FROM StudentsTrigram WHERE StudentsTrigram MATCH ?",
+                                                     (f'"{name[1:-1]}"',)).fetchall()
+
+        # The recreated triggers fire on the migrated table
+        with conn:
+            conn.execute("INSERT INTO Books (book_id, title, author, quantity) VALUES ('X001', 'Zyzzyva', 'A', 1)")
+        assert conn.execute("SELECT count(*) FROM BooksSearch WHERE BooksSearch MATCH 'zyzzyva'").fetchone() == (1,)
+        assert conn.execute(TOTAL_TITLES).fetchone() == (len(books) + 1,)
+        assert conn.execute("SELECT row_key FROM ChangeLog ORDER BY seq DESC LIMIT 1").fetchone() == ("X001",)
+    finally:
+        conn.close()
+
+    triggers = _schema(db_file)["trigger"]
+    assert {"books_inventory_insert", "books_inventory_delete", "books_changelog_insert", "books_search_insert",
+            "students_changelog_insert", "books_quantity_guard"} <= triggers
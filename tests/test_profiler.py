@@ -0,0 +1,33 @@
+import sqlite3
+
+import pytest
+
+import profiler
+from db import close_connection, get_connection
+
+
+@pytest.fixture
+def profiling(tmp_path):
+    was_enabled = profiler.profiling_enabled()
+    db_file = str(tmp_path / "library.db")
+    profiler.reset()
+    yield db_file
+    close_connection(db_file)
+    profiler.configure(enabled=was_enabled)
+    profiler.reset()
+
+
+def test_connections_are_plain_unless_profiling(profiling):
+    profiler.configure(enabled=False)
+    conn = get_connection(profiling)
+    assert type(conn) is sqlite3.Connection
+    conn.execute("SELECT 1").fetchall()
+    assert profiler.top_statements() == []
+
+
+def test_profiled_connections_record_statements(profiling):
+    profiler.configure(enabled=True, log_file="")
+    conn = get_connection(profiling)
+    assert isinstance(conn, profiler.ProfiledConnection)
+    conn.execute("SELECT 1").fetchall()
+    assert "SELECT ?" in [entry["sql"] for entry in profiler.top_statements(100)]
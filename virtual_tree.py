@@ -0,0 +1,100 @@
+import tkinter as tk
+
+PAGE_SIZE = 100
+MAX_PAGES = 5           # the tree never holds more than PAGE_SIZE * MAX_PAGES rows
+PREFETCH_MARGIN = 0.2   # load the next page once the view is this close to either edge
+
+
+def attach_virtual_scroll(tree, scrollbar, fetch_page, page_size=PAGE_SIZE, max_pages=MAX_PAGES, key=None):
+    # fetch_page(after=None, before=None, limit=n) must return rows ordered by key(row),
+    # the cursor passed back as after/before (default: row[0])
+    state = {"fetch": fetch_page, "key": key or (lambda row: row[0]), "keys": {}, "at_start": True,
+             "at_end": True, "busy": False}
+    max_rows = page_size * max_pages
+
+    def insert_rows(rows, index=tk.END):
+        for row in rows:
+            iid = tree.insert("", index, values=row)
+            state["keys"][iid] = state["key"](row)
+            if index != tk.END:
+                index += 1
+
+    def remove_rows(iids):
+        tree.delete(*iids)
+        for iid in iids:
+            state["keys"].pop(iid, None)
+
+    def keep_top_visible(change):
+        # Re-anchor the view on the row that was at the top before rows were added or trimmed
+        children = tree.get_children()
+        top = None
+        if children:
+            top = children[min(int(round(tree.yview()[0] * len(children))), len(children) - 1)]
+
+        change()
+
+        children = tree.get_children()
+        if top is not None and top in children:
+            tree.yview_moveto(children.index(top) / len(children))
+
+    def load_after():
+        children = tree.get_children()
+        if not children:
+            return
+        rows = state["fetch"](after=state["keys"][children[-1]], limit=page_size)
+        state["at_end"] = len(rows) < page_size
+
+        def change():
+            insert_rows(rows)
+            children = tree.get_children()
+            if len(children) > max_rows:
+                remove_rows(children[:len(children) - max_rows])
+                state["at_start"] = False
+
+        keep_top_visible(change)
+
+    def load_before():
+        children = tree.get_children()
+        if not children:
+            return
+        rows = state["fetch"](before=state["keys"][children[0]], limit=page_size)
+        state["at_start"] = len(rows) < page_size
+
+        def change():
+            insert_rows(rows, 0)
+            children = tree.get_children()
+            if len(children) > max_rows:
+                remove_rows(children[max_rows:])
+                state["at_end"] = False
+
+        keep_top_visible(change)
+
+    def on_scroll(first, last):
+        scrollbar.set(first, last)
+        if state["busy"]:
+            return
+
+        state["busy"] = True
+        try:
+            if float(last) >= 1 - PREFETCH_MARGIN and not state["at_end"]:
+                load_after()
+            elif float(first) <= PREFETCH_MARGIN and not state["at_start"]:
+                load_before()
+        finally:
+            state["busy"] = False
+
+    def reload(fetch_page=None, key=None):
+        if fetch_page is not None:
+            state["fetch"] = fetch_page
+            state["key"] = key or (lambda row: row[0])
+
+        remove_rows(tree.get_children())
+        # The visible page plus one page of prefetch margin
+        rows = state["fetch"](after=None, limit=page_size * 2)
+        state["at_start"] = True
+        state["at_end"] = len(rows) < page_size * 2
+        insert_rows(rows)
+        tree.yview_moveto(0)
+
+    tree.configure(yscrollcommand=on_scroll)
+    return reload
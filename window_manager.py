@@ -0,0 +1,51 @@
+import tkinter as tk
+
+from cache import generation
+
+PREWARM_DELAY_MS = 300      # let the dashboard finish drawing before building anything hidden
+PREWARM_GAP_MS = 50         # one window per step, so clicks made meanwhile are handled between builds
+
+
+def make_window_manager(root, db_file, windows):
+    # windows maps name -> (build, tables). build(window) fills a hidden Toplevel once and returns
+    # refresh() (or None); tables are the cached tables it shows. Closing or going back only hides
+    # a window, and showing it again refreshes it only if one of its tables changed meanwhile.
+    built = {}      # name -> {"window": Toplevel, "refresh": callable, "seen": generations at last refresh}
+
+    def build(name):
+        make, _ = windows[name]
+        window = tk.Toplevel(root)
+        window.withdraw()
+        window.protocol("WM_DELETE_WINDOW", window.withdraw)
+        entry = built[name] = {"window": window, "refresh": make(window) or (lambda: None), "seen": None}
+        return entry
+
+    def ensure_current(name):
+        entry = built.get(name)
+        if entry is None or not entry["window"].winfo_exists():
+            entry = build(name)
+        seen = tuple(generation(db_file, table) for table in windows[name][1])
+        if seen != entry["seen"]:
+            entry["refresh"]()
+            entry["seen"] = seen
+        return entry["window"]
+
+    def show(name):
+        window = ensure_current(name)
+        window.deiconify()
+        window.lift()
+        window.focus_set()
+
+    def prewarm(names):
+        # Builds and loads the given windows while the user is idle, so even the first open is instant
+        pending = [name for name in names if name not in built]
+
+        def step():
+            if not pending or not root.winfo_exists():
+                return
+            ensure_current(pending.pop(0))
+            root.after(PREWARM_GAP_MS, lambda: root.after_idle(step))
+
+        root.after(PREWARM_DELAY_MS, lambda: root.after_idle(step))
+
+    return show, prewarm